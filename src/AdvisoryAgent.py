@@ -2,6 +2,7 @@
 
 # --- AdvisoryAgent tool functions and helpers ---
 import asyncio
+import json
 import logging
 import os
 import sys
@@ -17,6 +18,8 @@ if __name__ == "__main__":
     if project_root not in sys.path:
         sys.path.insert(0, project_root)
 
+from src.query_engine import lookup_data
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -41,25 +44,15 @@ def generate_report(mutation_id: str, context: dict) -> dict:
     details = context
     return {"report_id": report_id, "summary": summary, "recommendation": recommendation, "details": details}
 
-def lookup_advisory(file: str, query: dict) -> dict:
-    from src import data_access
-    try:
-        df = data_access.read_csv(file)
-        for k, v in query.items():
-            df = df[df[k] == v]
-        return {"results": df.to_dict(orient="records")}
-    except Exception as e:
-        logger.error(f"lookup_advisory failed: {e}")
-        return {"results": [], "error": str(e)}
-
 def get_toolset():
     async def async_generate_report(mutation_id: str, context: dict) -> dict:
         return await asyncio.to_thread(generate_report, mutation_id, context)
-    async def async_lookup_advisory(file: str, query: dict = None) -> dict:
+    async def async_lookup_advisory(file: str, query: dict = None, columns: list = None, order_by: list = None,
+                                    limit: int = None, offset: int = 0) -> str:
         if query is None:
             logger.error("async_lookup_advisory called without required 'query' argument.")
-            return {"results": [], "error": "Missing required argument: 'query'"}
-        return await asyncio.to_thread(lookup_advisory, file, query)
+            return json.dumps({"results": [], "error": "Missing required argument: 'query'"})
+        return await asyncio.to_thread(lookup_data, file, query, columns, order_by, limit, offset)
     async_tool = AsyncFunctionTool(functions=[async_generate_report, async_lookup_advisory])
     tool_map = {
         "async_generate_report": async_generate_report,
@@ -114,6 +107,11 @@ class AdvisoryAgent:
             return asyncio.run(self._handle_request_async(context))
 
     async def _handle_request_async(self, context: dict) -> dict:
+        from src.agent_protocol import span
+        with span("AdvisoryAgent", kind="agent", mutation_id=context.get("mutation_id")):
+            return await self._run_workflow(context)
+
+    async def _run_workflow(self, context: dict) -> dict:
         if not self.initialized:
             await self.initialize()
         import json
@@ -128,12 +126,13 @@ class AdvisoryAgent:
         )
         max_iterations = 60
         iteration = 0
-        from src.agent_protocol import create_message, log_agent_message
+        from src.agent_protocol import create_message, log_agent_message, span
         _, tool_map = get_toolset()
         while run.status in ("queued", "in_progress", "requires_action") and iteration < max_iterations:
             await asyncio.sleep(2)
             iteration += 1
-            run = self.project_client.agents.runs.get(thread_id=self.thread.id, run_id=run.id)
+            with span("run.poll", kind="poll", iteration=iteration):
+                run = self.project_client.agents.runs.get(thread_id=self.thread.id, run_id=run.id)
             logger.info(f"Run status: {run.status} (iteration {iteration})")
             if run.status == "requires_action" and run.required_action:
                 logger.info("Run requires action - handling tool calls...")
@@ -147,7 +146,8 @@ class AdvisoryAgent:
                     while retries < max_retries:
                         try:
                             if tool_call.function.name in tool_map:
-                                result = await tool_map[tool_call.function.name](**args)
+                                with span(tool_call.function.name, kind="tool", attempt=retries + 1):
+                                    result = await tool_map[tool_call.function.name](**args)
                             else:
                                 result = f"Tool {tool_call.function.name} not implemented."
                             msg = create_message(
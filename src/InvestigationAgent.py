@@ -16,6 +16,8 @@ if __name__ == "__main__":
     if project_root not in sys.path:
         sys.path.insert(0, project_root)
 
+from src import query_engine
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -33,16 +35,10 @@ if not (API_DEPLOYMENT_NAME and PROJECT_ENDPOINT and AZURE_SUBSCRIPTION_ID and A
     exit(1)
 
 # Example tool function
-async def lookup_data(file: str, query: dict) -> dict:
-    from src import data_access
-    try:
-        df = data_access.read_csv(file)
-        for k, v in query.items():
-            df = df[df[k] == v]
-        return {"results": df.to_dict(orient="records")}
-    except Exception as e:
-        logger.error(f"lookup_data failed: {e}")
-        return {"results": [], "error": str(e)}
+async def lookup_data(file: str, query: dict, columns: list = None, order_by: list = None, limit: int = None, offset: int = 0) -> str:
+    return query_engine.lookup_data(file, query, columns, order_by, limit, offset)
+
+lookup_data.__doc__ = query_engine.lookup_data.__doc__  # the tool description the model sees
 
 def get_toolset():
     return AsyncFunctionTool(functions=[lookup_data])
@@ -78,10 +74,21 @@ class InvestigationAgent:
         return asyncio.run(self._handle_request_async(context))
 
     async def _handle_request_async(self, context: dict) -> dict:
+        # Every agent and tool call in this workflow reads from one consistent data snapshot,
+        # shared with concurrent workflows until the underlying files change.
+        # The workflow span's trace_id is the correlation_id of every message it sends.
+        from src import data_access
+        from src.agent_protocol import span
+        with span("InvestigationAgent", kind="agent", mutation_id=context.get("mutation_id"),
+                  trace_id=context.get("correlation_id")) as trace, data_access.use_snapshot() as snapshot:
+            logger.info(f"Investigation {trace.trace_id if trace else ''} running on data snapshot {snapshot.version}")
+            return await self._run_workflow(context)
+
+    async def _run_workflow(self, context: dict) -> dict:
         if not self.initialized:
             await self.initialize()
         import json
-        from src.agent_protocol import create_message, log_agent_message
+        from src.agent_protocol import create_message, log_agent_message, span
 
         def log_to_file(message: str):
             log_path = os.path.join(os.path.dirname(__file__), 'log.txt')
@@ -103,7 +110,8 @@ class InvestigationAgent:
         while run.status in ("queued", "in_progress", "requires_action") and iteration < max_iterations:
             await asyncio.sleep(2)
             iteration += 1
-            run = self.project_client.agents.runs.get(thread_id=self.thread.id, run_id=run.id)
+            with span("run.poll", kind="poll", iteration=iteration):
+                run = self.project_client.agents.runs.get(thread_id=self.thread.id, run_id=run.id)
             logger.info(f"Run status: {run.status} (iteration {iteration})")
             if run.status == "requires_action" and run.required_action:
                 logger.info("Run requires action - handling tool calls...")
@@ -117,7 +125,8 @@ class InvestigationAgent:
                     while retries < max_retries:
                         try:
                             # Call the registered tool function
-                            result = await lookup_data(**args)
+                            with span(tool_call.function.name, kind="tool", attempt=retries + 1):
+                                result = await lookup_data(**args)
                             msg = create_message(
                                 sender="InvestigationAgent",
                                 receiver="ToolCall",
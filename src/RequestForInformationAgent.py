@@ -1,6 +1,8 @@
 
 # --- RequestForInformationAgent tool functions and helpers ---
 import asyncio
+import contextvars
+import json
 import logging
 import os
 import sys
@@ -16,6 +18,8 @@ if __name__ == "__main__":
     if project_root not in sys.path:
         sys.path.insert(0, project_root)
 
+from src.query_engine import lookup_data
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -27,17 +31,35 @@ PROJECT_ENDPOINT = os.getenv("PROJECT_ENDPOINT")
 AZURE_SUBSCRIPTION_ID = os.getenv("AZURE_SUBSCRIPTION_ID")
 AZURE_RESOURCE_GROUP = os.getenv("AZURE_RESOURCE_GROUP_NAME")
 TEMPERATURE = float(os.getenv("AGENT_TEMPERATURE", "0.2"))
+# How notify_send gets its answer: "none" returns at once and the request stays open in the UI
+# Inbox; "wait" holds the tool call (and its job worker) until the recipient answers; "mock"
+# answers with RFI_MOCK_RESPONSE (tests, demos)
+RESPONSE_MODE = os.getenv("RFI_RESPONSE_MODE", "none").lower()
+MOCK_RESPONSE = os.getenv("RFI_MOCK_RESPONSE", "No further information available (mock answer).")
+# Seconds a notify_send tool call waits for the recipient's answer in the UI Inbox
+RESPONSE_TIMEOUT = float(os.getenv("RFI_RESPONSE_TIMEOUT", "300"))
+# Azure expires a run that stays in requires_action for 10 minutes. All tool calls of one
+# required action share this many seconds of waiting, so their outputs are submitted in time.
+RUN_ACTION_BUDGET = 540
+_answer_deadline = contextvars.ContextVar("rfi_answer_deadline", default=None)
 
 if not (API_DEPLOYMENT_NAME and PROJECT_ENDPOINT and AZURE_SUBSCRIPTION_ID and AZURE_RESOURCE_GROUP):
     logger.error("Missing required environment variables. Please check your .env file.")
     exit(1)
 
 def notify_send(recipient_id: str, subject: str, body: str, context: dict = None) -> dict:
+    """Record the request as a pending action for the recipient's Inbox in the UI."""
     import uuid
+    from src import pending_actions
     notification_id = str(uuid.uuid4())
-    logger.info(f"[MOCK] Notification sent to {recipient_id}: {subject} | {body}")
-    # Simulate a response from the recipient
-    mock_response = f"Received request: '{subject}'. Reason provided: 'Change required by management.'"
+    pending_actions.add_pending_action({
+        "action_id": notification_id,
+        "type": "information_request",
+        "recipient_id": recipient_id,
+        "context": f"{subject}\n\n{body}" if subject else body,
+        "response": "",
+    })
+    logger.info(f"Notification sent to {recipient_id}: {subject} | {body}")
     return {
         "status": "sent",
         "message_id": notification_id,
@@ -46,28 +68,41 @@ def notify_send(recipient_id: str, subject: str, body: str, context: dict = None
         "subject": subject,
         "body": body,
         "context": context,
-        "response": mock_response
+        "response": None
     }
 
-def lookup_data(file: str, query: dict) -> dict:
-    from src import data_access
-    try:
-        df = data_access.read_csv(file)
-        for k, v in query.items():
-            df = df[df[k] == v]
-        return {"results": df.to_dict(orient="records")}
-    except Exception as e:
-        logger.error(f"lookup_data failed: {e}")
-        return {"results": [], "error": str(e)}
-
 def get_toolset():
     async def async_notify_send(recipient_id: str, subject: str, body: str, context: dict = None) -> dict:
-        return await asyncio.to_thread(notify_send, recipient_id, subject, body, context)
-    async def async_lookup_data(file: str, query: dict = None) -> dict:
+        from src import pending_actions
+        result = await asyncio.to_thread(notify_send, recipient_id, subject, body, context)
+        if RESPONSE_MODE == "none":
+            result["message"] += "; the answer will arrive in the Inbox and the request stays open until then"
+            return result
+        if RESPONSE_MODE == "mock":
+            await asyncio.to_thread(pending_actions.update_action_response, result["message_id"], MOCK_RESPONSE)
+            result["status"] = "responded"
+            result["response"] = MOCK_RESPONSE
+            return result
+        # Suspend this tool call (not the event loop) until the recipient answers in the UI,
+        # but never past the deadline of the run's required action
+        timeout = RESPONSE_TIMEOUT
+        deadline = _answer_deadline.get()
+        if deadline is not None:
+            timeout = max(0.0, min(timeout, deadline - asyncio.get_running_loop().time()))
+        answer = await pending_actions.wait_for_response(result["message_id"], timeout)
+        if answer is None:
+            result["status"] = "no_response"
+            result["message"] = f"{recipient_id} did not answer within {timeout:.0f} seconds; the request stays open"
+        else:
+            result["status"] = "responded"
+            result["response"] = answer["response"]
+        return result
+    async def async_lookup_data(file: str, query: dict = None, columns: list = None, order_by: list = None,
+                                limit: int = None, offset: int = 0) -> str:
         if query is None:
             logger.error("async_lookup_data called without required 'query' argument.")
-            return {"results": [], "error": "Missing required argument: 'query'"}
-        return await asyncio.to_thread(lookup_data, file, query)
+            return json.dumps({"results": [], "error": "Missing required argument: 'query'"})
+        return await asyncio.to_thread(lookup_data, file, query, columns, order_by, limit, offset)
     async_tool = AsyncFunctionTool(functions=[async_notify_send, async_lookup_data])
     tool_map = {
         "async_notify_send": async_notify_send,
@@ -104,12 +139,20 @@ class RequestForInformationAgent:
         logger.info(f"Created agent, ID: {self.agent.id}")
         self.thread = self.project_client.agents.threads.create()
         logger.info(f"Created thread, ID: {self.thread.id}")
+        if RESPONSE_MODE == "wait":
+            from src import pending_actions
+            await asyncio.to_thread(pending_actions.start_answer_watcher)
         self.initialized = True
 
     async def handle_request(self, context: dict) -> dict:
         return await self._handle_request_async(context)
 
     async def _handle_request_async(self, context: dict) -> dict:
+        from src.agent_protocol import span
+        with span("RequestForInformationAgent", kind="agent", mutation_id=context.get("mutation_id")):
+            return await self._run_workflow(context)
+
+    async def _run_workflow(self, context: dict) -> dict:
         if not self.initialized:
             await self.initialize()
         import json
@@ -124,7 +167,7 @@ class RequestForInformationAgent:
         )
         max_iterations = 60
         iteration = 0
-        from src.agent_protocol import create_message, log_agent_message
+        from src.agent_protocol import create_message, log_agent_message, span
         def ensure_mutation_id(ctx):
             ctx = dict(ctx) if ctx else {}
             if 'mutation_id' not in ctx:
@@ -140,10 +183,12 @@ class RequestForInformationAgent:
         while run.status in ("queued", "in_progress", "requires_action") and iteration < max_iterations:
             await asyncio.sleep(2)
             iteration += 1
-            run = self.project_client.agents.runs.get(thread_id=self.thread.id, run_id=run.id)
+            with span("run.poll", kind="poll", iteration=iteration):
+                run = self.project_client.agents.runs.get(thread_id=self.thread.id, run_id=run.id)
             logger.info(f"Run status: {run.status} (iteration {iteration})")
             if run.status == "requires_action" and run.required_action:
                 logger.info("Run requires action - handling tool calls...")
+                _answer_deadline.set(asyncio.get_running_loop().time() + RUN_ACTION_BUDGET)
                 tool_outputs = []
                 for tool_call in run.required_action.submit_tool_outputs.tool_calls:
                     logger.info(f"Executing function: {tool_call.function.name}")
@@ -154,7 +199,8 @@ class RequestForInformationAgent:
                     while retries < max_retries:
                         try:
                             if tool_call.function.name in tool_map:
-                                result = await tool_map[tool_call.function.name](**args)
+                                with span(tool_call.function.name, kind="tool", attempt=retries + 1):
+                                    result = await tool_map[tool_call.function.name](**args)
                             else:
                                 result = f"Tool {tool_call.function.name} not implemented."
                             msg = create_message(
@@ -221,6 +267,13 @@ class RequestForInformationAgent:
                 "error": str(run.last_error),
                 "context": context
             }
+        elif run.status == "expired":
+            return {
+                "agent": "RequestForInformationAgent",
+                "status": "error",
+                "error": "The run expired before the tool outputs were submitted; open requests stay in the Inbox.",
+                "context": context
+            }
 
 
 # --- MAIN BLOCK ---
@@ -2,6 +2,7 @@
 
 # --- RightsCheckAgent tool functions and helpers ---
 import asyncio
+import json
 import logging
 import os
 import sys
@@ -17,6 +18,8 @@ if __name__ == "__main__":
     if project_root not in sys.path:
         sys.path.insert(0, project_root)
 
+from src.query_engine import lookup_data
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -36,34 +39,23 @@ if not (API_DEPLOYMENT_NAME and PROJECT_ENDPOINT and AZURE_SUBSCRIPTION_ID and A
 def check_authorization(user_id: str, system: str, access_level: str) -> dict:
     from src import data_access
     try:
-        df = data_access.read_csv('authorisations.csv')
-        match = df[(df['UserID'] == user_id) & (df['System'] == system) & (df['AccessLevel'] == access_level)]
+        match = data_access.lookup('authorisations', UserID=user_id, System=system, AccessLevel=access_level)
         authorized = not match.empty
-        evidence = match.to_dict(orient="records") if authorized else []
+        evidence = data_access.to_text("authorisations", match).to_dict(orient="records") if authorized else []
         return {"authorized": authorized, "evidence": evidence, "message": "Authorized" if authorized else "Not authorized"}
     except Exception as e:
         logger.error(f"check_authorization failed: {e}")
         return {"authorized": False, "evidence": [], "message": str(e)}
 
-def lookup_data(file: str, query: dict) -> dict:
-    from src import data_access
-    try:
-        df = data_access.read_csv(file)
-        for k, v in query.items():
-            df = df[df[k] == v]
-        return {"results": df.to_dict(orient="records")}
-    except Exception as e:
-        logger.error(f"lookup_data failed: {e}")
-        return {"results": [], "error": str(e)}
-
 def get_toolset():
     async def async_check_authorization(user_id: str, system: str, access_level: str) -> dict:
         return await asyncio.to_thread(check_authorization, user_id, system, access_level)
-    async def async_lookup_data(file: str, query: dict = None) -> dict:
+    async def async_lookup_data(file: str, query: dict = None, columns: list = None, order_by: list = None,
+                                limit: int = None, offset: int = 0) -> str:
         if query is None:
             logger.error("async_lookup_data called without required 'query' argument.")
-            return {"results": [], "error": "Missing required argument: 'query'"}
-        return await asyncio.to_thread(lookup_data, file, query)
+            return json.dumps({"results": [], "error": "Missing required argument: 'query'"})
+        return await asyncio.to_thread(lookup_data, file, query, columns, order_by, limit, offset)
     # For Azure agent registration
     async_tool = AsyncFunctionTool(functions=[async_check_authorization, async_lookup_data])
     # For local dispatch
@@ -107,6 +99,11 @@ class RightsCheckAgent:
         return await self._handle_request_async(context)
 
     async def _handle_request_async(self, context: dict) -> dict:
+        from src.agent_protocol import span
+        with span("RightsCheckAgent", kind="agent", mutation_id=context.get("mutation_id")):
+            return await self._run_workflow(context)
+
+    async def _run_workflow(self, context: dict) -> dict:
         if not self.initialized:
             await self.initialize()
         import json
@@ -121,13 +118,14 @@ class RightsCheckAgent:
         )
         max_iterations = 60
         iteration = 0
-        from src.agent_protocol import create_message, log_agent_message
+        from src.agent_protocol import create_message, log_agent_message, span
         # Use only the tool mapping for local dispatch
         _, toolset = get_toolset()
         while run.status in ("queued", "in_progress", "requires_action") and iteration < max_iterations:
             await asyncio.sleep(2)
             iteration += 1
-            run = self.project_client.agents.runs.get(thread_id=self.thread.id, run_id=run.id)
+            with span("run.poll", kind="poll", iteration=iteration):
+                run = self.project_client.agents.runs.get(thread_id=self.thread.id, run_id=run.id)
             logger.info(f"Run status: {run.status} (iteration {iteration})")
             if run.status == "requires_action" and run.required_action:
                 logger.info("Run requires action - handling tool calls...")
@@ -141,7 +139,8 @@ class RightsCheckAgent:
                     while retries < max_retries:
                         try:
                             if tool_call.function.name in toolset:
-                                result = await toolset[tool_call.function.name](**args)
+                                with span(tool_call.function.name, kind="tool", attempt=retries + 1):
+                                    result = await toolset[tool_call.function.name](**args)
                             else:
                                 result = f"Tool {tool_call.function.name} not implemented."
                             msg = create_message(
@@ -22,14 +22,46 @@ Usage Example:
 
 import uuid
 import json
+import atexit
+import collections
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
 from typing import Optional, Dict, Any
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, Field, PrivateAttr, ValidationError
 import os
 
+try:
+    from . import audit_archive, audit_blobs, audit_log, data_access
+except ImportError:
+    import audit_archive
+    import audit_blobs
+    import audit_log
+    import data_access
+
+logger = logging.getLogger(__name__)
+
 # Path to audit log (reuse audit_trail.csv)
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data'))
 AUDIT_FILE = os.path.join(DATA_DIR, 'audit_trail.csv')
+AUDIT_HEADER = ["AuditID", "MutationID", "Timestamp", "OldStatus", "NewStatus", "Agent", "Comment", "Reasoning"]
+
+# Background audit writer settings (see AuditWriter)
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "100"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.5"))
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_OVERFLOW_SIZE = int(os.getenv("AUDIT_OVERFLOW_SIZE", "100000"))
+
+# Workflow tracing (see span); spans are written by the AuditWriter thread
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() in ("1", "true", "yes")
+SPAN_LOG = os.getenv("SPAN_LOG", os.path.join(DATA_DIR, 'spans.jsonl'))
+# The span log is rotated to SPAN_LOG.1 .. SPAN_LOG.<SPAN_LOG_BACKUPS> past SPAN_LOG_MAX_MB
+SPAN_LOG_MAX_MB = float(os.getenv("SPAN_LOG_MAX_MB", "20"))
+SPAN_LOG_BACKUPS = int(os.getenv("SPAN_LOG_BACKUPS", "2"))
 
 class AgentMessage(BaseModel):
     sender: str
@@ -40,23 +72,54 @@ class AgentMessage(BaseModel):
     timestamp: str = Field(default_factory=lambda: datetime.utcnow().isoformat())
     status: str
     error: Optional[Dict[str, Any]] = None
+    _json: Optional[str] = PrivateAttr(default=None)
 
     class Config:
         extra = 'allow'
 
+    def to_json(self) -> str:
+        """Return the message as a JSON string, encoding it only on the first call.
+
+        Messages are treated as immutable once sent; later calls return the cached string.
+        """
+        encoded = self._json
+        if encoded is None:
+            try:
+                encoded = self.model_dump_json()
+            except Exception:  # context values pydantic cannot serialize
+                encoded = json.dumps(self.model_dump(), ensure_ascii=False, default=str)
+            self._json = encoded
+        return encoded
+
+    @classmethod
+    def trusted(cls, **fields) -> "AgentMessage":
+        """Build a message from fields the orchestrator produced itself, without validation.
+
+        fields must already be of the right types; see BaseModel.model_construct().
+        """
+        return cls.model_construct(**fields)
 
-def create_message(sender: str, receiver: str, action: str, context: dict, status: str = "pending", correlation_id: Optional[str] = None, error: Optional[dict] = None) -> AgentMessage:
-    """Create a new Agent2Agent protocol message."""
-    return AgentMessage(
+
+def create_message(sender: str, receiver: str, action: str, context: dict, status: str = "pending", correlation_id: Optional[str] = None, error: Optional[dict] = None, validate: bool = False) -> AgentMessage:
+    """Create a new Agent2Agent protocol message.
+
+    Messages created here come from our own agents, so they skip pydantic
+    validation by default (AgentMessage.trusted); pass validate=True for
+    input from outside the orchestrator.
+    """
+    fields = dict(
         sender=sender,
         receiver=receiver,
         action=action,
         context=context,
-        correlation_id=correlation_id or str(uuid.uuid4()),
+        correlation_id=correlation_id or current_trace_id() or str(uuid.uuid4()),
         timestamp=datetime.utcnow().isoformat(),
         status=status,
         error=error
     )
+    if validate:
+        return AgentMessage(**fields)
+    return AgentMessage.trusted(**fields)
 
 
 def validate_message(msg: dict) -> bool:
@@ -69,17 +132,129 @@ def validate_message(msg: dict) -> bool:
         return False
 
 
-def log_agent_message(msg: AgentMessage, comment: Optional[str] = None):
-    """Log an agent message to audit_trail.csv (preserving comments and header)."""
-    import csv
-    # Log rotation: archive if file exceeds 5MB
-    MAX_LOG_SIZE = 5 * 1024 * 1024  # 5MB
-    if os.path.exists(AUDIT_FILE) and os.path.getsize(AUDIT_FILE) > MAX_LOG_SIZE:
-        archive_name = AUDIT_FILE.replace('.csv', f'_archive_{datetime.utcnow().strftime("%Y%m%d%H%M%S")}.csv')
-        os.rename(AUDIT_FILE, archive_name)
-    # Prepare row
-    audit_id = str(uuid.uuid4())[:8]
-    timestamp = msg.timestamp
+class Span:
+    """One timed step of an agent workflow: an agent step, tool call, run poll or audit write.
+
+    trace_id is the workflow's correlation_id. start is time.monotonic(),
+    so offsets and durations are only comparable within one process.
+    """
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "mutation_id",
+                 "attributes", "timestamp", "start", "duration", "status", "error")
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str] = None,
+                 mutation_id: Optional[str] = None, attributes: Optional[dict] = None):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.mutation_id = str(mutation_id) if mutation_id is not None else None
+        self.attributes = attributes or {}
+        self.timestamp = datetime.utcnow().isoformat()
+        self.start = time.monotonic()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+
+    def to_record(self) -> dict:
+        return {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "name": self.name, "kind": self.kind, "mutation_id": self.mutation_id,
+            "timestamp": self.timestamp, "start": round(self.start, 6),
+            "duration_ms": round((self.duration or 0) * 1000, 3),
+            "status": self.status, "error": self.error, "attributes": self.attributes,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("agent_span", default=None)
+_span_listeners = []
+
+
+def add_span_listener(callback):
+    """Call callback(event, span) when a span starts ("start") and ends ("end").
+
+    Callbacks run on the span's own thread and must return quickly.
+    """
+    _span_listeners.append(callback)
+
+
+def remove_span_listener(callback):
+    if callback in _span_listeners:
+        _span_listeners.remove(callback)
+
+
+def _notify(event: str, current: Span):
+    for callback in list(_span_listeners):
+        try:
+            callback(event, current)
+        except Exception:
+            logger.exception(f"Span listener failed on {event} of {current.name}")
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    """Return the trace (correlation) ID of the running workflow, if any."""
+    current = _current_span.get()
+    return current.trace_id if current is not None else None
+
+
+@contextmanager
+def span(name: str, kind: str = "step", mutation_id: Optional[str] = None, trace_id: Optional[str] = None,
+         **attributes):
+    """Time the enclosed block as a span of the current workflow trace.
+
+    Without an enclosing span (or with an explicit trace_id) a new trace is
+    started; otherwise the span becomes a child of the current one and
+    inherits its trace_id and mutation_id. The current span is a ContextVar,
+    so it follows awaits and asyncio.to_thread calls, and create_message uses
+    its trace_id as the default correlation_id. On exit the span is queued
+    for SPAN_LOG, with status "error" if the block raised.
+    """
+    parent = _current_span.get()
+    if not TRACE_ENABLED:
+        yield parent
+        return
+    if parent is not None and trace_id in (None, parent.trace_id):
+        current = Span(name, kind, parent.trace_id, parent.span_id, mutation_id or parent.mutation_id, attributes)
+    else:
+        current = Span(name, kind, trace_id or str(uuid.uuid4()), None, mutation_id, attributes)
+    token = _current_span.set(current)
+    _notify("start", current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.monotonic() - current.start
+        _current_span.reset(token)
+        _notify("end", current)
+        _get_writer().submit(current)
+
+
+def audit_record(mutation_id: str, new_status: str, agent: str, comment: str = "", reasoning: Any = "",
+                 old_status: str = "", correlation_id: Optional[str] = None, timestamp: Optional[str] = None) -> dict:
+    """Build an audit record: the audit_trail columns plus correlation_id.
+
+    Reasoning is kept as given; the writer JSON-encodes it for the CSV.
+    correlation_id defaults to the current trace.
+    """
+    return {
+        "AuditID": str(uuid.uuid4())[:8], "MutationID": mutation_id,
+        "Timestamp": timestamp or datetime.utcnow().isoformat(),
+        "OldStatus": old_status, "NewStatus": new_status, "Agent": agent,
+        "Comment": comment, "Reasoning": reasoning,
+        "correlation_id": correlation_id or current_trace_id() or "",
+        "_span": _current_span.get(),
+    }
+
+
+def _audit_record(msg: AgentMessage, comment: Optional[str] = None) -> dict:
+    """Build the audit record (audit_trail columns plus correlation_id) for an agent message."""
     mutation_id = msg.context.get('mutation_id')
     if not mutation_id:
         # Try to infer from nested context (e.g., if context is a result dict)
@@ -100,7 +275,7 @@ def log_agent_message(msg: AgentMessage, comment: Optional[str] = None):
         else:
             comment_str = comment
     else:
-        comment_str = json.dumps(msg.dict(), ensure_ascii=False)
+        comment_str = msg.to_json()
     # Reasoning: try to extract from context or comment
     reasoning = msg.context.get('reasoning', '')
     # If not present, try to extract from comment if it's a dict with 'reasoning'
@@ -108,22 +283,339 @@ def log_agent_message(msg: AgentMessage, comment: Optional[str] = None):
         try:
             if isinstance(comment, dict) and 'reasoning' in comment:
                 reasoning = comment['reasoning']
-            elif isinstance(comment, str):
+            elif isinstance(comment, str) and comment.lstrip().startswith('{'):
                 comment_json = json.loads(comment)
                 if isinstance(comment_json, dict) and 'reasoning' in comment_json:
                     reasoning = comment_json['reasoning']
         except Exception:
             pass
+    return audit_record(mutation_id, new_status, agent, comment_str, reasoning, old_status=old_status,
+                        correlation_id=msg.correlation_id, timestamp=msg.timestamp)
+
+
+def _audit_write_spans(records: list, timestamp: str, start: float, end: float, status: str) -> list:
+    """Build one audit.write span per logging span in a written batch, as a child of that span."""
+    parents = {}
+    for record in records:
+        parent = record.get("_span")
+        if parent is not None:
+            parents.setdefault(parent.span_id, [parent, 0])[1] += 1
+    spans = []
+    for parent, rows in parents.values():
+        child = Span("audit.write", "audit", parent.trace_id, parent.span_id, parent.mutation_id,
+                     {"rows": rows, "batch_rows": len(records)})
+        child.timestamp, child.start, child.duration, child.status = timestamp, start, end - start, status
+        spans.append(child.to_record())
+    return spans
+
+
+def _pack_record(record: dict) -> dict:
+    """Replace a large Comment/Reasoning of a JSONL audit record by a blob reference."""
+    packed = dict(record, Comment=audit_blobs.pack(record["Comment"]))
+    reasoning = _reasoning_json(record["Reasoning"])
+    if len(reasoning) >= audit_blobs.AUDIT_BLOB_MIN_BYTES:
+        packed["Reasoning"] = audit_blobs.pack(reasoning)
+    return packed
+
+
+def _reasoning_json(reasoning) -> str:
     # Serialize reasoning as JSON string for safe CSV storage
     try:
-        reasoning_json = json.dumps(reasoning, ensure_ascii=False)
+        return json.dumps(reasoning, ensure_ascii=False)
     except Exception:
-        reasoning_json = str(reasoning)
-    row = [audit_id, mutation_id, timestamp, old_status, new_status, agent, comment_str, reasoning_json]
-    # Write header if file does not exist
-    write_header = not os.path.exists(AUDIT_FILE)
-    with open(AUDIT_FILE, 'a', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
-        if write_header:
-            writer.writerow(["AuditID", "MutationID", "Timestamp", "OldStatus", "NewStatus", "Agent", "Comment", "Reasoning"])
-        writer.writerow(row)
+        return str(reasoning)
+
+
+def _audit_row(record: dict) -> list:
+    """Convert an audit record to an audit_trail.csv row."""
+    return [record[column] for column in AUDIT_HEADER[:-1]] + [_reasoning_json(record["Reasoning"])]
+
+
+class AuditWriter(threading.Thread):
+    """Background writer that appends audit records in batches.
+
+    Records go to AUDIT_FILE, or to the JSONL audit log when
+    AUDIT_FORMAT=jsonl (see audit_log.py). Finished spans go to SPAN_LOG.
+
+    Rows are queued by log_agent_message and written by this thread once
+    AUDIT_BATCH_SIZE rows are pending or AUDIT_FLUSH_INTERVAL seconds have
+    passed since the first pending row, so callers (including the asyncio
+    event loop) never wait on disk I/O. Enqueuing never blocks either: once
+    the writer falls AUDIT_QUEUE_SIZE items behind, finished spans are
+    dropped (counted in dropped_spans) and audit records go to an overflow
+    list (counted in overflowed) that the writer drains, in order, after the
+    queue. Once AUDIT_OVERFLOW_SIZE records wait there, further records are
+    dropped and logged (counted in dropped_records), so memory stays bounded.
+    """
+
+    def __init__(self, batch_size: int = AUDIT_BATCH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL,
+                 queue_size: int = AUDIT_QUEUE_SIZE, overflow_size: int = AUDIT_OVERFLOW_SIZE):
+        super().__init__(name="audit-writer", daemon=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._overflow = collections.deque()
+        self._overflow_lock = threading.Lock()
+        self.overflow_size = overflow_size
+        self.dropped_spans = 0
+        self.dropped_records = 0
+        self.overflowed = 0
+
+    def _put(self, item):
+        with self._overflow_lock:
+            # While items wait in the overflow list, later ones queue behind them to keep the order
+            if not self._overflow:
+                try:
+                    self.queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    pass
+            if isinstance(item, Span):
+                self.dropped_spans += 1
+                return
+            if isinstance(item, dict) and len(self._overflow) >= self.overflow_size:
+                if not self.dropped_records % 1000:
+                    logger.error(f"Audit overflow full ({self.overflow_size} records); dropping audit record "
+                                 f"for {item.get('MutationID')} ({self.dropped_records + 1} dropped so far)")
+                self.dropped_records += 1
+                return
+            if not self._overflow:
+                logger.warning(f"Audit queue full ({self.queue.maxsize} items); buffering records in memory")
+            self._overflow.append(item)  # flush/stop markers are always kept
+            if isinstance(item, dict):
+                self.overflowed += 1
+
+    def _get(self, timeout: Optional[float]):
+        """Return the next item (queue first, then the overflow list), or None on timeout."""
+        try:
+            return self.queue.get(block=not self._overflow, timeout=timeout)
+        except queue.Empty:
+            pass
+        with self._overflow_lock:
+            if self._overflow and self.queue.empty():
+                return self._overflow.popleft()
+        return None
+
+    def submit(self, record):
+        """Queue an audit record (dict) or a finished Span without blocking."""
+        self._put(record)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write all rows queued so far; returns False if that did not finish within timeout."""
+        done = threading.Event()
+        self._put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Write the remaining rows and stop the thread."""
+        self._put(_STOP)
+        self.join(timeout)
+
+    def run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if not batch else max(deadline - time.monotonic(), 0)
+            item = self._get(timeout)
+            if isinstance(item, (dict, Span)):
+                batch.append(item)
+                if len(batch) == 1:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+            self._write(batch)
+            batch = []
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                return
+
+    def _write(self, batch: list):
+        records = [item for item in batch if isinstance(item, dict)]
+        spans = [item.to_record() for item in batch if isinstance(item, Span)]
+        if records:
+            timestamp, start = datetime.utcnow().isoformat(), time.monotonic()
+            status = "ok" if self._write_audit(records) else "error"
+            spans.extend(_audit_write_spans(records, timestamp, start, time.monotonic(), status))
+        if spans:
+            self._write_spans(spans)
+
+    def _write_audit(self, records: list) -> bool:
+        import csv
+        try:
+            # Large Comment/Reasoning payloads are stored once and referenced (see audit_blobs)
+            if data_access.AUDIT_FORMAT == 'jsonl':
+                audit_archive.rotate()
+                audit_log.append([_pack_record(record) for record in records])
+                return True
+            # Seal the trail into an archived segment once it exceeds AUDIT_ROTATE_MB
+            audit_archive.rotate(path=AUDIT_FILE)
+            rows = [_audit_row(record) for record in records]
+            for row in rows:
+                row[6], row[7] = audit_blobs.pack(row[6]), audit_blobs.pack(row[7])
+            with data_access.file_lock(AUDIT_FILE):
+                # Write header if file does not exist
+                write_header = not os.path.exists(AUDIT_FILE)
+                with open(AUDIT_FILE, 'a', encoding='utf-8', newline='') as f:
+                    writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
+                    if write_header:
+                        writer.writerow(AUDIT_HEADER)
+                    writer.writerows(rows)
+            return True
+        except Exception:
+            logger.exception(f"Failed to write {len(records)} audit records to {AUDIT_FILE}")
+            return False
+
+    def _write_spans(self, records: list):
+        try:
+            lines = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+                            for r in records)
+            os.makedirs(os.path.dirname(SPAN_LOG), exist_ok=True)
+            with data_access.file_lock(SPAN_LOG):
+                _rotate_span_log(len(lines.encode("utf-8")))
+                with open(SPAN_LOG, "a", encoding="utf-8") as f:
+                    f.write(lines)
+        except Exception:
+            logger.exception(f"Failed to write {len(records)} spans to {SPAN_LOG}")
+
+
+def _rotate_span_log(incoming: int):
+    """Shift SPAN_LOG to SPAN_LOG.1 (dropping the oldest backup) if incoming bytes would pass SPAN_LOG_MAX_MB.
+
+    Callers hold the span log's file lock.
+    """
+    try:
+        size = os.path.getsize(SPAN_LOG)
+    except FileNotFoundError:
+        return
+    if size == 0 or size + incoming <= SPAN_LOG_MAX_MB * 1024 * 1024:
+        return
+    if SPAN_LOG_BACKUPS <= 0:
+        os.remove(SPAN_LOG)
+        return
+    for n in range(SPAN_LOG_BACKUPS - 1, 0, -1):
+        if os.path.exists(f"{SPAN_LOG}.{n}"):
+            os.replace(f"{SPAN_LOG}.{n}", f"{SPAN_LOG}.{n + 1}")
+    os.replace(SPAN_LOG, f"{SPAN_LOG}.1")
+
+
+def span_log_paths(path: Optional[str] = None) -> list:
+    """Return the existing files of a span log (default SPAN_LOG), oldest rotated backup first."""
+    path = path or SPAN_LOG
+    candidates = [f"{path}.{n}" for n in range(SPAN_LOG_BACKUPS, 0, -1)] + [path]
+    return [p for p in candidates if os.path.exists(p)]
+
+
+_STOP = object()
+_writer: Optional[AuditWriter] = None
+_writer_lock = threading.Lock()
+
+
+def _get_writer() -> AuditWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = AuditWriter()
+            _writer.start()
+        return _writer
+
+
+def flush(timeout: Optional[float] = None) -> bool:
+    """Block until every audit row and span logged so far has been written to disk."""
+    with _writer_lock:
+        writer = _writer
+    if writer is None or not writer.is_alive():
+        return True
+    return writer.flush(timeout)
+
+
+def _shutdown():
+    with _writer_lock:
+        writer = _writer
+    if writer is not None and writer.is_alive():
+        writer.stop(timeout=10)
+
+
+atexit.register(_shutdown)
+
+
+def log_agent_message(msg: AgentMessage, comment: Optional[str] = None):
+    """Log an agent message to audit_trail.csv (preserving comments and header).
+
+    The row is built here and handed to the background AuditWriter; call
+    flush() to wait until it is on disk.
+    """
+    log_audit(_audit_record(msg, comment))
+
+
+def log_audit(record: dict):
+    """Append an audit record (see audit_record) to the audit trail.
+
+    This is the single write path for agents and the UI: records are queued
+    for the AuditWriter thread, which appends them in batches under the
+    audit file lock and never rewrites existing rows. Call flush() to wait
+    until the record is on disk.
+    """
+    _get_writer().submit(record)
+
+
+def migrate_audit_file(path: Optional[str] = None) -> int:
+    """Bring an audit CSV to AUDIT_HEADER: replace an older header and pad short rows.
+
+    Runs under the audit file lock, so the AuditWriter waits instead of
+    appending mid-rewrite. The file is rewritten (atomically, comment preamble
+    kept) only when something changes. Returns the number of rows changed.
+    """
+    import csv
+    import io
+    path = path or AUDIT_FILE
+    if not os.path.exists(path):
+        return 0
+    width = len(AUDIT_HEADER)
+
+    def rows(start):
+        with open(path, 'rb') as raw:
+            raw.seek(start)
+            reader = csv.reader(io.TextIOWrapper(raw, encoding='utf-8', newline=''))
+            yield next(reader, None)
+            yield from (row for row in reader if row)
+
+    with data_access.file_lock(path):
+        start = data_access.preamble_end(path)
+        scan = rows(start)
+        header = next(scan)
+        headless = header is not None and header[:1] != ["AuditID"]  # first line is already a data row
+        changed = int(header is not None and header != AUDIT_HEADER) + sum(1 for row in scan if len(row) < width)
+        if not changed:
+            return 0
+        terminator = data_access.read_header(path)[1]
+        with data_access.atomic_write(path, 'w', encoding='utf-8', newline='') as f:
+            with open(path, 'rb') as src:
+                f.write(src.read(start).decode('utf-8'))
+            writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL, lineterminator=terminator)
+            body = rows(start)
+            if not headless:
+                next(body)
+            writer.writerow(AUDIT_HEADER)
+            writer.writerows(row + [""] * (width - len(row)) for row in body)
+    data_access.invalidate_cache('audit_trail')
+    logger.info(f"Migrated {changed} rows of {path} to the current audit header")
+    return changed
+
+
+_migration: Optional[threading.Thread] = None
+
+
+def start_audit_migration(path: Optional[str] = None) -> threading.Thread:
+    """Run migrate_audit_file once per process in a background thread; returns that thread."""
+    global _migration
+    with _writer_lock:
+        if _migration is None:
+            def run():
+                try:
+                    migrate_audit_file(path)
+                except Exception:
+                    logger.exception("Audit trail migration failed")
+            _migration = threading.Thread(target=run, name="audit-migration", daemon=True)
+            _migration.start()
+        return _migration
@@ -0,0 +1,393 @@
+"""
+Rotation manager for the audit trail.
+
+rotate() seals the live audit trail once it grows past AUDIT_ROTATE_MB:
+
+- CSV format: audit_trail.csv moves to data/audit_archive/audit_trail_<seq>_<ts>.csv
+  and is replaced by a file holding only the header.
+- JSONL format (AUDIT_FORMAT=jsonl): the active segment in AUDIT_LOG_DIR is
+  sealed and the next segment is started.
+
+Sealed segments can be gzip-compressed (AUDIT_ARCHIVE_GZIP). Each one is
+recorded in a manifest.json next to it, with its row count, first/last
+Timestamp, a Bloom filter of its MutationIDs and its distinct Agent/NewStatus
+values. MutationIDs are random, so a min/max range would cover almost every
+segment; the Bloom filter rules a segment out with about 1% false positives.
+Queries (iter_audit_trail, get_audit_trail_for_mutation,
+audit_log.get_records) prune segments by the manifest and only scan the
+archived segments that can contain matching rows.
+Archives written by the old rotation (audit_trail_<ts>.csv and
+audit_trail_archive_<ts>.csv in DATA_DIR) are adopted the first time a
+manifest is created.
+
+expire(before) deletes the sealed segments whose rows are all older than
+before and then the audit blobs (see audit_blobs) that no remaining row
+references. With AUDIT_RETENTION_DAYS set, rotate() expires older segments
+after each rotation.
+"""
+import base64
+import functools
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    from . import audit_blobs, audit_log, data_access
+except ImportError:
+    import audit_blobs
+    import audit_log
+    import data_access
+
+AUDIT_ROTATE_MB = float(os.getenv('AUDIT_ROTATE_MB', '5'))
+AUDIT_ARCHIVE_GZIP = os.getenv('AUDIT_ARCHIVE_GZIP', 'false').lower() in ('1', 'true', 'yes')
+AUDIT_RETENTION_DAYS = os.getenv('AUDIT_RETENTION_DAYS')  # unset: keep sealed segments forever
+
+ARCHIVE_DIRNAME = 'audit_archive'
+MANIFEST = 'manifest.json'
+STATS_CHUNKSIZE = 50_000
+VALUE_COLUMNS = ('Agent', 'NewStatus')  # distinct values recorded per segment (filter options)
+BLOOM_BITS_PER_KEY = 10  # with BLOOM_HASHES hashes: about 1% false positives
+BLOOM_HASHES = 7
+
+_LEGACY_RE = re.compile(r'^audit_trail_(archive_)?\d{8}_?\d{6}\.csv$')
+_BLOB_REF_RE = re.compile(rb'blob:sha256:([0-9a-f]{64})')
+
+_manifest_lock = threading.Lock()
+_manifests = {}  # manifest path -> (file stamp, entries)
+
+
+def _jsonl(path=None):
+    return path is None and data_access.AUDIT_FORMAT == 'jsonl'
+
+
+def archive_dir(path=None):
+    """Return the directory holding the sealed segments and their manifest."""
+    if _jsonl(path):
+        return audit_log.AUDIT_LOG_DIR
+    path = path or data_access.get_csv_path('audit_trail')
+    return os.path.join(os.path.dirname(path), ARCHIVE_DIRNAME)
+
+
+def _segment_file(directory, file):
+    # Adopted legacy archives are stored relative to the archive dir ('../audit_trail_<ts>.csv')
+    return os.path.normpath(os.path.join(directory, file))
+
+
+def _legacy_entries(csv_path):
+    directory = os.path.dirname(csv_path)
+    if not os.path.isdir(directory):
+        return []
+    archive = os.path.join(directory, ARCHIVE_DIRNAME)
+    entries = []
+    for name in sorted(os.listdir(directory)):
+        if _LEGACY_RE.match(name):
+            file = os.path.relpath(os.path.join(directory, name), archive)
+            entries.append(_describe(archive, file, 'csv'))
+    return entries
+
+
+def load_manifest(path=None):
+    """Return the manifest entries (oldest first) for the live trail at path."""
+    directory = archive_dir(path)
+    manifest = os.path.join(directory, MANIFEST)
+    stamp = data_access.file_stamp(manifest)
+    with _manifest_lock:
+        cached = _manifests.get(manifest)
+        if cached is not None and cached[0] == stamp and stamp is not None:
+            return list(cached[1])
+    if stamp is not None:
+        with open(manifest, encoding='utf-8') as f:
+            entries = json.load(f)['segments']
+        with _manifest_lock:
+            _manifests[manifest] = (stamp, entries)
+        return list(entries)
+    if _jsonl(path):
+        return []
+    entries = _legacy_entries(path or data_access.get_csv_path('audit_trail'))
+    if entries:
+        _save_manifest(directory, entries)
+    return entries
+
+
+def _manifest_guard(directory):
+    """Cross-process lock for read-modify-write updates of a manifest."""
+    return data_access.file_lock(os.path.join(directory, MANIFEST))
+
+
+def _save_manifest(directory, entries):
+    os.makedirs(directory, exist_ok=True)
+    with data_access.atomic_write(os.path.join(directory, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump({'segments': entries}, f, indent=1)
+
+
+def _csv_chunks(file, chunksize):
+    reader = pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=chunksize, compression='infer')
+    with reader:
+        for chunk in reader:
+            yield chunk.reindex(columns=data_access.AUDIT_COLUMNS, fill_value='')
+
+
+def _jsonl_chunks(file, chunksize):
+    batch = []
+    for record in audit_log.iter_records(segments=[file]):
+        batch.append(record)
+        if len(batch) >= chunksize:
+            yield audit_log.to_frame(batch)
+            batch = []
+    if batch:
+        yield audit_log.to_frame(batch)
+
+
+def _chunks(file, fmt, chunksize):
+    return _jsonl_chunks(file, chunksize) if fmt == 'jsonl' else _csv_chunks(file, chunksize)
+
+
+def _bloom_positions(key, bits):
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+    h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % bits for i in range(BLOOM_HASHES)]
+
+
+def _bloom(keys):
+    """Return a base64 Bloom filter of keys for the manifest."""
+    data = bytearray(max(len(keys) * BLOOM_BITS_PER_KEY // 8, 8))
+    for key in keys:
+        for p in _bloom_positions(key, len(data) * 8):
+            data[p >> 3] |= 1 << (p & 7)
+    return base64.b64encode(bytes(data)).decode('ascii')
+
+
+@functools.lru_cache(maxsize=1024)
+def _bloom_bits(encoded):
+    return base64.b64decode(encoded)
+
+
+def _may_contain(encoded, key):
+    data = _bloom_bits(encoded)
+    return all(data[p >> 3] & (1 << (p & 7)) for p in _bloom_positions(key, len(data) * 8))
+
+
+def _describe(directory, file, fmt):
+    """Build the manifest entry of a segment by streaming it once."""
+    rows, first, last, ids = 0, None, None, set()
+    values = {column: set() for column in VALUE_COLUMNS}
+    for chunk in _chunks(_segment_file(directory, file), fmt, STATS_CHUNKSIZE):
+        rows += len(chunk)
+        for column in VALUE_COLUMNS:
+            values[column].update(chunk[column].unique())
+        ts = pd.to_datetime(chunk['Timestamp'], format='ISO8601', errors='coerce', utc=True).dropna()
+        if len(ts):
+            first = ts.min() if first is None else min(first, ts.min())
+            last = ts.max() if last is None else max(last, ts.max())
+        ids.update(chunk['MutationID'][chunk['MutationID'] != ''].unique())
+    return {
+        'file': file, 'format': fmt, 'compressed': file.endswith('.gz'), 'rows': rows,
+        'first_timestamp': first.isoformat() if first is not None else None,
+        'last_timestamp': last.isoformat() if last is not None else None,
+        'mutation_bloom': _bloom(ids),
+        'values': {column: sorted(v for v in found if v) for column, found in values.items()},
+    }
+
+
+def _compress(directory, entry):
+    """Gzip a sealed segment; returns the updated entry.
+
+    The gzip is written under a temp name that segment listings ignore and
+    only renamed to <segment>.gz once complete.
+    """
+    source = _segment_file(directory, entry['file'])
+    with open(source, 'rb') as src, data_access.atomic_write(source + '.gz', 'wb') as f:
+        with gzip.GzipFile(filename=os.path.basename(source), mode='wb', fileobj=f) as dst:
+            shutil.copyfileobj(src, dst)
+    return {**entry, 'file': entry['file'] + '.gz', 'compressed': True}
+
+
+def _seal(directory, entries, entry, compress):
+    """Record a sealed segment in the manifest, compressing it first if requested.
+
+    Callers hold the lock of the file the segment was sealed from, so the
+    uncompressed source is removed before another writer can take it.
+    """
+    if compress:
+        compressed = _compress(directory, entry)
+        _save_manifest(directory, entries + [compressed])
+        os.remove(_segment_file(directory, entry['file']))
+        entry = compressed
+    else:
+        _save_manifest(directory, entries + [entry])
+    return _segment_file(directory, entry['file'])
+
+
+def rotate(max_size_mb=None, compress=None, path=None, force=False):
+    """Seal the live audit trail if it is larger than max_size_mb (default AUDIT_ROTATE_MB).
+
+    path selects a CSV trail other than data/audit_trail.csv. Returns the
+    sealed segment's path, or None when nothing was rotated.
+    """
+    limit = (AUDIT_ROTATE_MB if max_size_mb is None else max_size_mb) * 1024 * 1024
+    compress = AUDIT_ARCHIVE_GZIP if compress is None else compress
+    if _jsonl(path):
+        sealed = _rotate_jsonl(limit, compress, force)
+    else:
+        sealed = _rotate_csv(path or data_access.get_csv_path('audit_trail'), limit, compress, force)
+    if sealed:
+        data_access.invalidate_cache('audit_trail')
+        if AUDIT_RETENTION_DAYS:
+            expire(pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=float(AUDIT_RETENTION_DAYS)), path=path)
+    return sealed
+
+
+def _rotate_csv(path, limit, compress, force):
+    if not os.path.exists(path):
+        return None
+    with data_access.file_lock(path):
+        if not os.path.exists(path) or (not force and os.path.getsize(path) <= limit):
+            return None
+        directory = archive_dir(path)
+        os.makedirs(directory, exist_ok=True)
+        with _manifest_guard(directory):
+            entries = load_manifest(path)
+            name = f"audit_trail_{len(entries) + 1:06d}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.csv"
+            columns, terminator = data_access.read_header(path)
+            # Describe the live file first: until it is moved, its rows are still served from it
+            entry = _describe(os.path.dirname(path), os.path.basename(path), 'csv')
+            if entry['rows'] == 0:
+                return None
+            entry['file'] = name
+            _save_manifest(directory, entries + [entry])
+            os.replace(path, os.path.join(directory, name))
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(','.join(columns or data_access.AUDIT_COLUMNS) + terminator)
+            return _seal(directory, entries, entry, compress)
+
+
+def _rotate_jsonl(limit, compress, force):
+    segment = audit_log.active_segment()
+    if not os.path.exists(segment):
+        return None
+    with data_access.file_lock(segment):
+        if not os.path.exists(segment) or (not force and os.path.getsize(segment) <= limit):
+            return None
+        directory = audit_log.AUDIT_LOG_DIR
+        with _manifest_guard(directory):
+            entries = load_manifest()
+            entry = _describe(directory, os.path.basename(segment), 'jsonl')
+            if entry['rows'] == 0:
+                return None
+            # Starting the next segment makes it the active one
+            open(audit_log.next_segment(), 'ab').close()
+            return _seal(directory, entries, entry, compress)
+
+
+def _referenced_blobs(path=None):
+    """Return the digests of the audit blobs referenced by the live trail and its sealed segments."""
+    if _jsonl(path):
+        files = audit_log.segment_paths()
+    else:
+        directory = archive_dir(path)
+        files = [path or data_access.get_csv_path('audit_trail')]
+        files += [_segment_file(directory, entry['file']) for entry in load_manifest(path)]
+    digests = set()
+    for file in files:
+        if not os.path.exists(file):
+            continue
+        with (gzip.open(file, 'rb') if file.endswith('.gz') else open(file, 'rb')) as f:
+            for line in f:
+                digests.update(m.decode('ascii') for m in _BLOB_REF_RE.findall(line))
+    return digests
+
+
+def expire(before, path=None):
+    """Delete the sealed segments whose newest row is older than before, then the unreferenced blobs.
+
+    before is a timestamp (naive values are UTC); segments without
+    timestamps are kept. Returns the number of segments deleted.
+    """
+    cutoff = data_access.utc_timestamp(before)
+    directory = archive_dir(path)
+    if not os.path.isdir(directory):
+        return 0
+    with _manifest_guard(directory):
+        entries = load_manifest(path)
+        expired = [entry for entry in entries
+                   if entry.get('last_timestamp') and pd.Timestamp(entry['last_timestamp']) < cutoff]
+        if not expired:
+            return 0
+        _save_manifest(directory, [entry for entry in entries if entry not in expired])
+        for entry in expired:
+            file = _segment_file(directory, entry['file'])
+            stale = [file, audit_log.index_path(file)] if entry.get('format') == 'jsonl' else [file]
+            for p in stale:
+                if os.path.exists(p):
+                    os.remove(p)
+    data_access.invalidate_cache('audit_trail')
+    audit_blobs.collect_garbage(_referenced_blobs(path))
+    return len(expired)
+
+
+def _in_range(value, low, high):
+    return (low is None or value >= low) and (high is None or value <= high)
+
+
+def prune(entries, filter=None):
+    """Return the entries that may contain rows matching an iter_audit_trail filter."""
+    filter = filter or {}
+    wanted = filter.get('MutationID')
+    if wanted is not None and not isinstance(wanted, (list, tuple, set)):
+        wanted = [wanted]
+    since, until = filter.get('since'), filter.get('until')
+    kept = []
+    for entry in entries:
+        if wanted is not None and entry.get('mutation_bloom') is not None:
+            if not any(_may_contain(entry['mutation_bloom'], str(w)) for w in wanted):
+                continue
+        elif wanted is not None and entry.get('min_mutation_id') is not None:  # entries from older manifests
+            if not any(_in_range(str(w), entry['min_mutation_id'], entry['max_mutation_id']) for w in wanted):
+                continue
+        if since is not None and entry.get('last_timestamp'):
+            if pd.Timestamp(entry['last_timestamp']) < data_access.utc_timestamp(since):
+                continue
+        if until is not None and entry.get('first_timestamp'):
+            if pd.Timestamp(entry['first_timestamp']) >= data_access.utc_timestamp(until):
+                continue
+        kept.append(entry)
+    return kept
+
+
+def distinct_values(columns=VALUE_COLUMNS, path=None):
+    """Return ({column: set of values}, names of the sealed segments) from the manifest.
+
+    Segments sealed before the manifest recorded their values are streamed.
+    """
+    directory = archive_dir(path)
+    values = {column: set() for column in columns}
+    files = set()
+    for entry in load_manifest(path):
+        files.add(entry['file'])
+        recorded = entry.get('values') or {}
+        if all(column in recorded for column in columns):
+            for column in columns:
+                values[column].update(recorded[column])
+            continue
+        file = _segment_file(directory, entry['file'])
+        if os.path.exists(file):
+            for chunk in _chunks(file, entry.get('format', 'csv'), STATS_CHUNKSIZE):
+                for column in columns:
+                    values[column].update(chunk[column].unique())
+    return values, files
+
+
+def iter_archived_chunks(filter=None, chunksize=STATS_CHUNKSIZE, path=None):
+    """Yield string DataFrame chunks of the archived CSV segments that may match filter."""
+    directory = archive_dir(path)
+    for entry in prune(load_manifest(path), filter):
+        file = _segment_file(directory, entry['file'])
+        if entry.get('format', 'csv') == 'csv' and os.path.exists(file):
+            yield from _csv_chunks(file, chunksize)
@@ -0,0 +1,147 @@
+"""
+Content-addressed storage for large audit payloads.
+
+Agents log the same context and reasoning text several times per workflow
+(request, response, received-response). The audit writer therefore stores
+every Comment/Reasoning value of AUDIT_BLOB_MIN_BYTES or more once, gzipped,
+under data/audit_blobs/<hh>/<sha256>.gz, and writes a reference
+("blob:sha256:<hex>") in the audit row instead. A blob always holds the
+column text exactly as audit_trail.csv would (Reasoning JSON-encoded), in
+both the CSV and the JSONL audit format.
+
+Readers resolve references lazily: get_audit_trail_for_mutation, the query
+engine and the UI call resolve_frame on the rows they return, and each blob
+is read at most once per process.
+
+Blobs are deleted by collect_garbage once no audit row references them;
+audit_archive.expire runs it after deleting expired segments.
+"""
+import functools
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+
+try:
+    from . import data_access
+except ImportError:
+    import data_access
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BLOB_MIN_BYTES = int(os.getenv('AUDIT_BLOB_MIN_BYTES', '1024'))
+AUDIT_BLOB_DIR = os.getenv('AUDIT_BLOB_DIR')  # default: <DATA_DIR>/audit_blobs
+# Blobs written or reused this recently are never collected (their rows may still be queued)
+AUDIT_BLOB_GC_GRACE = float(os.getenv('AUDIT_BLOB_GC_GRACE', '3600'))
+
+REF_PREFIX = 'blob:sha256:'
+PAYLOAD_COLUMNS = ('Comment', 'Reasoning')
+
+_known_lock = threading.Lock()
+_known = {}  # blob path -> time.monotonic() it was last written or touched
+
+
+def blob_dir():
+    return AUDIT_BLOB_DIR or os.path.join(data_access.DATA_DIR, 'audit_blobs')
+
+
+def is_ref(value):
+    return isinstance(value, str) and value.startswith(REF_PREFIX) and len(value) == len(REF_PREFIX) + 64
+
+
+def _path(digest):
+    return os.path.join(blob_dir(), digest[:2], f"{digest}.gz")
+
+
+def pack(value):
+    """Return value, or a reference to its blob if it is a string of AUDIT_BLOB_MIN_BYTES or more."""
+    if not isinstance(value, str) or len(value) < AUDIT_BLOB_MIN_BYTES or is_ref(value):
+        return value
+    data = value.encode('utf-8')
+    if len(data) < AUDIT_BLOB_MIN_BYTES:
+        return value
+    digest = hashlib.sha256(data).hexdigest()
+    path = _path(digest)
+    now = time.monotonic()
+    with _known_lock:
+        touched = _known.get(path)
+    # A reused blob's mtime is refreshed now and then, so collect_garbage keeps it
+    if touched is None or now - touched > AUDIT_BLOB_GC_GRACE / 2:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp, 'wb', compresslevel=6) as f:
+                f.write(data)
+            with open(tmp, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, path)  # identical content, so concurrent writers cannot conflict
+        with _known_lock:
+            _known[path] = now
+    return REF_PREFIX + digest
+
+
+@functools.lru_cache(maxsize=1024)
+def _read(path):
+    with gzip.open(path, 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def resolve(value):
+    """Return the text a reference stands for; other values are returned unchanged."""
+    if not is_ref(value):
+        return value
+    try:
+        return _read(_path(value[len(REF_PREFIX):]))
+    except OSError as e:
+        logger.warning(f"Audit blob {value} could not be read: {e}")
+        return value
+
+
+def collect_garbage(referenced, grace=None):
+    """Delete the blobs whose digest is not in referenced; returns the number deleted.
+
+    Blobs written or reused within grace seconds (default AUDIT_BLOB_GC_GRACE)
+    are kept, since the rows referencing them may not be written yet.
+    """
+    root = blob_dir()
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - (AUDIT_BLOB_GC_GRACE if grace is None else grace)
+    deleted = 0
+    for prefix in os.listdir(root):
+        directory = os.path.join(root, prefix)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            if not name.endswith('.gz') or name[:-3] in referenced:
+                continue
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            with _known_lock:
+                _known.pop(path, None)
+            deleted += 1
+    return deleted
+
+
+def resolve_frame(df, columns=PAYLOAD_COLUMNS):
+    """Return df with the references in columns replaced by their text (df itself if there are none)."""
+    resolved = None
+    for column in columns:
+        if column not in df.columns or df.empty:
+            continue
+        values = df[column]
+        refs = values.astype(str).str.startswith(REF_PREFIX)
+        if refs.any():
+            if resolved is None:
+                resolved = df.copy()
+            resolved[column] = values.where(~refs, values[refs].map(resolve))
+    return df if resolved is None else resolved
@@ -0,0 +1,305 @@
+"""
+Append-only JSONL audit log with a compact MutationID/correlation_id index.
+
+Select it with AUDIT_FORMAT=jsonl. Each audit record is one JSON object per
+line in a segment file (audit-000001.jsonl, ...) under AUDIT_LOG_DIR, with the
+same fields as audit_trail.csv plus correlation_id. Comment is stored as
+written and Reasoning as its decoded value, so neither needs the CSV's extra
+layer of JSON quoting or embedded-newline repair. Large Comment/Reasoning
+values are replaced by blob references (see audit_blobs.py); a referenced
+Reasoning blob holds the JSON-encoded CSV column text.
+
+Next to every segment an append-only index (.audit-000001.idx) holds one
+"<kind>\t<json key>\t<byte offset>" line per key, kind being m (MutationID)
+or c (correlation_id). Lookups load the index incrementally and seek straight
+to the matching records. audit_trail.csv remains available as an export:
+
+    python -m src.audit_log export        # JSONL log -> data/audit_trail.csv
+    python -m src.audit_log import        # data/audit_trail.csv -> JSONL log
+    python -m src.audit_log rebuild-index # rebuild the indexes from the segments
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import re
+import threading
+
+import pandas as pd
+
+try:
+    from . import audit_blobs, data_access
+except ImportError:
+    import audit_blobs
+    import data_access
+
+AUDIT_LOG_DIR = os.getenv('AUDIT_LOG_DIR', os.path.join(data_access.DATA_DIR, 'audit_log'))
+
+RECORD_FIELDS = data_access.AUDIT_COLUMNS + ['correlation_id']
+INDEX_KINDS = {'MutationID': 'm', 'correlation_id': 'c'}
+
+_SEGMENT_RE = re.compile(r'^audit-(\d{6})\.jsonl(\.gz)?$')
+
+_index_lock = threading.Lock()
+_indexes = {}  # segment path -> (index inode, bytes read, {(kind, key): [offsets]})
+
+
+def _archive():
+    try:
+        from . import audit_archive
+    except ImportError:
+        import audit_archive
+    return audit_archive
+
+
+def segment_paths():
+    """Return the segment files in write order.
+
+    While a sealed segment is being compressed, its .jsonl file and the
+    finished .jsonl.gz coexist for a moment; only the .gz is returned then.
+    """
+    if not os.path.isdir(AUDIT_LOG_DIR):
+        return []
+    names = set(n for n in os.listdir(AUDIT_LOG_DIR) if _SEGMENT_RE.match(n))
+    names = sorted(n for n in names if n + '.gz' not in names)
+    return [os.path.join(AUDIT_LOG_DIR, n) for n in names]
+
+
+def next_segment():
+    """Return the path of the segment that follows the newest one."""
+    paths = segment_paths()
+    number = int(_SEGMENT_RE.match(os.path.basename(paths[-1])).group(1)) + 1 if paths else 1
+    return os.path.join(AUDIT_LOG_DIR, f'audit-{number:06d}.jsonl')
+
+
+def active_segment():
+    """Return the segment new records are appended to (sealed .gz segments are never active)."""
+    paths = segment_paths()
+    if paths and not paths[-1].endswith('.gz'):
+        return paths[-1]
+    return next_segment()
+
+
+def index_path(segment):
+    name = os.path.basename(segment)
+    name = name[:name.index('.jsonl')]
+    return os.path.join(os.path.dirname(segment), f".{name}.idx")
+
+
+def _open(segment):
+    return gzip.open(segment, 'rb') if segment.endswith('.gz') else open(segment, 'rb')
+
+
+def _index_lines(record, offset):
+    lines = []
+    for field, kind in INDEX_KINDS.items():
+        key = record.get(field)
+        if key not in (None, ''):
+            lines.append(f"{kind}\t{json.dumps(str(key), ensure_ascii=False)}\t{offset}\n")
+    return lines
+
+
+def _encode(record):
+    record = {field: record.get(field, '') for field in RECORD_FIELDS}
+    return (json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+
+
+def append(records):
+    """Append records (dicts with RECORD_FIELDS) to the active segment and its index.
+
+    Returns the number of records written.
+    """
+    records = list(records)
+    if not records:
+        return 0
+    os.makedirs(AUDIT_LOG_DIR, exist_ok=True)
+    while True:
+        segment = active_segment()
+        with data_access.file_lock(segment):
+            if segment == active_segment():  # not sealed while we waited for the lock
+                _append_locked(segment, records)
+                break
+    data_access.invalidate_cache('audit_trail')
+    return len(records)
+
+
+def _append_locked(segment, records):
+    with open(segment, 'ab') as f:
+        offset = f.seek(0, os.SEEK_END)
+        lines, index = [], []
+        for record in records:
+            line = _encode(record)
+            index.extend(_index_lines(record, offset))
+            lines.append(line)
+            offset += len(line)
+        f.write(b''.join(lines))
+        f.flush()
+        os.fsync(f.fileno())
+    with open(index_path(segment), 'a', encoding='utf-8', newline='\n') as f:
+        f.write(''.join(index))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _load_index(segment):
+    """Return the {(kind, key): [offsets]} index of a segment, reading only new index lines."""
+    path = index_path(segment)
+    with _index_lock:
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'rb') as f:
+            ino = os.fstat(f.fileno()).st_ino
+            cached_ino, read, index = _indexes.get(segment, (None, 0, {}))
+            if cached_ino != ino:  # new or rebuilt index
+                read, index = 0, {}
+            f.seek(read)
+            data = f.read()
+        data = data[:data.rfind(b'\n') + 1]
+        for line in data.decode('utf-8').splitlines():
+            kind, rest = line.split('\t', 1)
+            key, offset = rest.rsplit('\t', 1)
+            index.setdefault((kind, json.loads(key)), []).append(int(offset))
+        _indexes[segment] = (ino, read + len(data), index)
+        return index
+
+
+def _read_at(f, offsets):
+    for offset in sorted(offsets):
+        f.seek(offset)
+        yield json.loads(f.readline())
+
+
+def get_records(mutation_id=None, correlation_id=None):
+    """Return the records for a MutationID and/or correlation_id, in write order."""
+    wanted = [(INDEX_KINDS[field], str(value)) for field, value in
+              (('MutationID', mutation_id), ('correlation_id', correlation_id)) if value is not None]
+    if not wanted:
+        raise ValueError("get_records needs mutation_id or correlation_id")
+    archive = _archive()
+    manifest = {entry['file']: entry for entry in archive.load_manifest()}
+    kept = {entry['file'] for entry in archive.prune(manifest.values(), {'MutationID': mutation_id}
+                                                     if mutation_id is not None else {})}
+    records = []
+    for segment in segment_paths():
+        name = os.path.basename(segment)
+        if name in manifest and name not in kept:
+            continue
+        index = _load_index(segment)
+        offsets = set(index.get(wanted[0], []))
+        for key in wanted[1:]:
+            offsets &= set(index.get(key, []))
+        if offsets:
+            with _open(segment) as f:
+                records.extend(_read_at(f, offsets))
+    return records
+
+
+def iter_records(segments=None):
+    """Yield every record (of the given segments, default all) in write order."""
+    for segment in segment_paths() if segments is None else segments:
+        with _open(segment) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def to_row(record):
+    """Convert a record to the audit_trail.csv column layout (Reasoning JSON-encoded)."""
+    row = {field: record.get(field, '') for field in data_access.AUDIT_COLUMNS}
+    if not audit_blobs.is_ref(row['Reasoning']):  # blobs already hold the encoded column text
+        try:
+            row['Reasoning'] = json.dumps(record.get('Reasoning', ''), ensure_ascii=False)
+        except (TypeError, ValueError):
+            row['Reasoning'] = str(record.get('Reasoning', ''))
+    return {k: '' if v is None else str(v) for k, v in row.items()}
+
+
+def to_frame(records):
+    """Return records as a string DataFrame with the audit_trail.csv columns."""
+    return pd.DataFrame([to_row(r) for r in records], columns=data_access.AUDIT_COLUMNS)
+
+
+def from_row(row):
+    """Convert an audit_trail.csv row (a dict) to a record."""
+    record = {field: row.get(field, '') for field in data_access.AUDIT_COLUMNS}
+    try:
+        if not audit_blobs.is_ref(record['Reasoning']):
+            record['Reasoning'] = json.loads(row.get('Reasoning') or '""')
+    except ValueError:
+        pass
+    record['correlation_id'] = row.get('correlation_id', '')
+    if not record['correlation_id']:
+        # Messages logged without a comment carry the full message, including correlation_id
+        try:
+            comment = json.loads(audit_blobs.resolve(row.get('Comment')) or '')
+            if isinstance(comment, dict):
+                record['correlation_id'] = comment.get('correlation_id', '')
+        except ValueError:
+            pass
+    return record
+
+
+def rebuild_index(segments=None):
+    """Rewrite the index of each segment from its records. Returns {segment: records}."""
+    counts = {}
+    for segment in segments or segment_paths():
+        with data_access.file_lock(segment):
+            lines, count, offset = [], 0, 0
+            with _open(segment) as f:
+                for line in f:
+                    if line.strip():
+                        lines.extend(_index_lines(json.loads(line), offset))
+                        count += 1
+                    offset += len(line)
+            with data_access.atomic_write(index_path(segment), 'w', encoding='utf-8', newline='\n') as f:
+                f.write(''.join(lines))
+        with _index_lock:
+            _indexes.pop(segment, None)
+        counts[segment] = count
+    return counts
+
+
+def export_csv(path=None):
+    """Write the whole log to audit_trail.csv (or path). Returns the number of rows."""
+    path = path or data_access.get_csv_path('audit_trail')
+    count = 0
+    with data_access.file_lock(path):
+        with data_access.atomic_write(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=data_access.AUDIT_COLUMNS)
+            writer.writeheader()
+            for record in iter_records():
+                writer.writerow(to_row(record))
+                count += 1
+    data_access.invalidate_cache('audit_trail')
+    return count
+
+
+def import_csv(path=None, batch_size=1000):
+    """Append the rows of audit_trail.csv (or path) to the log. Returns the number of records."""
+    path = path or data_access.get_csv_path('audit_trail')
+    count, batch = 0, []
+    for row in data_access.iter_audit_trail(path=path):
+        batch.append(from_row(row._asdict()))
+        if len(batch) >= batch_size:
+            count += append(batch)
+            batch = []
+    return count + append(batch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the JSONL audit log.")
+    parser.add_argument('command', choices=['export', 'import', 'rebuild-index'])
+    parser.add_argument('path', nargs='?', help="CSV file for export/import (default: data/audit_trail.csv)")
+    args = parser.parse_args(argv)
+    if args.command == 'export':
+        print(f"exported {export_csv(args.path)} records")
+    elif args.command == 'import':
+        print(f"imported {import_csv(args.path)} records")
+    else:
+        for segment, count in rebuild_index().items():
+            print(f"indexed {os.path.basename(segment)}: {count} records")
+
+
+if __name__ == '__main__':
+    main()
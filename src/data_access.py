@@ -2,11 +2,42 @@
 Robust data access layer for all CSV files in /data/.
 Provides standardized read/write functions and schema validation hooks.
 """
+import collections
+import io
 import os
+import csv
+import json
+import hashlib
+import logging
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:  # Optional: enables sidecars and Arrow-backed ID strings
+    pa = None
+    feather = None
+
+logger = logging.getLogger(__name__)
+
 DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
 
+# Storage backend: 'csv' parses the CSV files directly, 'sidecar' serves reads
+# from memory-mapped columnar snapshots kept next to each CSV (needs pyarrow),
+# 'sqlite' stores every table in a local WAL-mode database (see sqlite_store.py).
+DATA_BACKEND = os.getenv('DATA_BACKEND', 'csv')
+if DATA_BACKEND == 'sidecar' and feather is None:
+    logger.warning("DATA_BACKEND=sidecar needs pyarrow, which is not installed; reading the CSV files directly")
+# Storage format of the audit trail: csv (audit_trail.csv) or jsonl (indexed
+# append-only log, see audit_log.py; audit_trail.csv becomes an export)
+AUDIT_FORMAT = os.getenv('AUDIT_FORMAT', 'csv')
+
 # Map of canonical CSV filenames
 CSV_FILES = {
     'users': 'users.csv',
@@ -32,56 +63,74 @@ def read_csv(name, **kwargs):
     return pd.read_csv(path, comment='#', **kwargs)
 
 def write_csv(name, df, **kwargs):
-    """Write a DataFrame to a CSV file by logical name, preserving header and comments if present."""
-    path = get_csv_path(name)
-    # Optionally, preserve comments and header
-    # For now, just overwrite (extend as needed)
-    df.to_csv(path, index=False, **kwargs)
+    """Write a DataFrame to a CSV file by logical name, preserving the comment preamble.
+
+    The file is replaced atomically (temp file plus rename). Use append_rows or
+    update_rows for changes that do not need a full rewrite.
+    """
+    rewrite_csv(get_csv_path(name), df, **kwargs)
 
 def get_audit_trail_for_mutation(mutation_id):
-    """Return all audit trail entries for a given mutation_id as a DataFrame."""
-    df = read_csv('audit_trail')
-    return df[df['MutationID'] == str(mutation_id)]
+    """Return all audit trail entries for a given mutation_id as a DataFrame.
 
-def rotate_audit_log(max_size_mb=1):
-    """Archive audit_trail.csv if it exceeds max_size_mb (default 1MB)."""
+    Served from the MutationID index while the trail fits the table cache;
+    larger trails are streamed in bounded-memory chunks instead. Archived
+    segments whose manifest Bloom filter may hold mutation_id are included.
+    Comment/Reasoning blob references (see audit_blobs) are resolved.
+    """
+    return _audit_blobs().resolve_frame(_audit_rows_for_mutation(mutation_id))
+
+def _audit_rows_for_mutation(mutation_id):
+    if _audit_jsonl('audit_trail'):
+        log = _audit_log()
+        return _normalise('audit_trail', log.to_frame(log.get_records(mutation_id=str(mutation_id))), validate=False)
     path = get_csv_path('audit_trail')
-    if os.path.exists(path) and os.path.getsize(path) > max_size_mb * 1024 * 1024:
-        import shutil
-        from datetime import datetime
-        archive_name = f"audit_trail_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        archive_path = os.path.join(os.path.dirname(path), archive_name)
-        shutil.move(path, archive_path)
-        # Recreate empty audit_trail.csv with header
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write("AuditID,MutationID,Timestamp,OldStatus,NewStatus,Agent,Comment\n")
-        return archive_path
-    return None
+    if DATA_BACKEND != 'sqlite' and os.path.exists(path) and os.path.getsize(path) > CACHE_MAX_BYTES:
+        rows = list(iter_audit_trail(filter={'MutationID': str(mutation_id)}))
+        return pd.DataFrame(rows, columns=AUDIT_COLUMNS)
+    live = lookup('audit_trail', MutationID=str(mutation_id))
+    if DATA_BACKEND == 'sqlite':
+        return live
+    wanted = {'MutationID': str(mutation_id)}
+    archived = [chunk[_audit_chunk_mask(chunk, wanted)] for chunk in _audit_archive().iter_archived_chunks(wanted)]
+    if not archived:
+        return live
+    combined = pd.concat(archived + [to_text('audit_trail', live)], ignore_index=True)
+    return _normalise('audit_trail', combined, validate=False)
+
+def rotate_audit_log(max_size_mb=None, compress=None):
+    """Seal the audit trail into an archived segment once it exceeds max_size_mb.
+
+    See audit_archive.rotate; defaults come from AUDIT_ROTATE_MB and
+    AUDIT_ARCHIVE_GZIP. Returns the sealed segment's path or None.
+    """
+    return _audit_archive().rotate(max_size_mb=max_size_mb, compress=compress)
 
 
 # --- CSV Schema Definitions (from /docs/csv_schemas.md) ---
+# 'category': True marks low-cardinality columns loaded as pandas categoricals.
 CSV_SCHEMAS = {
     'authorisations': [
         {'name': 'AuthorisationID', 'type': 'string', 'required': True},
         {'name': 'UserID', 'type': 'string', 'required': True},
         {'name': 'RoleID', 'type': 'string', 'required': True},
-        {'name': 'System', 'type': 'string', 'required': True},
-        {'name': 'AccessLevel', 'type': 'string', 'required': True},
+        {'name': 'System', 'type': 'string', 'required': True, 'category': True},
+        {'name': 'AccessLevel', 'type': 'string', 'required': True, 'category': True},
         {'name': 'GrantedBy', 'type': 'string', 'required': True},
         {'name': 'GrantedOn', 'type': 'date', 'required': True},
         {'name': 'ExpiresOn', 'type': 'date', 'required': False},
-        {'name': 'Status', 'type': 'string', 'required': True},
+        {'name': 'Status', 'type': 'string', 'required': True, 'category': True},
     ],
     'hr_mutations': [
         {'name': 'MutationID', 'type': 'string', 'required': True},
         {'name': 'Timestamp', 'type': 'datetime', 'required': True},
         {'name': 'ChangedBy', 'type': 'string', 'required': True},
         {'name': 'ChangedFor', 'type': 'string', 'required': True},
-        {'name': 'ChangeType', 'type': 'string', 'required': True},
+        {'name': 'ChangeType', 'type': 'string', 'required': True, 'category': True},
         {'name': 'FieldChanged', 'type': 'string', 'required': True},
         {'name': 'OldValue', 'type': 'string', 'required': False},
         {'name': 'NewValue', 'type': 'string', 'required': True},
-        {'name': 'Environment', 'type': 'string', 'required': True},
+        {'name': 'Environment', 'type': 'string', 'required': True, 'category': True},
         {'name': 'Metadata', 'type': 'string', 'required': False},
         {'name': 'change_investigation', 'type': 'string', 'required': True},
         {'name': 'Reason', 'type': 'string', 'required': False},
@@ -89,47 +138,47 @@ CSV_SCHEMAS = {
     ],
     'role_authorisations': [
         {'name': 'RoleID', 'type': 'string', 'required': True},
-        {'name': 'System', 'type': 'string', 'required': True},
-        {'name': 'AccessLevel', 'type': 'string', 'required': True},
+        {'name': 'System', 'type': 'string', 'required': True, 'category': True},
+        {'name': 'AccessLevel', 'type': 'string', 'required': True, 'category': True},
     ],
     'roles': [
         {'name': 'RoleID', 'type': 'string', 'required': True},
         {'name': 'RoleName', 'type': 'string', 'required': True},
-        {'name': 'Department', 'type': 'string', 'required': True},
+        {'name': 'Department', 'type': 'string', 'required': True, 'category': True},
         {'name': 'Description', 'type': 'string', 'required': False},
         {'name': 'DefaultAuthorisations', 'type': 'string', 'required': False},
     ],
     'users': [
         {'name': 'UserID', 'type': 'string', 'required': True},
         {'name': 'Name', 'type': 'string', 'required': True},
-        {'name': 'Department', 'type': 'string', 'required': True},
+        {'name': 'Department', 'type': 'string', 'required': True, 'category': True},
         {'name': 'JobTitle', 'type': 'string', 'required': True},
-        {'name': 'Status', 'type': 'string', 'required': True},
+        {'name': 'Status', 'type': 'string', 'required': True, 'category': True},
         {'name': 'Email', 'type': 'string', 'required': True},
         {'name': 'Manager', 'type': 'string', 'required': False},
         {'name': 'HireDate', 'type': 'date', 'required': True},
         {'name': 'TerminationDate', 'type': 'date', 'required': False},
-        {'name': 'Environment', 'type': 'string', 'required': True},
+        {'name': 'Environment', 'type': 'string', 'required': True, 'category': True},
     ],
     'sickLeave': [
         {'name': 'UserID', 'type': 'string', 'required': True},
         {'name': 'StartDate', 'type': 'date', 'required': True},
         {'name': 'EndDate', 'type': 'date', 'required': True},
-        {'name': 'Status', 'type': 'string', 'required': True},
+        {'name': 'Status', 'type': 'string', 'required': True, 'category': True},
     ],
     'vacation': [
         {'name': 'UserID', 'type': 'string', 'required': True},
         {'name': 'StartDate', 'type': 'date', 'required': True},
         {'name': 'EndDate', 'type': 'date', 'required': True},
-        {'name': 'Status', 'type': 'string', 'required': True},
+        {'name': 'Status', 'type': 'string', 'required': True, 'category': True},
     ],
     'audit_trail': [
         {'name': 'AuditID', 'type': 'string', 'required': True},
         {'name': 'MutationID', 'type': 'string', 'required': True},
         {'name': 'Timestamp', 'type': 'datetime', 'required': True},
-        {'name': 'OldStatus', 'type': 'string', 'required': False},
-        {'name': 'NewStatus', 'type': 'string', 'required': True},
-        {'name': 'Agent', 'type': 'string', 'required': True},
+        {'name': 'OldStatus', 'type': 'string', 'required': False, 'category': True},
+        {'name': 'NewStatus', 'type': 'string', 'required': True, 'category': True},
+        {'name': 'Agent', 'type': 'string', 'required': True, 'category': True},
         {'name': 'Comment', 'type': 'string', 'required': False},
         {'name': 'Reasoning', 'type': 'string', 'required': False},
     ],
@@ -138,70 +187,1342 @@ CSV_SCHEMAS = {
 import numpy as np
 from pandas.api.types import is_string_dtype, is_datetime64_any_dtype
 
-def _check_type(series, expected_type):
-    if expected_type == 'string':
-        return is_string_dtype(series) or series.dtype == object
-    if expected_type == 'date':
-        # Accept string or datetime for date, and allow empty/NaN for optional columns
-        # If all non-empty values are string or datetime, it's valid
-        mask = (~series.isna()) & (series.astype(str).str.strip() != '')
-        if mask.any():
-            filtered = series.loc[mask]
-            return (is_string_dtype(series) or is_datetime64_any_dtype(series)
-                    or filtered.apply(lambda x: isinstance(x, str) or pd.isna(x)).all())
+# Fixed parse formats for the documented date/datetime column types
+DATE_FORMATS = {
+    'date': '%Y-%m-%d',
+    'datetime': 'ISO8601',
+}
+
+def is_text(series):
+    """Return True if series holds text (object, string or text-categorical dtype)."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        dtype = dtype.categories.dtype
+    return is_string_dtype(dtype) or dtype == object
+
+class SchemaValidator:
+    """Validator compiled once from a CSV_SCHEMAS entry.
+
+    All checks are vectorized. In incremental mode the validator remembers a
+    hash per row of the last frame it accepted and only re-checks rows whose
+    hash it has not seen before.
+    """
+
+    def __init__(self, name, schema):
+        self.name = name
+        self.columns = [col['name'] for col in schema]
+        self.known = frozenset(self.columns)
+        self.required = [col['name'] for col in schema if col['required']]
+        self.required_set = frozenset(self.required)
+        self.types = {col['name']: col['type'] for col in schema}
+        self._lock = threading.Lock()
+        self._validated_columns = None
+        self._validated_hashes = None
+
+    def _check_type(self, series, expected_type):
+        """Return the number of values that do not match expected_type, or -1 for a dtype mismatch."""
+        if expected_type == 'string':
+            return 0 if is_text(series) else -1
+        if expected_type in DATE_FORMATS:
+            if is_datetime64_any_dtype(series):
+                return 0
+            if not is_text(series):
+                return -1
+            present = series.notna() & (series != '')
+            if not present.any():
+                return 0
+            parsed = pd.to_datetime(series[present], format=DATE_FORMATS[expected_type],
+                                    errors='coerce', utc=True)
+            return int(parsed.isna().sum())
+        return 0  # fallback
+
+    def _changed_rows(self, columns, hashes):
+        with self._lock:
+            if self._validated_hashes is None or self._validated_columns != columns:
+                return np.ones(len(hashes), dtype=bool)
+            return np.isin(hashes, self._validated_hashes, invert=True)
+
+    def validate(self, df, incremental=False):
+        errors = [f"Missing required column: {c}" for c in self.required if c not in df.columns]
+        errors += [f"Unexpected column: {c}" for c in df.columns if c not in self.known]
+        rows = df
+        if incremental:
+            columns = tuple(df.columns)
+            hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+            changed = self._changed_rows(columns, hashes)
+            rows = df[changed] if not changed.all() else df
+        if len(rows):
+            for col in self.columns:
+                if col not in rows.columns:
+                    continue
+                series = rows[col]
+                bad = self._check_type(series, self.types[col])
+                if bad < 0:
+                    errors.append(f"Column {col} has wrong type (expected {self.types[col]})")
+                elif bad:
+                    errors.append(f"Column {col} has wrong type (expected {self.types[col]}, "
+                                  f"{bad} unparseable value(s))")
+                if col in self.required_set:
+                    missing = series.isna()
+                    if is_text(series):
+                        missing |= series == ''
+                    if missing.any():
+                        errors.append(f"Column {col} has missing values")
+        if errors:
+            raise ValueError(f"Schema validation failed for {self.name}:\n" + '\n'.join(errors))
+        if incremental:
+            with self._lock:
+                self._validated_columns = columns
+                self._validated_hashes = np.unique(hashes)
         return True
-    if expected_type == 'datetime':
-        return is_datetime64_any_dtype(series) or is_string_dtype(series)
-    return True  # fallback
 
-def validate_schema(name, df):
-    """Validate DataFrame columns/types against documented schema."""
-    schema = CSV_SCHEMAS.get(name)
-    if not schema:
+    def reset(self):
+        """Forget the last validated version so the next incremental run checks every row."""
+        with self._lock:
+            self._validated_columns = None
+            self._validated_hashes = None
+
+_VALIDATORS = {name: SchemaValidator(name, schema) for name, schema in CSV_SCHEMAS.items()}
+
+def validate_schema(name, df, incremental=False):
+    """Validate DataFrame columns/types against documented schema.
+
+    With incremental=True only rows not present in the last successfully
+    validated version of the table are checked.
+    """
+    validator = _VALIDATORS.get(name)
+    if validator is None:
         return True  # No schema to validate
-    errors = []
-    # Check required columns
-    for col in schema:
-        if col['required'] and col['name'] not in df.columns:
-            errors.append(f"Missing required column: {col['name']}")
-    # Check for extra columns
-    for c in df.columns:
-        if c not in [col['name'] for col in schema]:
-            errors.append(f"Unexpected column: {c}")
-    # Check types (best effort)
-    for col in schema:
-        if col['name'] in df.columns:
-            if not _check_type(df[col['name']], col['type']):
-                errors.append(f"Column {col['name']} has wrong type (expected {col['type']})")
-        if col['required'] and col['name'] in df.columns:
-            if df[col['name']].isnull().any() or (df[col['name']]=='' ).any():
-                errors.append(f"Column {col['name']} has missing values")
-    if errors:
-        raise ValueError(f"Schema validation failed for {name}:\n" + '\n'.join(errors))
-    return True
+    return validator.validate(df, incremental=incremental)
+
+# --- Schema-driven dtypes ---
+# Tables are loaded with their dtypes chosen up front from CSV_SCHEMAS:
+# categoricals for low-cardinality columns, Arrow-backed strings for ID
+# columns when pyarrow is available, and datetime64 for date/datetime
+# columns. to_text renders them back to the on-disk text form.
+def _arrow_string_dtype():
+    if pa is None:
+        return str
+    try:
+        return pd.StringDtype('pyarrow', na_value=np.nan)
+    except TypeError:  # pandas < 2.3 has no na_value option
+        return pd.StringDtype('pyarrow')
+
+ID_DTYPE = _arrow_string_dtype()
+
+_DTYPES = {
+    name: {
+        col['name']: ('category' if col.get('category')
+                      else ID_DTYPE if col['name'].endswith('ID') else str)
+        for col in schema
+    }
+    for name, schema in CSV_SCHEMAS.items()
+}
+
+def _read_dtypes(name):
+    return dict(_DTYPES.get(name, {}))
+
+def _parse_dates(name, df):
+    validator = _VALIDATORS.get(name)
+    if validator is None:
+        return df
+    for col, col_type in validator.types.items():
+        if col_type in DATE_FORMATS and col in df.columns and not is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], format=DATE_FORMATS[col_type], errors='coerce',
+                                     utc=(col_type == 'datetime'))
+    return df
+
+def _format_dates(series, col_type):
+    if col_type == 'date':
+        return series.dt.strftime('%Y-%m-%d')
+    if series.dt.tz is None:
+        return series.dt.strftime('%Y-%m-%dT%H:%M:%S.%f')
+    return series.dt.tz_convert('UTC').dt.strftime('%Y-%m-%dT%H:%M:%S.%f+00:00')
+
+def to_text(name, df):
+    """Render typed columns back to the text form stored on disk."""
+    validator = _VALIDATORS.get(name)
+    if validator is None:
+        return df
+    out = None
+    for col, col_type in validator.types.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if col_type in DATE_FORMATS and is_datetime64_any_dtype(series):
+            rendered = _format_dates(series, col_type)
+        elif not is_text(series) and not is_datetime64_any_dtype(series):
+            rendered = series.astype(str).where(series.notna())
+        else:
+            continue
+        if out is None:
+            out = df.copy()
+        out[col] = rendered
+    return df if out is None else out
+
+def memory_footprint(names=None):
+    """Return {table: {'rows': n, 'bytes': deep in-memory size}} for the given (default: all) tables."""
+    report = {}
+    for name in names or CSV_FILES:
+        df = read_csv(name)
+        report[name] = {'rows': len(df), 'bytes': int(df.memory_usage(index=True, deep=True).sum())}
+    return report
 
 # Integrate schema validation into read_csv and write_csv
 _ORIG_read_csv = read_csv
+def _sqlite():
+    try:
+        from . import sqlite_store
+    except ImportError:
+        import sqlite_store
+    return sqlite_store
+
+def _audit_log():
+    try:
+        from . import audit_log
+    except ImportError:
+        import audit_log
+    return audit_log
+
+def _audit_archive():
+    try:
+        from . import audit_archive
+    except ImportError:
+        import audit_archive
+    return audit_archive
+
+def _audit_blobs():
+    try:
+        from . import audit_blobs
+    except ImportError:
+        import audit_blobs
+    return audit_blobs
+
+def _audit_jsonl(name):
+    return name == 'audit_trail' and AUDIT_FORMAT == 'jsonl'
+
+def _load_table(name, **kwargs):
+    if _audit_jsonl(name):
+        if kwargs:
+            raise ValueError("pandas read options are not supported by the JSONL audit log")
+        log = _audit_log()
+        return _normalise(name, log.to_frame(log.iter_records()))
+    if DATA_BACKEND == 'sqlite':
+        if kwargs:
+            raise ValueError("pandas read options are not supported by the sqlite backend")
+        return _normalise(name, _sqlite().read_table(name))
+    kwargs.setdefault('dtype', _read_dtypes(name))
+    return _normalise(name, _ORIG_read_csv(name, **kwargs))
+
+def _normalise(name, df, validate=True):
+    """Apply the schema dtypes and (incremental) schema validation.
+
+    Validation runs on the text form of the table; date and datetime columns
+    are parsed to datetime64 afterwards.
+    """
+    dtypes = _read_dtypes(name)
+    for col, dtype in dtypes.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if dtype is str:
+            # Text columns stay as read (object on pandas 2, str on pandas 3); astype(str)
+            # would turn missing values into the literal 'nan' on pandas 2
+            if not is_text(df[col]):
+                df[col] = df[col].astype(str).where(df[col].notna())
+        else:
+            df[col] = df[col].astype(dtype)
+    if validate:
+        validate_schema(name, df, incremental=True)
+    return _parse_dates(name, df)
+
 def read_csv(name, **kwargs):
-    df = _ORIG_read_csv(name, **kwargs)
-    # Ensure OldValue/NewValue are string for hr_mutations
-    if name == 'hr_mutations':
-        for col in ['OldValue', 'NewValue']:
-            if col in df.columns:
-                df[col] = df[col].astype(str)
-    # For audit_trail, coerce all columns to string before validation
-    if name == 'audit_trail':
-        for col in df.columns:
-            df[col] = df[col].astype(str)
-    validate_schema(name, df)
-    return df
+    """Read and validate a CSV file by logical name.
+
+    Plain reads (no pandas kwargs) are served from the in-process table cache
+    while the file on disk is unchanged.
+    """
+    if kwargs:
+        return _load_table(name, **kwargs)
+    snapshot = _active_snapshot.get()
+    if snapshot is not None and name in snapshot.stamps:
+        return snapshot.table(name)
+    stamp = _table_stamp(name)
+    df = _cache_get(name, stamp)
+    if df is None:
+        if DATA_BACKEND == 'sidecar' and feather is not None:
+            df = _load_sidecar(name, stamp)
+        else:
+            df = _load_table(name)
+        _cache_put(name, stamp, df)
+    return _frame_view(df)
 
 _ORIG_write_csv = write_csv
 def write_csv(name, df, **kwargs):
-    # Ensure OldValue/NewValue are string for hr_mutations
-    if name == 'hr_mutations':
-        for col in ['OldValue', 'NewValue']:
-            if col in df.columns:
-                df[col] = df[col].astype(str)
-    validate_schema(name, df)
-    _ORIG_write_csv(name, df, **kwargs)
+    df = to_text(name, df)
+    validate_schema(name, df, incremental=True)
+    try:
+        if DATA_BACKEND == 'sqlite':
+            _sqlite().write_table(name, df)
+        else:
+            with file_lock(get_csv_path(name)):
+                _ORIG_write_csv(name, df, **kwargs)
+    finally:
+        invalidate_cache(name)
+
+
+# --- In-process table cache ---
+# Parsed and validated frames keyed on logical name plus the file's
+# (mtime_ns, size, inode) stamp, evicted least-recently-used once the
+# configured memory budget is exceeded.
+CACHE_MAX_BYTES = int(float(os.getenv('DATA_CACHE_MAX_MB', '256')) * 1024 * 1024)
+
+_cache_lock = threading.Lock()
+_cache = OrderedDict()  # name -> (stamp, df, nbytes)
+_cache_bytes = 0
+_cache_counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+def file_stamp(path):
+    """Return the (mtime_ns, size, inode) stamp of a file, or None if it is missing."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _table_stamp(name):
+    """Return the version stamp of a table in the active backend."""
+    if _audit_jsonl(name):
+        return ('jsonl',) + tuple(file_stamp(p) for p in _audit_log().segment_paths())
+    if DATA_BACKEND == 'sqlite':
+        store = _sqlite()
+        return ('sqlite', store.SQLITE_PATH, store.table_version(name))
+    return file_stamp(_table_path(name))
+
+def table_version(name):
+    """Return a short string that changes whenever the table changes (usable as a cache key)."""
+    return hashlib.sha1(repr(_table_stamp(name)).encode('utf-8')).hexdigest()[:12]
+
+def _copy_on_write_enabled():
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    return bool(pd.get_option('mode.copy_on_write'))
+
+def _frame_view(df):
+    """Hand out a frame callers may mutate without corrupting the cached one."""
+    return df.copy(deep=not _copy_on_write_enabled())
+
+def _cache_get(name, stamp):
+    with _cache_lock:
+        entry = _cache.get(name)
+        if entry is not None and stamp is not None and entry[0] == stamp:
+            _cache.move_to_end(name)
+            _cache_counters['hits'] += 1
+            return entry[1]
+        _cache_counters['misses'] += 1
+        return None
+
+def _cache_put(name, stamp, df):
+    global _cache_bytes
+    if stamp is None:
+        return
+    nbytes = int(df.memory_usage(index=True, deep=True).sum())
+    with _cache_lock:
+        old = _cache.pop(name, None)
+        if old is not None:
+            _cache_bytes -= old[2]
+        if nbytes > CACHE_MAX_BYTES:
+            return
+        _cache[name] = (stamp, df, nbytes)
+        _cache_bytes += nbytes
+        while _cache_bytes > CACHE_MAX_BYTES and _cache:
+            _, (_, _, evicted) = _cache.popitem(last=False)
+            _cache_bytes -= evicted
+            _cache_counters['evictions'] += 1
+
+def invalidate_cache(name=None):
+    """Drop one cached table and its indexes (or all of them when name is None)."""
+    global _cache_bytes
+    _drop_indexes(name)
+    if name is None:
+        _drop_snapshot()
+    with _cache_lock:
+        if name is None:
+            _cache.clear()
+            _cache_bytes = 0
+            return
+        old = _cache.pop(name, None)
+        if old is not None:
+            _cache_bytes -= old[2]
+
+def set_cache_budget(max_bytes):
+    """Change the cache memory budget, evicting entries that no longer fit."""
+    global CACHE_MAX_BYTES, _cache_bytes
+    with _cache_lock:
+        CACHE_MAX_BYTES = int(max_bytes)
+        while _cache_bytes > CACHE_MAX_BYTES and _cache:
+            _, (_, _, evicted) = _cache.popitem(last=False)
+            _cache_bytes -= evicted
+            _cache_counters['evictions'] += 1
+
+def cache_stats():
+    """Return hit/miss/eviction counters and current cache occupancy."""
+    with _cache_lock:
+        return {
+            **_cache_counters,
+            'entries': len(_cache),
+            'bytes': _cache_bytes,
+            'max_bytes': CACHE_MAX_BYTES,
+        }
+
+
+# --- Columnar sidecar snapshots ---
+# Each CSV stays the human-editable source of truth. A Feather (Arrow IPC)
+# snapshot of the parsed, validated frame is kept next to it as
+# .<file>.feather and memory-mapped on read. The snapshot records the stamp
+# of the CSV it was built from and is rebuilt when that stamp changes.
+
+SIDECAR_STAMP_KEY = b'data_access.source_stamp'
+
+def get_sidecar_path(name):
+    """Get the absolute path of the columnar sidecar for a CSV file."""
+    path = get_csv_path(name)
+    return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.feather")
+
+def _read_sidecar(name, stamp):
+    """Return the sidecar frame if it was built from the given CSV stamp, else None."""
+    try:
+        table = feather.read_table(get_sidecar_path(name), memory_map=True)
+    except (OSError, pa.ArrowInvalid):
+        return None
+    metadata = table.schema.metadata or {}
+    if metadata.get(SIDECAR_STAMP_KEY) != json.dumps(list(stamp)).encode():
+        return None
+    # pandas < 3 maps Arrow strings back to string[python]; restore the schema dtypes
+    return _normalise(name, table.to_pandas(), validate=False)
+
+def _write_sidecar(name, stamp, df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[SIDECAR_STAMP_KEY] = json.dumps(list(stamp)).encode()
+    table = table.replace_schema_metadata(metadata)
+    path = get_sidecar_path(name)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    # Uncompressed so the file can be memory-mapped without decoding
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+
+def _load_sidecar(name, stamp):
+    if stamp is None:
+        return _load_table(name)
+    df = _read_sidecar(name, stamp)
+    if df is None:
+        df = _load_table(name)
+        try:
+            _write_sidecar(name, stamp, df)
+        except (OSError, pa.ArrowException):
+            pass  # Snapshot is an optimisation only; the CSV read already succeeded
+    return df
+
+def build_sidecars(names=None):
+    """Build (or refresh) sidecars for the given tables, defaulting to all CSV_FILES.
+
+    Returns the list of tables whose sidecar is current. Tables that fail
+    schema validation are skipped.
+    """
+    if feather is None:
+        raise RuntimeError("Columnar sidecars require pyarrow")
+    built = []
+    for name in names or CSV_FILES:
+        stamp = file_stamp(get_csv_path(name))
+        if stamp is None:
+            continue
+        try:
+            _load_sidecar(name, stamp)
+        except ValueError:
+            continue
+        built.append(name)
+    return built
+
+
+# --- Secondary indexes ---
+# Hash indexes on declared key columns, mapping each key value to the row
+# positions holding it. An index is tied to the file stamp it was built
+# from and is rebuilt lazily once the file changes.
+
+# Tables that live in DATA_DIR but are owned by other modules
+AUX_FILES = {
+    'pending_actions': 'pending_actions.csv',
+}
+
+INDEX_KEYS = {
+    'users': ['UserID'],
+    'authorisations': ['UserID'],
+    'sickLeave': ['UserID'],
+    'vacation': ['UserID'],
+    'hr_mutations': ['MutationID'],
+    'audit_trail': ['MutationID'],
+    'roles': ['RoleID'],
+    'role_authorisations': ['RoleID'],
+    'pending_actions': ['action_id', 'recipient_id'],
+}
+
+_index_lock = threading.Lock()
+_indexes = {}  # name -> {'stamp': ..., 'df': ..., 'columns': {column: {value: positions}}}
+
+def resolve_name(name):
+    """Accept either a logical table name or its file name (e.g. 'users.csv')."""
+    if name in CSV_FILES or name in AUX_FILES:
+        return name
+    for logical, filename in {**CSV_FILES, **AUX_FILES}.items():
+        if name == filename:
+            return logical
+    raise ValueError(f"Unknown CSV file: {name}")
+
+def _table_path(name):
+    if name in AUX_FILES:
+        return os.path.join(DATA_DIR, AUX_FILES[name])
+    return get_csv_path(name)
+
+def read_table(name):
+    """Read any indexable table by logical name.
+
+    CSV_FILES tables go through read_csv; auxiliary tables such as
+    pending_actions are read as plain strings with no comment handling,
+    since their free-text columns may contain '#', keeping only the current
+    row of each action.
+    """
+    name = resolve_name(name)
+    if name in CSV_FILES:
+        return read_csv(name)
+    stamp = _table_stamp(name)
+    df = _cache_get(name, stamp)
+    if df is None:
+        if DATA_BACKEND == 'sqlite':
+            df = _sqlite().read_table(name).fillna('')
+        else:
+            df = pd.read_csv(_table_path(name), dtype=str, keep_default_na=False)
+            if name == 'pending_actions':
+                # An append-only log of action states (see pending_actions); the last row per action_id is current
+                df = df.drop_duplicates('action_id', keep='last', ignore_index=True)
+        _cache_put(name, stamp, df)
+    return _frame_view(df)
+
+def _drop_indexes(name=None):
+    with _index_lock:
+        if name is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(name, None)
+
+def _get_index(name, column):
+    """Return (df, {value: positions}) for a declared key column, building it if stale."""
+    snapshot = _active_snapshot.get()
+    if snapshot is not None and name in snapshot.stamps:
+        return snapshot.index(name, column)
+    stamp = _table_stamp(name)
+    with _index_lock:
+        entry = _indexes.get(name)
+        if entry is not None and entry['stamp'] == stamp and column in entry['columns']:
+            return entry['df'], entry['columns'][column]
+    df = read_table(name)
+    index = df.groupby(column, sort=False, dropna=True).indices
+    with _index_lock:
+        entry = _indexes.get(name)
+        if entry is None or entry['stamp'] != stamp:
+            entry = {'stamp': stamp, 'df': df, 'columns': {}}
+            _indexes[name] = entry
+        else:
+            df = entry['df']
+        entry['columns'].setdefault(column, index)
+        return df, entry['columns'][column]
+
+def lookup(name, **keys):
+    """Return the rows of a table matching all key=value filters as a DataFrame.
+
+    When a filter targets a declared key column (see INDEX_KEYS) the candidate
+    rows come straight from its hash index; any remaining filters are applied
+    to that small candidate set only. Queries without an indexed column fall
+    back to a single combined mask over the table.
+    """
+    name = resolve_name(name)
+    snapshot = _active_snapshot.get()
+    if DATA_BACKEND == 'sqlite' and (snapshot is None or name not in snapshot.stamps):
+        df = _sqlite().query(name, **keys)
+        if name in AUX_FILES:
+            return df.fillna('')
+        return _normalise(name, df, validate=False)
+    indexed = [k for k in INDEX_KEYS.get(name, []) if k in keys]
+    if indexed:
+        df, index = _get_index(name, indexed[0])
+        positions = index.get(keys[indexed[0]])
+        if positions is None:
+            return df.iloc[0:0]
+        result = df.iloc[positions]
+        rest = {k: v for k, v in keys.items() if k != indexed[0]}
+    else:
+        result = read_table(name)
+        rest = keys
+    if rest:
+        mask = np.ones(len(result), dtype=bool)
+        for k, v in rest.items():
+            mask &= (result[k] == v).to_numpy(dtype=bool, na_value=False)
+        result = result[mask]
+    return result
+
+
+# --- Consistent multi-table snapshots ---
+# A DataSnapshot records the stamps of the CSV_FILES tables at one moment,
+# plus a version derived from them, and loads each table on first use.
+# get_snapshot() shares one snapshot between concurrent workflows until one
+# of its files changes. Inside use_snapshot(), read_csv, read_table, lookup
+# and the query engine read from the active snapshot; the ContextVar is
+# inherited by awaited coroutines and asyncio.to_thread tool calls. Tables
+# the workflows append to themselves (SNAPSHOT_EXCLUDE, and auxiliary
+# tables such as pending_actions) are always read live.
+SNAPSHOT_EXCLUDE = ('audit_trail',)
+
+_active_snapshot = ContextVar('data_snapshot', default=None)
+_snapshot_lock = threading.Lock()
+_snapshot = None
+
+class DataSnapshot:
+    """A read-only view of the CSV_FILES tables as they were when it was taken.
+
+    Tables are loaded lazily. A table that changed between taking the
+    snapshot and its first use (or kept changing while it was read) cannot
+    be served as it was: its current data is used and the table is listed
+    in `inconsistent`.
+    """
+
+    def __init__(self, stamps, attempts=3):
+        self.stamps = stamps
+        self.version = hashlib.sha1(repr(sorted(stamps.items())).encode('utf-8')).hexdigest()[:12]
+        self.attempts = attempts
+        self.inconsistent = set()
+        self._tables = {}
+        self._indexes = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls, names=None, attempts=3):
+        """Take a snapshot of the given (default: all but SNAPSHOT_EXCLUDE) tables."""
+        names = [name for name in names or CSV_FILES if names or name not in SNAPSHOT_EXCLUDE]
+        return cls({name: _table_stamp(name) for name in names}, attempts)
+
+    @property
+    def consistent(self):
+        return not self.inconsistent
+
+    def _load(self, name):
+        token = _active_snapshot.set(None)  # Always load from the live tables
+        try:
+            for _ in range(self.attempts):
+                before = _table_stamp(name)
+                try:
+                    df = read_csv(name)
+                except Exception as e:  # Re-raised when the table is used
+                    df = e
+                after = _table_stamp(name)
+                if after == before:
+                    break
+        finally:
+            _active_snapshot.reset(token)
+        if before != after or before != self.stamps[name]:
+            self.inconsistent.add(name)
+            logger.warning("Snapshot %s: %s changed after the snapshot was taken; serving current data",
+                           self.version, name)
+        return df
+
+    def is_current(self):
+        """True while none of the underlying tables changed since the snapshot was taken."""
+        return all(_table_stamp(name) == stamp for name, stamp in self.stamps.items())
+
+    def table(self, name):
+        name = resolve_name(name)
+        with self._lock:
+            if name not in self._tables:
+                self._tables[name] = self._load(name)
+            df = self._tables[name]
+        if isinstance(df, Exception):
+            raise df
+        return _frame_view(df)
+
+    def index(self, name, column):
+        """Return (df, {value: positions}) for a key column of a snapshot table."""
+        with self._lock:
+            if (name, column) not in self._indexes:
+                df = self.table(name)
+                self._indexes[name, column] = (df, df.groupby(column, sort=False, dropna=True).indices)
+            return self._indexes[name, column]
+
+def get_snapshot():
+    """Return the shared snapshot, taking a new one only when one of its tables changed."""
+    global _snapshot
+    with _snapshot_lock:
+        if _snapshot is None or not _snapshot.is_current():
+            _snapshot = DataSnapshot.load()
+        return _snapshot
+
+def _drop_snapshot():
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = None
+
+def active_snapshot():
+    """Return the snapshot active in the current context, or None."""
+    return _active_snapshot.get()
+
+@contextmanager
+def use_snapshot(snapshot=None):
+    """Serve reads in this context from one snapshot (the active or shared one by default)."""
+    snapshot = snapshot or _active_snapshot.get() or get_snapshot()
+    token = _active_snapshot.set(snapshot)
+    try:
+        yield snapshot
+    finally:
+        _active_snapshot.reset(token)
+
+
+# --- Append-only writes ---
+# New rows are validated on their own and appended under a cross-process
+# file lock, so existing content (including comment headers) is never
+# rewritten and concurrent submitters cannot overwrite each other.
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive cross-process lock on path via a .lock file next to it."""
+    lock_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.lock")
+    with open(lock_path, 'a+b') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+def read_header(path):
+    """Return (columns, line_terminator) of the first non-comment line of a CSV file."""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for line in f:
+            if line.strip() and not line.lstrip().startswith('#'):
+                terminator = '\r\n' if line.endswith('\r\n') else '\n'
+                return next(csv.reader([line])), terminator
+    return None, '\n'
+
+def _cell(value):
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ''
+    return str(value)
+
+def _rows_frame(name, rows, columns):
+    """Build a string frame from dicts, keeping unknown keys as extra columns for validation."""
+    new_df = pd.DataFrame([[row.get(c) for c in columns] for row in rows], columns=columns)
+    new_df = _parse_dates(name, new_df) if any(isinstance(v, pd.Timestamp) for row in rows
+                                               for v in row.values()) else new_df
+    new_df = to_text(name, new_df)
+    new_df = new_df.apply(lambda col: col.map(_cell))
+    for k in sorted({k for row in rows for k in row} - set(columns)):
+        new_df[k] = [_cell(row.get(k)) for row in rows]
+    return new_df
+
+def _schema_columns(name, rows):
+    schema = CSV_SCHEMAS.get(name)
+    return [col['name'] for col in schema] if schema else list(rows[0])
+
+def append_rows(name, rows):
+    """Append rows (a list of dicts) to a CSV file by logical name.
+
+    Only the new rows are validated against CSV_SCHEMAS. The append happens
+    under a file lock with a single fsync and never touches existing content.
+    Returns the number of rows written.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    if _audit_jsonl(name):
+        new_df = _rows_frame(name, rows, _schema_columns(name, rows))
+        validate_schema(name, new_df)
+        log = _audit_log()
+        return log.append(log.from_row(row) for row in new_df.to_dict(orient='records'))
+    if DATA_BACKEND == 'sqlite':
+        new_df = _rows_frame(name, rows, _schema_columns(name, rows))
+        validate_schema(name, new_df)
+        _sqlite().append(name, new_df)
+        invalidate_cache(name)
+        return len(rows)
+    path = get_csv_path(name)
+    with file_lock(path):
+        columns, terminator = (None, '\n')
+        if os.path.exists(path):
+            columns, terminator = read_header(path)
+        write_header = columns is None
+        if write_header:
+            columns = _schema_columns(name, rows)
+        new_df = _rows_frame(name, rows, columns)
+        validate_schema(name, new_df)
+        with open(path, 'a+b') as f:
+            needs_newline = False
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) not in (b'\n', b'\r')
+            buf = io.StringIO()
+            writer = csv.writer(buf, lineterminator=terminator)
+            if needs_newline:
+                buf.write(terminator)
+            if write_header:
+                writer.writerow(columns)
+            writer.writerows(new_df[columns].itertuples(index=False, name=None))
+            f.seek(0, os.SEEK_END)
+            f.write(buf.getvalue().encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+    invalidate_cache(name)
+    return len(rows)
+
+
+# --- Comment-preserving writes ---
+# The leading '#' comment lines of a CSV file document its columns for
+# operators. Their byte range is remembered per file stamp; full rewrites
+# copy it verbatim into a temp file that atomically replaces the original,
+# and update_rows re-serializes only the records from the first changed row
+# on, copying everything before them byte for byte.
+_preamble_lock = threading.Lock()
+_preambles = {}  # path -> (stamp, end offset)
+
+def preamble_end(path):
+    """Return the byte offset where the leading comment/blank lines of path end."""
+    stamp = file_stamp(path)
+    with _preamble_lock:
+        cached = _preambles.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    end = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip() and not line.lstrip().startswith(b'#'):
+                break
+            end += len(line)
+    with _preamble_lock:
+        _preambles[path] = (stamp, end)
+    return end
+
+@contextmanager
+def atomic_write(path, mode='w', **kwargs):
+    """Open a uniquely named temp file next to path; on success it atomically replaces path.
+
+    The temp file keeps path's permissions, is fsynced before the rename and
+    is removed if the block raises, so readers see either the old or the
+    new file and concurrent writers never share a temp file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def rewrite_csv(path, df, **kwargs):
+    """Atomically replace path with df, keeping its comment preamble and line terminator."""
+    preamble = b''
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            preamble = f.read(preamble_end(path))
+        kwargs.setdefault('lineterminator', read_header(path)[1])
+    with atomic_write(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(preamble.decode('utf-8'))
+        df.to_csv(f, index=False, **kwargs)
+
+def _iter_records(f, offset):
+    """Yield (offset, raw_bytes) for each CSV record (or comment/blank line) from offset on.
+
+    Records spanning several lines inside quotes are yielded whole.
+    """
+    f.seek(offset)
+    start, buf = offset, b''
+    for line in f:
+        buf += line
+        if buf.count(b'"') % 2 == 0:
+            yield start, buf
+            start += len(buf)
+            buf = b''
+    if buf:
+        yield start, buf
+
+def update_rows(name, values, **keys):
+    """Set the columns in values on every row matching all key=value filters.
+
+    The changed rows are validated on their own and re-serialized; all other
+    bytes, the comment preamble and header included, are kept as they are.
+    When every changed record keeps its byte length (a status flip between
+    values of equal length, say), the records are overwritten in place.
+    Otherwise the file is rewritten: the bytes before the first changed row
+    are copied and the result replaces the file atomically. Both happen under
+    the file lock. A record with more fields than the header raises
+    ValueError. Returns the number of rows updated.
+    """
+    name = resolve_name(name)
+    if not keys:
+        raise ValueError("update_rows needs at least one key=value filter")
+    new_values = {col: _cell(v) for col, v in values.items()}
+    if DATA_BACKEND == 'sqlite':
+        matched = to_text(name, lookup(name, **keys))
+        if matched.empty:
+            return 0
+        validate_schema(name, matched.assign(**new_values))
+        count = _sqlite().update(name, new_values, **keys)
+        invalidate_cache(name)
+        return count
+    path = _table_path(name)
+    wanted = {col: _cell(v) for col, v in keys.items()}
+    with file_lock(path):
+        columns, terminator = read_header(path)
+        unknown = [col for col in list(wanted) + list(new_values) if col not in (columns or [])]
+        if unknown:
+            raise KeyError(unknown[0])
+        changed, patches = [], []
+        with open(path, 'rb') as f:
+            records = _iter_records(f, preamble_end(path))
+            next(records, None)  # header
+            for offset, raw in records:
+                text = raw.decode('utf-8')
+                if text.strip() and not text.lstrip().startswith('#'):
+                    fields = next(csv.reader(io.StringIO(text, newline='')))
+                    if len(fields) > len(columns):
+                        raise ValueError(f"{path}: record at byte {offset} has {len(fields)} fields, "
+                                         f"the header has {len(columns)}")
+                    row = dict(zip(columns, fields + [''] * (len(columns) - len(fields))))
+                    if all(row[col] == v for col, v in wanted.items()):
+                        row.update(new_values)
+                        changed.append(row)
+                        buf = io.StringIO()
+                        line_end = terminator if raw.endswith(b'\n') else ''
+                        csv.writer(buf, lineterminator=line_end).writerow([row[c] for c in columns])
+                        patches.append((offset, len(raw), buf.getvalue().encode('utf-8')))
+            if not patches:
+                return 0
+            validate_schema(name, _rows_frame(name, changed, columns))
+            if all(size == len(raw) for _, size, raw in patches):
+                with open(path, 'r+b') as out:
+                    for offset, _, raw in patches:
+                        out.seek(offset)
+                        out.write(raw)
+                    out.flush()
+                    os.fsync(out.fileno())
+                invalidate_cache(name)
+                return len(changed)
+            with atomic_write(path, 'wb') as out:
+                f.seek(0)
+                for offset, size, raw in patches + [(None, 0, b'')]:
+                    remaining = None if offset is None else offset - f.tell()
+                    while remaining is None or remaining > 0:
+                        chunk = f.read(1 << 20 if remaining is None else min(remaining, 1 << 20))
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                        if remaining is not None:
+                            remaining -= len(chunk)
+                    out.write(raw)
+                    f.seek(size, os.SEEK_CUR)
+    invalidate_cache(name)
+    return len(changed)
+
+
+# --- Streaming audit trail reader ---
+AUDIT_COLUMNS = [col['name'] for col in CSV_SCHEMAS['audit_trail']]
+AUDIT_CHUNKSIZE = 50_000
+
+def utc_timestamp(value):
+    """Parse a timestamp, treating naive values as UTC."""
+    ts = pd.Timestamp(value)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+def _audit_chunk_mask(chunk, filter):
+    mask = np.ones(len(chunk), dtype=bool)
+    for column in ('MutationID', 'Agent', 'NewStatus'):
+        wanted = filter.get(column)
+        if wanted is None:
+            continue
+        if isinstance(wanted, (list, tuple, set)):
+            mask &= chunk[column].isin(list(wanted)).to_numpy()
+        else:
+            mask &= (chunk[column] == str(wanted)).to_numpy(dtype=bool, na_value=False)
+    since, until = filter.get('since'), filter.get('until')
+    if since is not None or until is not None:
+        ts = pd.to_datetime(chunk['Timestamp'], format=DATE_FORMATS['datetime'], errors='coerce', utc=True)
+        if since is not None:
+            mask &= (ts >= utc_timestamp(since)).to_numpy()
+        if until is not None:
+            mask &= (ts < utc_timestamp(until)).to_numpy()
+    if filter.get('text'):
+        mask &= _audit_text_mask(chunk, filter['text'], mask)
+    return mask
+
+def _audit_text_mask(chunk, text, candidates):
+    """Case-insensitive substring match on Comment/Reasoning.
+
+    Blob references are resolved only for rows still matching the other filters.
+    """
+    blobs, needle = _audit_blobs(), text.lower()
+    hit = np.zeros(len(chunk), dtype=bool)
+    for column in ('Comment', 'Reasoning'):
+        values = chunk[column].astype(str)
+        hit |= values.str.contains(text, case=False, regex=False).to_numpy(dtype=bool, na_value=False)
+        refs = values.str.startswith(blobs.REF_PREFIX).to_numpy(dtype=bool, na_value=False) & candidates & ~hit
+        if refs.any():
+            hit[refs] = [needle in blobs.resolve(v).lower() for v in values[refs]]
+    return hit
+
+def _jsonl_chunks(filter, chunksize):
+    log, archive = _audit_log(), _audit_archive()
+    manifest = {entry['file']: entry for entry in archive.load_manifest()}
+    kept = {entry['file'] for entry in archive.prune(manifest.values(), filter)}
+    segments = [s for s in log.segment_paths()
+                if os.path.basename(s) not in manifest or os.path.basename(s) in kept]
+    yield from _jsonl_segment_chunks(segments, chunksize)
+
+def _jsonl_segment_chunks(segments, chunksize):
+    log = _audit_log()
+    batch = []
+    for record in log.iter_records(segments=segments):
+        batch.append(record)
+        if len(batch) >= chunksize:
+            yield log.to_frame(batch)
+            batch = []
+    if batch:
+        yield log.to_frame(batch)
+
+def _audit_chunks(filter, chunksize, path):
+    if path is None and AUDIT_FORMAT == 'jsonl':
+        yield from _jsonl_chunks(filter, chunksize)
+        return
+    if path is None:
+        yield from _audit_archive().iter_archived_chunks(filter, chunksize)
+    path = path or get_csv_path('audit_trail')
+    if not os.path.exists(path):
+        return
+    with pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk.reindex(columns=AUDIT_COLUMNS, fill_value='')
+
+def iter_audit_trail(filter=None, chunksize=AUDIT_CHUNKSIZE, path=None):
+    """Stream audit trail rows as AuditRow named tuples in bounded-memory chunks.
+
+    filter may contain 'MutationID', 'Agent' and/or 'NewStatus' (a value or a
+    list of values), a 'since'/'until' time range on Timestamp (until is
+    exclusive) and 'text', a case-insensitive substring of Comment or
+    Reasoning (blob references are resolved for the search). Filters
+    are applied per chunk, so only matching rows are ever materialized.
+    Values are read as raw strings, with '' for empty cells. Without an
+    explicit path, the archived segments whose manifest entry can match the
+    filter are streamed first, followed by the live trail (audit_trail.csv,
+    or the JSONL log with AUDIT_FORMAT=jsonl).
+    """
+    filter = filter or {}
+    for chunk in _audit_chunks(filter, chunksize, path):
+        if filter:
+            chunk = chunk[_audit_chunk_mask(chunk, filter)]
+        yield from chunk.itertuples(index=False, name='AuditRow')
+
+AUDIT_PAGE_SIZE = int(os.getenv('AUDIT_PAGE_SIZE', '50'))
+
+def _audit_matches(filter):
+    """Yield string frames of the audit rows matching filter, oldest first."""
+    wanted = filter.get('MutationID')
+    if wanted is not None and not isinstance(wanted, (list, tuple, set)):
+        rows = _audit_rows_for_mutation(wanted)  # MutationID index plus pruned archives
+        yield to_text('audit_trail', rows[_audit_chunk_mask(rows, filter)])
+        return
+    if DATA_BACKEND == 'sqlite':
+        live = read_csv('audit_trail')  # the SQLite store, served from the table cache
+        yield to_text('audit_trail', live[_audit_chunk_mask(live, filter)])
+        return
+    for chunk in _audit_chunks(filter, AUDIT_CHUNKSIZE, None):
+        yield chunk[_audit_chunk_mask(chunk, filter)]
+
+def audit_trail_values(columns=('Agent', 'NewStatus')):
+    """Return {column: sorted distinct non-empty values} of the archived and live audit trail.
+
+    Sealed segments answer from their manifest entries; only the live trail
+    is streamed, in chunks of raw strings.
+    """
+    if DATA_BACKEND == 'sqlite':
+        values, chunks = {column: set() for column in columns}, [_sqlite().read_table('audit_trail').fillna('')]
+    else:
+        values, sealed = _audit_archive().distinct_values(columns)
+        if AUDIT_FORMAT == 'jsonl':
+            live = [s for s in _audit_log().segment_paths() if os.path.basename(s) not in sealed]
+            chunks = _jsonl_segment_chunks(live, AUDIT_CHUNKSIZE)
+        else:
+            chunks = _audit_chunks({}, AUDIT_CHUNKSIZE, get_csv_path('audit_trail'))
+    for chunk in chunks:
+        for column in columns:
+            values[column].update(chunk[column].unique())
+    return {column: sorted(str(v) for v in found if str(v)) for column, found in values.items()}
+
+def query_audit_trail(filter=None, offset=0, limit=AUDIT_PAGE_SIZE):
+    """Return (page, total): rows offset..offset+limit of the matching audit rows, newest first.
+
+    filter takes the iter_audit_trail keys. A single MutationID is served
+    from the index; otherwise the archived segments that can match and the
+    live trail are streamed as raw strings in chunks. Only the newest
+    offset+limit matching rows are kept, and only the page is typed.
+    Comment/Reasoning blob references are left for the caller to resolve
+    (audit_blobs.resolve) when a row is expanded.
+    """
+    skip, need = max(int(offset), 0), max(int(limit), 0)
+    parts, kept, total = collections.deque(), 0, 0
+    for part in _audit_matches(filter or {}):
+        if not len(part):
+            continue
+        parts.append(part)
+        kept += len(part)
+        total += len(part)
+        while parts and kept - len(parts[0]) >= skip + need:  # older rows can no longer reach the page
+            kept -= len(parts.popleft())
+    page = []
+    for part in reversed(parts):  # append order is time order, newest part last
+        if need == 0:
+            break
+        if skip >= len(part):
+            skip -= len(part)
+            continue
+        rows = part.iloc[::-1].iloc[skip:skip + need]
+        page.append(rows)
+        need -= len(rows)
+        skip = 0
+    page = pd.concat(page, ignore_index=True) if page else pd.DataFrame(columns=AUDIT_COLUMNS)
+    return _normalise('audit_trail', page.reset_index(drop=True), validate=False), total
+
+
+# --- File-change watcher ---
+# A background thread detects changes to the tables in DATA_DIR, drops their
+# cache entries and indexes, and publishes ChangeEvent(table, version, rows)
+# to in-process subscribers. version is the table stamp used by the cache;
+# rows is the range of appended data rows, or None when the table was
+# rewritten. Linux uses inotify (through libc, no extra dependency); other
+# platforms and the sqlite backend fall back to polling the table stamps.
+import ctypes
+import ctypes.util
+import select
+import struct
+import sys
+from collections import namedtuple
+
+ChangeEvent = namedtuple('ChangeEvent', ['table', 'version', 'rows'])
+
+WATCH_INTERVAL = float(os.getenv('DATA_WATCH_INTERVAL', '1.0'))
+
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_INOTIFY_EVENT = struct.Struct('iIII')
+_TAIL_BYTES = 64
+
+_watch_lock = threading.Lock()
+_watch_state = {}  # name -> (stamp, offset, rows, tail)
+_subscribers = []
+_watcher = None
+
+def subscribe(callback):
+    """Register callback(event) for ChangeEvents. Returns the callback."""
+    with _watch_lock:
+        _subscribers.append(callback)
+    return callback
+
+def unsubscribe(callback):
+    with _watch_lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+def _publish(event):
+    with _watch_lock:
+        callbacks = list(_subscribers)
+    for callback in callbacks:
+        try:
+            callback(event)
+        except Exception:
+            logger.exception("Change subscriber failed for %s", event.table)
+
+def _watched_tables():
+    return list(CSV_FILES) + list(AUX_FILES)
+
+def _count_records(path, offset, limit):
+    """Count data records between offset and limit, up to the last complete record.
+
+    Reads line by line, so memory stays bounded at any file size. A record
+    ends at a line break outside quotes; a torn record being appended is
+    left for the next scan. Returns (records, end_offset, tail), where tail
+    is the last bytes before end_offset.
+    """
+    records, pos, end, quotes, first = 0, offset, offset, 0, None
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if pos + len(line) > limit or not line.endswith(b'\n'):
+                break
+            pos += len(line)
+            first = line if first is None else first
+            comment = first.lstrip().startswith(b'#')
+            quotes += 0 if comment else line.count(b'"')
+            if quotes % 2 == 0:  # the record is complete (writers quote any field containing '"')
+                if first.strip() and not comment:
+                    records += 1
+                end, quotes, first = pos, 0, None
+        f.seek(max(end - _TAIL_BYTES, 0))
+        tail = f.read(min(end, _TAIL_BYTES))
+    return records, end, tail
+
+def _unchanged_prefix(path, prev):
+    _, offset, _, tail = prev
+    with open(path, 'rb') as f:
+        f.seek(max(offset - _TAIL_BYTES, 0))
+        return f.read(min(offset, _TAIL_BYTES)) == tail
+
+def _scan(name, stamp, prev):
+    """Return (new_state, appended_rows) for a table whose stamp changed."""
+    if stamp is None or isinstance(stamp[0], str):  # sqlite / JSONL stamps
+        return (stamp, 0, 0, b''), None
+    # No writer lock: only the bytes present when the stamp was taken are
+    # counted, and a record still being appended is counted on the next scan
+    path = _table_path(name)
+    if (prev is not None and prev[0] is not None and prev[0][2] == stamp[2]
+            and 0 < prev[1] <= stamp[1] and _unchanged_prefix(path, prev)):
+        added, end, tail = _count_records(path, prev[1], stamp[1])
+        return (stamp, end, prev[2] + added, tail), range(prev[2], prev[2] + added)
+    records, end, tail = _count_records(path, 0, stamp[1])
+    return (stamp, end, max(records - 1, 0), tail), None
+
+def check_changes(names=None):
+    """Compare table stamps with the last seen ones; invalidate and publish changed tables.
+
+    The first call only records a baseline. Returns the published events.
+    """
+    events = []
+    for name in names or _watched_tables():
+        stamp = _table_stamp(name)
+        with _watch_lock:
+            prev = _watch_state.get(name, False)
+        if prev is not False and prev[0] == stamp:
+            continue
+        state, rows = _scan(name, stamp, prev or None)
+        with _watch_lock:
+            _watch_state[name] = state
+        if prev is False:
+            continue
+        invalidate_cache(name)
+        event = ChangeEvent(name, stamp, rows)
+        _publish(event)
+        events.append(event)
+    return events
+
+def _inotify_fd(directory):
+    """Return a non-blocking inotify fd watching directory, or None where unavailable."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+def _read_inotify(fd):
+    """Return the set of table names touched by the pending inotify events."""
+    files = {os.path.basename(_table_path(name)): name for name in _watched_tables()}
+    names = set()
+    try:
+        data = os.read(fd, 64 * 1024)
+    except BlockingIOError:
+        return names
+    pos = 0
+    while pos + _INOTIFY_EVENT.size <= len(data):
+        _, _, _, length = _INOTIFY_EVENT.unpack_from(data, pos)
+        pos += _INOTIFY_EVENT.size
+        file_name = data[pos:pos + length].rstrip(b'\0').decode('utf-8', errors='replace')
+        pos += length
+        if file_name in files:
+            names.add(files[file_name])
+    return names
+
+class _Watcher(threading.Thread):
+    def __init__(self, interval):
+        super().__init__(name='data-access-watcher', daemon=True)
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.fd = _inotify_fd(DATA_DIR) if DATA_BACKEND != 'sqlite' else None
+
+    @property
+    def mode(self):
+        return 'inotify' if self.fd is not None else 'polling'
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                if self.fd is None:
+                    self.stop_event.wait(self.interval)
+                    check_changes()
+                    continue
+                ready, _, _ = select.select([self.fd], [], [], self.interval)
+                if ready:
+                    names = _read_inotify(self.fd)
+                    if names:
+                        check_changes(sorted(names))
+        except Exception:
+            logger.exception("Data watcher stopped")
+        finally:
+            if self.fd is not None:
+                os.close(self.fd)
+
+def start_watcher(interval=None):
+    """Start the background watcher (once per process) and return it."""
+    global _watcher
+    with _watch_lock:
+        if _watcher is not None and _watcher.is_alive():
+            return _watcher
+    check_changes()  # baseline
+    with _watch_lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = _Watcher(WATCH_INTERVAL if interval is None else interval)
+            _watcher.start()
+        return _watcher
+
+def stop_watcher():
+    """Stop the background watcher and forget the recorded table states."""
+    global _watcher
+    with _watch_lock:
+        watcher, _watcher = _watcher, None
+    if watcher is not None:
+        watcher.stop_event.set()
+        watcher.join(timeout=5)
+    with _watch_lock:
+        _watch_state.clear()
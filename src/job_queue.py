@@ -0,0 +1,173 @@
+"""
+Local background job queue for long-running agent workflows.
+
+submit(func, context) stores a job record and returns its job_id at once;
+a pool of JOB_WORKERS threads runs func(context). Each job runs inside a
+tracing span whose trace_id is the job_id (see agent_protocol.span), so
+the agent spans of the workflow update the job's per-step progress:
+
+    job = get_job(job_id)
+    job['status']          # queued, running, completed, failed (interrupted: its process ended)
+    job['steps']           # [{'name': 'RightsCheckAgent', 'status': 'running'|'ok'|'error', ...}]
+    job['activity']        # latest span started (run.poll, a tool call, ...)
+    job['result']          # func's return value once completed
+
+Job records are kept as JSON files in data/jobs/ (JOB_DIR), so results can be
+viewed after the UI session or the process that ran them has ended. A record
+is saved when the job's status changes; step progress is kept in memory
+until then, so span events never wait on disk I/O.
+"""
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+try:
+    from . import agent_protocol, data_access
+except ImportError:
+    import agent_protocol
+    import data_access
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_DIR = os.getenv('JOB_DIR')  # default: <DATA_DIR>/jobs
+
+STEP_KINDS = ('agent',)
+ACTIVE = ('queued', 'running')
+
+_jobs_lock = threading.Lock()
+_jobs = {}     # job_id -> job record, for jobs submitted by this process
+_futures = {}  # job_id -> Future
+_executor = None
+
+
+def job_dir():
+    return JOB_DIR or os.path.join(data_access.DATA_DIR, 'jobs')
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _job_path(job_id):
+    return os.path.join(job_dir(), f"{job_id}.json")
+
+
+def _save(job):
+    """Write a job record atomically; callers hold _jobs_lock."""
+    os.makedirs(job_dir(), exist_ok=True)
+    with data_access.atomic_write(_job_path(job['job_id']), 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False, default=str)
+
+
+def _update(job_id, **fields):
+    with _jobs_lock:
+        job = _jobs[job_id]
+        job.update(fields)
+        _save(job)
+
+
+def _get_executor():
+    global _executor
+    with _jobs_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job-worker')
+            agent_protocol.add_span_listener(_on_span)
+        return _executor
+
+
+def submit(func, context, kind='job', label=None):
+    """Queue func(context) on the worker pool and return the new job_id immediately.
+
+    label (e.g. the MutationID) is shown in job lists and becomes the
+    mutation_id of the job's spans.
+    """
+    job_id = uuid.uuid4().hex[:12]
+    job = {
+        'job_id': job_id, 'kind': kind, 'label': label, 'status': 'queued',
+        'submitted_at': _now(), 'started_at': None, 'finished_at': None,
+        'steps': [], 'activity': None, 'result': None, 'error': None,
+    }
+    executor = _get_executor()
+    with _jobs_lock:
+        _jobs[job_id] = job
+        _save(job)
+        _futures[job_id] = executor.submit(_run, job_id, func, context)
+    return job_id
+
+
+def _run(job_id, func, context):
+    job = get_job(job_id)
+    _update(job_id, status='running', started_at=_now())
+    try:
+        with agent_protocol.span(f"job.{job['kind']}", kind='job', trace_id=job_id, mutation_id=job['label']):
+            result = func(context)
+        # Round-trip through JSON so the result is exactly what is stored
+        result = json.loads(json.dumps(result, ensure_ascii=False, default=str))
+        _update(job_id, status='completed', result=result, finished_at=_now(), activity=None)
+    except Exception as e:
+        _update(job_id, status='failed', error=f"{type(e).__name__}: {e}", finished_at=_now(), activity=None)
+    finally:
+        with _jobs_lock:  # finished records are served from their file from now on
+            _jobs.pop(job_id, None)
+            _futures.pop(job_id, None)
+
+
+def _on_span(event, span):
+    """Span listener: record agent steps and the latest activity of running jobs (in memory)."""
+    with _jobs_lock:
+        job = _jobs.get(span.trace_id)
+        if job is None or job['status'] != 'running' or span.kind == 'job':
+            return
+        if event == 'start':
+            job['activity'] = span.name
+        if span.kind not in STEP_KINDS:
+            return
+        if event == 'start':
+            job['steps'].append({'span_id': span.span_id, 'name': span.name, 'status': 'running',
+                                 'started_at': span.timestamp, 'duration_ms': None})
+        else:
+            for step in job['steps']:
+                if step['span_id'] == span.span_id:
+                    step['status'] = span.status
+                    step['duration_ms'] = round((span.duration or 0) * 1000, 1)
+
+
+def _copy(job):
+    return {**job, 'steps': [dict(step) for step in job['steps']]}
+
+
+def get_job(job_id):
+    """Return a copy of a job record, or None if there is no such job."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            return _copy(job)
+    try:
+        with open(_job_path(job_id), encoding='utf-8') as f:
+            job = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if job['status'] in ACTIVE:
+        job['status'] = 'interrupted'  # submitted by a process that has ended
+    return job
+
+
+def list_jobs(limit=20):
+    """Return the most recently updated job records, newest first."""
+    if not os.path.isdir(job_dir()):
+        return []
+    entries = [e for e in os.scandir(job_dir()) if e.name.endswith('.json')]
+    entries.sort(key=lambda e: e.stat().st_mtime_ns, reverse=True)
+    jobs = (get_job(e.name[:-len('.json')]) for e in entries[:limit])
+    return [job for job in jobs if job is not None]
+
+
+def wait(job_id, timeout=None):
+    """Block until a job submitted by this process has finished; returns its record."""
+    with _jobs_lock:
+        future = _futures.get(job_id)
+    if future is not None:
+        future.exception(timeout)
+    return get_job(job_id)
@@ -1,51 +1,402 @@
+"""
+Pending actions: requests from agents that wait for a user's or manager's answer.
+
+The store is the source of truth:
+- CSV backend: pending_actions.csv is an append-only log of action states.
+  An add appends the action's row, and an answer appends the row again with
+  its new status and response, so both cost one small write at any size. The
+  last row of an action_id is its current state;
+  data_access.read_table('pending_actions') keeps only that row. Once more
+  rows are superseded than there are actions (and at least
+  PENDING_COMPACT_ROWS), the file is compacted to one row per action.
+- DATA_BACKEND=sqlite: the SQLite pending_actions table, indexed on action_id
+  and (recipient_id, status), so an answer is one UPDATE.
+
+After the store, every add and update is appended to an event log,
+pending_actions_events.jsonl. Each line holds {"seq", "event", "action"} and
+seq increases by one per event. Both writes happen under the log's file lock.
+An in-memory index over the log (latest state per action, per-recipient event
+lists, (recipient_id, status) sets) catches up by reading only the bytes
+appended since the last call. From it:
+- get_actions_since(cursor, recipient_id) serves a change feed;
+- get_inbox and get_pending_actions answer status queries;
+- update_action_responses looks up the current rows.
+These lookups therefore cost the same at 100 or 1M actions.
+On import the log is brought up to date with the store: actions added or
+changed in the CSV by hand (or by a writer that died between the two
+writes) get an event, and actions no longer in the store are removed from
+the index. The store itself is never rewritten at import.
+
+await wait_for_response(action_id, timeout) suspends a workflow until the
+action is answered. An answer recorded in this process wakes the waiting
+coroutine through its asyncio.Event. An answer from another process (the
+Streamlit UI, say) is picked up by the data_access change watcher.
+"""
+import asyncio
+import bisect
 import csv
+import json
+import logging
 import os
 import threading
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+
+try:
+    from . import data_access
+except ImportError:
+    import data_access
+
+logger = logging.getLogger(__name__)
 
 PENDING_ACTIONS_PATH = os.path.join(os.path.dirname(__file__), '../data/pending_actions.csv')
+PENDING_EVENTS_PATH = os.path.join(os.path.dirname(__file__), '../data/pending_actions_events.jsonl')
 PENDING_ACTIONS_FIELDS = [
     'action_id', 'type', 'recipient_id', 'context', 'status', 'created_at', 'response'
 ]
+PENDING_COMPACT_ROWS = int(os.getenv('PENDING_COMPACT_ROWS', '1000'))
 
 _lock = threading.Lock()
 
-def init_pending_actions_csv():
+def _use_sqlite():
+    return data_access.DATA_BACKEND == 'sqlite'
+
+def _store():
+    try:
+        from . import sqlite_store
+    except ImportError:
+        import sqlite_store
+    return sqlite_store
+
+def _row(action: Dict) -> Dict:
+    return {f: '' if action.get(f) is None else str(action.get(f)) for f in PENDING_ACTIONS_FIELDS}
+
+# --- In-memory index over the event log ---
+
+class _Feed:
+    """Latest state per action plus per-recipient and per-(recipient, status) indexes."""
+
+    def __init__(self, ident=None):
+        self.ident = ident      # (st_dev, st_ino) of the indexed log; a new file resets the index
+        self.offset = 0         # bytes of the log applied so far
+        self.seq = 0
+        self.csv_rows = 0       # rows in pending_actions.csv since its last compaction (approximate)
+        self.actions = {}       # action_id -> (seq, event, row) of its latest event, in order of addition
+        self.by_recipient = {}  # recipient_id (None: all) -> ([seq, ...], [action_id, ...]), ascending
+        self.by_status = {}     # (recipient_id (None: all), status) -> {action_id: None}, in event order
+
+    def apply(self, record):
+        self.seq = record['seq']
+        row = record.get('action')
+        if record['event'] == 'compacted':
+            self.csv_rows = len(self.actions)
+            return
+        if row is None:
+            return
+        action_id, recipient = row['action_id'], row['recipient_id']
+        previous = self.actions.pop(action_id, None) if record['event'] == 'removed' else self.actions.get(action_id)
+        if previous is not None:
+            for key in (recipient, None):
+                self.by_status.get((key, previous[2]['status']), {}).pop(action_id, None)
+        if record['event'] == 'removed':
+            return
+        self.actions[action_id] = (self.seq, record['event'], row)
+        self.csv_rows += 1
+        for key in (recipient, None):
+            self.by_status.setdefault((key, row['status']), {})[action_id] = None
+            seqs, ids = self.by_recipient.setdefault(key, ([], []))
+            seqs.append(self.seq)
+            ids.append(action_id)
+
+    def since(self, cursor, recipient_id=None):
+        seqs, ids = self.by_recipient.get(recipient_id, ([], []))
+        changed = []
+        for i in range(bisect.bisect_right(seqs, cursor), len(seqs)):
+            latest = self.actions.get(ids[i])
+            if latest is not None and latest[0] == seqs[i]:  # each action once, in its latest state
+                seq, event, row = latest
+                changed.append(dict(row, seq=seq, event=event))
+        return changed
+
+_feed_lock = threading.Lock()
+_feed = _Feed()
+
+def _catch_up():
+    """Apply the events appended to the log since the last call; callers hold _feed_lock."""
+    global _feed
+    try:
+        st = os.stat(PENDING_EVENTS_PATH)
+    except FileNotFoundError:
+        st = None
+    ident = (st.st_dev, st.st_ino) if st else None
+    if ident != _feed.ident or (st and st.st_size < _feed.offset):
+        _feed = _Feed(ident)  # the log was replaced or truncated
+    if st is None or st.st_size == _feed.offset:
+        return
+    with open(PENDING_EVENTS_PATH, 'rb') as f:
+        f.seek(_feed.offset)
+        data = f.read(st.st_size - _feed.offset)
+    end = data.rfind(b'\n') + 1  # a torn last line is applied on a later call
+    for line in data[:end].splitlines():
+        if line.strip():
+            _feed.apply(json.loads(line))
+    _feed.offset += end
+
+def _current(action_ids=None) -> List[Dict]:
+    """Return the current rows of the known action_ids (default: all actions, in order of addition)."""
+    with _feed_lock:
+        _catch_up()
+        if action_ids is None:
+            return [dict(row) for _, _, row in _feed.actions.values()]
+        return [dict(_feed.actions[a][2]) for a in action_ids if a in _feed.actions]
+
+def _append_events(events: List[Tuple[str, Optional[Dict]]]):
+    """Append (event, row) pairs to the log; callers hold the log's file lock."""
+    with _feed_lock:
+        _catch_up()
+        seq = _feed.seq
+        lines = []
+        for event, row in events:
+            seq += 1
+            record = {'seq': seq, 'event': event}
+            if row is not None:
+                record['action'] = row
+            lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+        with open(PENDING_EVENTS_PATH, 'a', encoding='utf-8') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        _catch_up()
+
+# --- CSV state log ---
+
+def _append_csv(rows: List[Dict]):
+    with open(PENDING_ACTIONS_PATH, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=PENDING_ACTIONS_FIELDS)
+        writer.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _all_actions() -> List[Dict]:
+    """Return the current row of every action in the store."""
+    if _use_sqlite():
+        return _store().query('pending_actions').fillna('').to_dict(orient='records')
     if not os.path.exists(PENDING_ACTIONS_PATH):
+        return []
+    latest = {}
+    with open(PENDING_ACTIONS_PATH, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            latest[row['action_id']] = row
+    return list(latest.values())
+
+def _compact(force=False):
+    """Rewrite pending_actions.csv with the current row of each action; callers hold _lock and the log's file lock.
+
+    The rows come from the file itself, so nothing in it is lost.
+    """
+    with _feed_lock:
+        _catch_up()
+        superseded = _feed.csv_rows - len(_feed.actions)
+        if not force and superseded < max(PENDING_COMPACT_ROWS, len(_feed.actions)):
+            return False
+    rows = [_row(row) for row in _all_actions()]
+    with data_access.atomic_write(PENDING_ACTIONS_PATH, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=PENDING_ACTIONS_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    _append_events([('compacted', None)])
+    return True
+
+def compact_pending_actions():
+    """Compact pending_actions.csv to one row per action now (CSV backend only)."""
+    if _use_sqlite():
+        return
+    with _lock, data_access.file_lock(PENDING_EVENTS_PATH):
+        _compact(force=True)
+
+def _sync_log():
+    """Append the events that bring the log's index up to date with the store.
+
+    Covers actions added or changed in the store by hand (or by git) and a
+    writer that died after writing the store but before the log.
+    """
+    with _lock, data_access.file_lock(PENDING_EVENTS_PATH):
+        stored = {row['action_id']: _row(row) for row in _all_actions()}
+        indexed = {row['action_id']: row for row in _current()}
+        events = [('added' if a not in indexed else 'updated', row)
+                  for a, row in stored.items() if indexed.get(a) != row]
+        events += [('removed', row) for a, row in indexed.items() if a not in stored]
+        if events:
+            if indexed:
+                logger.info(f"Bringing {PENDING_EVENTS_PATH} up to date with the store ({len(events)} events)")
+            _append_events(events)
+
+# --- Public API ---
+
+def get_actions_since(cursor: int = 0, recipient_id: Optional[str] = None) -> Tuple[List[Dict], int]:
+    """Return (actions, cursor): the actions added or updated after cursor, and the new cursor.
+
+    Each action is returned once, in its latest state, with its 'seq' and
+    'event' ('added' or 'updated'). Pass the returned cursor to the next
+    call; a cursor from before the event log was reset restarts at 0.
+    """
+    with _feed_lock:
+        _catch_up()
+        if cursor > _feed.seq:
+            cursor = 0
+        return _feed.since(cursor, recipient_id), _feed.seq
+
+def get_inbox(recipient_id: str, status: str = 'pending') -> Tuple[List[Dict], int]:
+    """Return (actions, cursor): a recipient's actions with status, from the status index.
+
+    Continue with get_actions_since(cursor, recipient_id) for later changes.
+    """
+    with _feed_lock:
+        _catch_up()
+        ids = _feed.by_status.get((recipient_id, status), {})
+        actions = [dict(row, seq=seq, event=event) for seq, event, row in (_feed.actions[a] for a in ids)]
+        return actions, _feed.seq
+
+def init_pending_actions_csv():
+    if not _use_sqlite() and not os.path.exists(PENDING_ACTIONS_PATH):  # the sqlite store creates its own tables
         with open(PENDING_ACTIONS_PATH, 'w', newline='', encoding='utf-8') as f:
             writer = csv.DictWriter(f, fieldnames=PENDING_ACTIONS_FIELDS)
             writer.writeheader()
+        # The event log describes the old file's history, so it starts over
+        with data_access.file_lock(PENDING_EVENTS_PATH):
+            if os.path.exists(PENDING_EVENTS_PATH):
+                os.remove(PENDING_EVENTS_PATH)
+    _sync_log()
+
+def add_pending_actions(actions: List[Dict]):
+    """Add several actions in one write (one transaction on SQLite)."""
+    actions = [action.copy() for action in actions]
+    for action in actions:
+        action.setdefault('created_at', datetime.utcnow().isoformat())
+        action.setdefault('status', 'pending')
+    if not actions:
+        return
+    rows = [_row(action) for action in actions]
+    with _lock, data_access.file_lock(PENDING_EVENTS_PATH):
+        if _use_sqlite():
+            _store().append('pending_actions', actions)
+        else:
+            _append_csv(rows)
+        _append_events([('added', row) for row in rows])
 
 def add_pending_action(action: Dict):
-    action = action.copy()
-    action.setdefault('created_at', datetime.utcnow().isoformat())
-    action.setdefault('status', 'pending')
-    with _lock:
-        with open(PENDING_ACTIONS_PATH, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=PENDING_ACTIONS_FIELDS)
-            writer.writerow(action)
+    add_pending_actions([action])
 
 def get_pending_actions(recipient_id: Optional[str] = None, status: str = 'pending') -> List[Dict]:
-    with _lock:
-        with open(PENDING_ACTIONS_PATH, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            actions = [row for row in reader if (not recipient_id or row['recipient_id'] == recipient_id) and row['status'] == status]
-    return actions
+    with _feed_lock:
+        _catch_up()
+        return [dict(_feed.actions[a][2]) for a in _feed.by_status.get((recipient_id or None, status), {})]
+
+def update_action_responses(responses: Dict[str, str]) -> int:
+    """Record {action_id: response} answers in one write (one transaction on SQLite).
+
+    Unknown action_ids are ignored. Returns the number of actions updated.
+    """
+    if not responses:
+        return 0
+    with _lock, data_access.file_lock(PENDING_EVENTS_PATH):
+        updated = [dict(row, response=str(responses[row['action_id']]), status='responded')
+                   for row in _current(responses)]
+        if not updated:
+            return 0
+        if _use_sqlite():
+            _store().update_each('pending_actions', 'action_id',
+                                 {row['action_id']: {'response': row['response'], 'status': 'responded'}
+                                  for row in updated})
+        else:
+            _append_csv(updated)
+        _append_events([('updated', row) for row in updated])
+        if not _use_sqlite():
+            _compact()
+    _wake([row['action_id'] for row in updated])
+    return len(updated)
 
 def update_action_response(action_id: str, response: str):
-    rows = []
-    with _lock:
-        with open(PENDING_ACTIONS_PATH, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['action_id'] == action_id:
-                    row['response'] = response
-                    row['status'] = 'responded'
-                rows.append(row)
-        with open(PENDING_ACTIONS_PATH, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=PENDING_ACTIONS_FIELDS)
-            writer.writeheader()
-            writer.writerows(rows)
+    update_action_responses({action_id: response})
+
+# --- Waiting for answers ---
+
+_waiters_lock = threading.Lock()
+_waiters = {}  # action_id -> [(loop, asyncio.Event)] of the coroutines waiting for its answer
+_watching = False
+
+def _answered(action_id: str) -> Optional[Dict]:
+    """Return the current row of action_id once it is no longer pending, else None."""
+    return next((row for row in _current([action_id]) if row['status'] != 'pending'), None)
+
+def _wake(action_ids):
+    with _waiters_lock:
+        waiting = [waiter for a in action_ids for waiter in _waiters.get(a, ())]
+    for loop, event in waiting:
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:  # the waiting loop has closed
+            pass
+
+def _on_change(event):
+    """data_access subscriber: wake waiters whose action was answered by another process."""
+    if event.table != 'pending_actions':
+        return
+    with _waiters_lock:
+        action_ids = list(_waiters)
+    if not action_ids:
+        return
+    with data_access.file_lock(PENDING_EVENTS_PATH):
+        pass  # let a writer finish both the CSV and the event log first
+    _wake([a for a in action_ids if _answered(a) is not None])
+
+def start_answer_watcher():
+    """Subscribe to the data_access change watcher (starting it) so answers from other processes wake waiters.
+
+    The watcher's first scan reads every table's stamp, so async callers run
+    this in a thread (wait_for_response does) or once at startup.
+    """
+    global _watching
+    with _waiters_lock:
+        if _watching:
+            return
+        _watching = True
+    data_access.subscribe(_on_change)
+    data_access.start_watcher()
+
+async def wait_for_response(action_id: str, timeout: Optional[float] = None) -> Optional[Dict]:
+    """Wait until action_id is answered and return its row; None if timeout seconds pass first.
+
+    The coroutine sleeps on an asyncio.Event until update_action_responses
+    (in any thread of this process) or the change watcher (for other
+    processes) signals the action, so waiting costs no polling. Starting
+    the watcher and reading the action's state run in worker threads, so
+    the event loop never blocks on file I/O.
+    """
+    if not _watching:
+        await asyncio.to_thread(start_answer_watcher)
+    loop = asyncio.get_running_loop()
+    waiter = (loop, asyncio.Event())
+    with _waiters_lock:
+        _waiters.setdefault(action_id, []).append(waiter)
+    deadline = None if timeout is None else loop.time() + timeout
+    try:
+        while True:
+            row = await asyncio.to_thread(_answered, action_id)  # checked after registering, so no answer can slip past
+            if row is not None:
+                return row
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(waiter[1].wait(), remaining)
+            except asyncio.TimeoutError:
+                pass  # one last check above
+            waiter[1].clear()
+    finally:
+        with _waiters_lock:
+            _waiters[action_id].remove(waiter)
+            if not _waiters[action_id]:
+                del _waiters[action_id]
 
 init_pending_actions_csv()
@@ -0,0 +1,151 @@
+"""
+Shared query engine for the lookup_data/lookup_advisory tool calls.
+
+A query is a dict of column filters. A plain value means equality (the original
+lookup_data behaviour); a dict value applies one or more operators:
+
+    {"UserID": "u001"}                                  # equality
+    {"Status": {"in": ["Active", "Pending"]}}           # membership
+    {"Status": {"ne": "Revoked"}}                       # inequality
+    {"HireDate": {"gte": "2020-01-01", "lt": "2021-01-01"}}  # ranges (dates are parsed)
+    {"UserID": {"prefix": "u00"}}                       # string prefix
+    {"TerminationDate": {"is_null": True}}              # empty / missing
+
+Equality filters on indexed key columns are answered from the data_access hash
+indexes; every other condition is compiled into a single boolean mask over the
+candidate rows. Results support column projection, order_by, limit and offset,
+and are serialized straight to a JSON string for the tool output. Audit blob
+references in the returned audit_trail rows are resolved to their text.
+"""
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+
+try:
+    from . import audit_blobs, data_access
+except ImportError:
+    import audit_blobs
+    import data_access
+
+logger = logging.getLogger(__name__)
+
+# Default page size, so broad queries do not flood the model context
+MAX_ROWS = 200
+
+RANGE_OPS = {
+    'gt': lambda s, v: s > v,
+    'gte': lambda s, v: s >= v,
+    'lt': lambda s, v: s < v,
+    'lte': lambda s, v: s <= v,
+}
+
+
+def _column_type(name, column):
+    for col in data_access.CSV_SCHEMAS.get(name, []):
+        if col['name'] == column:
+            return col['type']
+    return 'string'
+
+
+def _as_datetime(series, col_type):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series if series.dt.tz is not None else series.dt.tz_localize('UTC')
+    return pd.to_datetime(series, format=data_access.DATE_FORMATS[col_type], errors='coerce', utc=True)
+
+
+def _is_null(series):
+    mask = series.isna()
+    if data_access.is_text(series):
+        mask |= series == ''
+    return mask
+
+
+def _condition(name, series, op, arg):
+    col_type = _column_type(name, series.name)
+    if col_type in data_access.DATE_FORMATS and op in ('eq', 'ne', 'in'):
+        series = _as_datetime(series, col_type)
+        arg = ([data_access.utc_timestamp(a) for a in arg] if op == 'in'
+               else data_access.utc_timestamp(arg))
+    if op == 'eq':
+        return series == arg
+    if op == 'ne':
+        return series != arg
+    if op == 'in':
+        return series.isin(list(arg))
+    if op == 'prefix':
+        return series.astype('string').str.startswith(str(arg)).fillna(False).astype(bool)
+    if op == 'is_null':
+        mask = _is_null(series)
+        return mask if arg else ~mask
+    if op in RANGE_OPS:
+        if col_type in data_access.DATE_FORMATS:
+            return RANGE_OPS[op](_as_datetime(series, col_type), data_access.utc_timestamp(arg))
+        return RANGE_OPS[op](series, arg)
+    raise ValueError(f"Unsupported query operator: {op}")
+
+
+def compile_mask(name, df, query):
+    """Compile a query dict into one boolean numpy mask over df."""
+    mask = np.ones(len(df), dtype=bool)
+    for column, cond in query.items():
+        series = df[column]
+        ops = cond.items() if isinstance(cond, dict) else [('eq', cond)]
+        for op, arg in ops:
+            mask &= np.asarray(_condition(name, series, op, arg).fillna(False), dtype=bool)
+    return mask
+
+
+def run_query(name, query=None, columns=None, order_by=None, limit=MAX_ROWS, offset=0):
+    """Run a query and return (page_df, total_matches)."""
+    query = dict(query or {})
+    name = data_access.resolve_name(name)
+    keys = set(data_access.INDEX_KEYS.get(name, []))
+    point = {k: v for k, v in query.items() if k in keys and not isinstance(v, dict)}
+    if point:
+        df = data_access.lookup(name, **point)
+        rest = {k: v for k, v in query.items() if k not in point}
+    else:
+        df = data_access.read_table(name)
+        rest = query
+    if rest:
+        df = df[compile_mask(name, df, rest)]
+    if order_by:
+        fields = [order_by] if isinstance(order_by, str) else list(order_by)
+        by = [f.lstrip('-') for f in fields]
+        df = df.sort_values(by, ascending=[not f.startswith('-') for f in fields], kind='stable')
+    if columns:
+        df = df[list(columns)]
+    total = len(df)
+    offset = max(int(offset or 0), 0)
+    end = None if limit is None else offset + max(int(limit), 0)
+    page = df.iloc[offset:end]
+    if name == 'audit_trail':
+        page = audit_blobs.resolve_frame(page)  # only the returned rows are resolved
+    return page, total
+
+
+def query_json(name, query=None, columns=None, order_by=None, limit=MAX_ROWS, offset=0):
+    """Run a query and serialize the page as a JSON tool result string.
+
+    The result has the shape {"results": [...], "total": n, "offset": o, "limit": l}.
+    Rows are written by pandas' JSON encoder directly, without building a list of dicts.
+    """
+    name = data_access.resolve_name(name)
+    page, total = run_query(name, query, columns=columns, order_by=order_by, limit=limit, offset=offset)
+    rows = data_access.to_text(name, page).to_json(orient='records', date_format='iso', force_ascii=False)
+    return (f'{{"results": {rows}, "total": {total}, "offset": {max(int(offset or 0), 0)}, '
+            f'"limit": {json.dumps(limit)}}}')
+
+
+def lookup_data(file: str, query: dict, columns: list = None, order_by: list = None, limit: int = None, offset: int = 0) -> str:
+    """Query a data table. query maps columns to a value (equality) or to operators:
+    in, ne, gt/gte/lt/lte (dates are parsed), prefix, is_null. Optional: columns
+    (projection), order_by (prefix '-' for descending), limit, offset.
+    Returns JSON with results, total, offset and limit."""
+    try:
+        return query_json(file, query, columns=columns, order_by=order_by, limit=limit or MAX_ROWS, offset=offset)
+    except Exception as e:
+        logger.error(f"lookup_data failed on {file}: {e}")
+        return json.dumps({"results": [], "error": str(e)})
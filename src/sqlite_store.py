@@ -0,0 +1,245 @@
+"""
+SQLite storage engine for the data access layer.
+
+Stores every logical table from data_access.CSV_FILES plus pending_actions in a
+single local SQLite database running in WAL mode, so several Streamlit sessions
+and agent workers can read while one of them writes. Key columns are indexed
+(see data_access.INDEX_KEYS). Select it with DATA_BACKEND=sqlite; the public
+data_access and pending_actions functions keep their signatures.
+
+All values are stored as TEXT, with NULL for empty cells, mirroring how the CSV
+files are read. A small table_versions table records a counter per table that
+is bumped on every write and used as the cache stamp.
+
+CSV import/export:
+    python -m src.sqlite_store import [table ...]   # CSV files -> SQLite
+    python -m src.sqlite_store export [table ...]   # SQLite -> CSV files
+"""
+import argparse
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    from . import data_access
+except ImportError:
+    import data_access
+
+SQLITE_PATH = os.getenv('DATA_SQLITE_PATH', os.path.join(data_access.DATA_DIR, 'hr_data.sqlite3'))
+
+# Mirrors pending_actions.PENDING_ACTIONS_FIELDS
+PENDING_ACTIONS_COLUMNS = [
+    'action_id', 'type', 'recipient_id', 'context', 'status', 'created_at', 'response'
+]
+
+# Extra composite indexes beyond the single-column INDEX_KEYS
+COMPOSITE_INDEXES = {
+    'pending_actions': [('recipient_id', 'status')],
+    'authorisations': [('UserID', 'System', 'AccessLevel')],
+}
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def table_names():
+    """Return every logical table stored in the database."""
+    return list(data_access.CSV_FILES) + ['pending_actions']
+
+
+def table_columns(name):
+    """Return the column list of a logical table."""
+    if name == 'pending_actions':
+        return list(PENDING_ACTIONS_COLUMNS)
+    schema = data_access.CSV_SCHEMAS.get(name)
+    if schema is None:
+        raise ValueError(f"Unknown table: {name}")
+    return [col['name'] for col in schema]
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _ensure_schema(conn):
+    with _schema_lock:
+        if SQLITE_PATH in _schema_ready:
+            return
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS table_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            for name in table_names():
+                cols = ', '.join(f"{_quote(c)} TEXT" for c in table_columns(name))
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {_quote(name)} ({cols})")
+                keys = [(k,) for k in data_access.INDEX_KEYS.get(name, [])]
+                for key in keys + COMPOSITE_INDEXES.get(name, []):
+                    index_name = _quote(f"idx_{name}_{'_'.join(key)}")
+                    key_cols = ', '.join(_quote(k) for k in key)
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {_quote(name)} ({key_cols})")
+        _schema_ready.add(SQLITE_PATH)
+
+
+def connect():
+    """Return this thread's connection to the database, creating the schema on first use."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'path', None) != SQLITE_PATH:
+        conn = sqlite3.connect(SQLITE_PATH, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+        _local.path = SQLITE_PATH
+    _ensure_schema(conn)
+    return conn
+
+
+def _to_frame(cursor, name):
+    columns = table_columns(name)
+    df = pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+    return df.fillna(np.nan)
+
+
+def _records(df, columns):
+    values = df.reindex(columns=columns).astype(object)
+    values = values.where(values.notna(), None)
+    return [tuple(None if v is None else str(v) for v in row)
+            for row in values.itertuples(index=False, name=None)]
+
+
+def _bump_version(conn, name):
+    conn.execute(
+        "INSERT INTO table_versions (name, version) VALUES (?, 1) "
+        "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+        (name,),
+    )
+
+
+def table_version(name):
+    """Return the write counter of a table (0 if it was never written)."""
+    row = connect().execute("SELECT version FROM table_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def read_table(name):
+    """Read a whole table in insertion order as a DataFrame."""
+    cols = ', '.join(_quote(c) for c in table_columns(name))
+    cursor = connect().execute(f"SELECT {cols} FROM {_quote(name)} ORDER BY rowid")
+    return _to_frame(cursor, name)
+
+
+def query(name, **keys):
+    """Return rows matching all key=value filters, answered from the column indexes."""
+    cols = ', '.join(_quote(c) for c in table_columns(name))
+    sql = f"SELECT {cols} FROM {_quote(name)}"
+    if keys:
+        unknown = [k for k in keys if k not in table_columns(name)]
+        if unknown:
+            raise KeyError(unknown[0])
+        sql += " WHERE " + " AND ".join(f"{_quote(k)} = ?" for k in keys)
+    cursor = connect().execute(sql + " ORDER BY rowid", tuple(str(v) for v in keys.values()))
+    return _to_frame(cursor, name)
+
+
+def write_table(name, df):
+    """Replace the contents of a table with df in one transaction."""
+    columns = table_columns(name)
+    placeholders = ', '.join('?' for _ in columns)
+    conn = connect()
+    with conn:
+        conn.execute(f"DELETE FROM {_quote(name)}")
+        conn.executemany(f"INSERT INTO {_quote(name)} VALUES ({placeholders})", _records(df, columns))
+        _bump_version(conn, name)
+
+
+def append(name, df):
+    """Insert the rows of df (a DataFrame or a list of dicts) in one transaction."""
+    if not isinstance(df, pd.DataFrame):
+        df = pd.DataFrame.from_records(list(df))
+    columns = table_columns(name)
+    placeholders = ', '.join('?' for _ in columns)
+    conn = connect()
+    with conn:
+        conn.executemany(f"INSERT INTO {_quote(name)} VALUES ({placeholders})", _records(df, columns))
+        _bump_version(conn, name)
+
+
+def update(name, values, **keys):
+    """Set columns from values on rows matching all key=value filters. Returns the row count."""
+    assignments = ', '.join(f"{_quote(c)} = ?" for c in values)
+    where = ' AND '.join(f"{_quote(k)} = ?" for k in keys)
+    params = tuple(values.values()) + tuple(str(v) for v in keys.values())
+    conn = connect()
+    with conn:
+        cursor = conn.execute(f"UPDATE {_quote(name)} SET {assignments} WHERE {where}", params)
+        if cursor.rowcount:
+            _bump_version(conn, name)
+    return cursor.rowcount
+
+
+def update_each(name, key, updates):
+    """Apply {key_value: values} updates to the rows matching key in one transaction. Returns the row count."""
+    conn = connect()
+    count = 0
+    with conn:
+        for value, values in updates.items():
+            assignments = ', '.join(f"{_quote(c)} = ?" for c in values)
+            params = tuple(values.values()) + (str(value),)
+            count += conn.execute(f"UPDATE {_quote(name)} SET {assignments} WHERE {_quote(key)} = ?", params).rowcount
+        if count:
+            _bump_version(conn, name)
+    return count
+
+
+def _csv_path(name):
+    if name == 'pending_actions':
+        return os.path.join(data_access.DATA_DIR, data_access.AUX_FILES['pending_actions'])
+    return data_access.get_csv_path(name)
+
+
+def _read_source_csv(name):
+    if name == 'pending_actions':
+        # The CSV is a log of action states; the last row per action_id is current
+        df = pd.read_csv(_csv_path(name), dtype=str, keep_default_na=False)
+        return df.drop_duplicates('action_id', keep='last', ignore_index=True)
+    # Raw text, so values round-trip exactly; validation happens on read
+    return pd.read_csv(_csv_path(name), comment='#', dtype=str)
+
+
+def import_csv(names=None):
+    """Load CSV files into the database, replacing table contents. Returns {table: rows}."""
+    counts = {}
+    for name in names or table_names():
+        if not os.path.exists(_csv_path(name)):
+            continue
+        df = _read_source_csv(name)
+        write_table(name, df)
+        counts[name] = len(df)
+    return counts
+
+
+def export_csv(names=None):
+    """Write database tables back to their CSV files, keeping comment preambles. Returns {table: rows}."""
+    counts = {}
+    for name in names or table_names():
+        path = _csv_path(name)
+        df = read_table(name)
+        with data_access.file_lock(path):
+            data_access.rewrite_csv(path, df)
+        counts[name] = len(df)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import/export the CSV data files to/from the SQLite store.")
+    parser.add_argument('direction', choices=['import', 'export'])
+    parser.add_argument('tables', nargs='*', help="Logical table names (default: all)")
+    args = parser.parse_args(argv)
+    fn = import_csv if args.direction == 'import' else export_csv
+    for name, count in fn(args.tables or None).items():
+        print(f"{args.direction}ed {name}: {count} rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Local viewer for the workflow spans written by agent_protocol.span().
+
+Prints, for every trace (workflow run) of a mutation, the critical path
+through the span tree and the latency per step:
+
+    python -m src.trace_viewer 1001                 # all traces of mutation 1001
+    python -m src.trace_viewer --trace <trace_id>   # one trace
+    python -m src.trace_viewer 1001 --log path/to/spans.jsonl
+"""
+import argparse
+import json
+import sys
+
+try:
+    from . import agent_protocol
+except ImportError:
+    import agent_protocol
+
+
+def _scan(paths, needle=None):
+    """Yield the span records of paths, skipping lines without needle (cheap pre-filter)."""
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if needle is None or needle in line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:  # torn last line while the writer appends
+                        continue
+
+
+def load_traces(mutation_id=None, trace_id=None, path=None):
+    """Return {trace_id: [span records]} for a mutation and/or a single trace.
+
+    The span log and its rotated backups are read once, oldest first.
+    """
+    paths = agent_protocol.span_log_paths(path)
+    if trace_id is not None:
+        traces = {}
+        for record in _scan(paths, f'"trace_id":{json.dumps(trace_id)}'):
+            if record['trace_id'] == trace_id:
+                traces.setdefault(trace_id, []).append(record)
+        return traces
+    # A trace belongs to the mutation if any of its spans carries the mutation_id
+    traces, wanted = {}, set()
+    for record in _scan(paths):
+        traces.setdefault(record['trace_id'], []).append(record)
+        if record.get('mutation_id') == str(mutation_id):
+            wanted.add(record['trace_id'])
+    return {trace: traces[trace] for trace in wanted}
+
+
+def _end(record):
+    return record['start'] + record['duration_ms'] / 1000
+
+
+def critical_path(spans):
+    """Return [(depth, span)] along the critical path of a trace's span tree.
+
+    From each span's end, walk back through its children picking the one that
+    finished last before the cursor, then descend into each picked child.
+    """
+    by_id = {s['span_id']: s for s in spans}
+    children = {}
+    for s in spans:
+        children.setdefault(s['parent_id'] if s['parent_id'] in by_id else None, []).append(s)
+    roots = sorted(children.get(None, []), key=lambda s: s['start'])
+    path = []
+
+    def walk(node, depth):
+        path.append((depth, node))
+        cursor, chain = _end(node), []
+        for child in sorted(children.get(node['span_id'], []), key=_end, reverse=True):
+            if _end(child) <= cursor + 1e-6 and child['start'] >= node['start'] - 1e-6:
+                chain.append(child)
+                cursor = child['start']
+        for child in reversed(chain):
+            walk(child, depth + 1)
+
+    for root in roots:
+        walk(root, 0)
+    return path
+
+
+def step_latency(spans):
+    """Return [(kind, name, count, total_ms, mean_ms, max_ms)] sorted by total time."""
+    steps = {}
+    for s in spans:
+        steps.setdefault((s['kind'], s['name']), []).append(s['duration_ms'])
+    rows = [(kind, name, len(d), sum(d), sum(d) / len(d), max(d)) for (kind, name), d in steps.items()]
+    return sorted(rows, key=lambda r: r[3], reverse=True)
+
+
+def format_trace(trace_id, spans):
+    start = min(s['start'] for s in spans)
+    total = (max(_end(s) for s in spans) - start) * 1000
+    errors = sum(1 for s in spans if s['status'] != 'ok')
+    mutation = next((s['mutation_id'] for s in spans if s.get('mutation_id')), '-')
+    lines = [f"trace {trace_id}  mutation {mutation}  {total:.1f} ms  {len(spans)} spans  {errors} errors",
+             "critical path:"]
+    for depth, s in critical_path(spans):
+        flag = '' if s['status'] == 'ok' else f"  [{s['status']}: {s.get('error') or ''}]"
+        lines.append(f"  {(s['start'] - start) * 1000:>+11.1f} ms {s['duration_ms']:10.1f} ms  "
+                     f"{'  ' * depth}{s['name']} ({s['kind']}){flag}")
+    lines.append("per-step latency:")
+    lines.append(f"  {'kind':<8} {'name':<36} {'count':>5} {'total ms':>10} {'mean ms':>10} {'max ms':>10}")
+    for kind, name, count, total_ms, mean_ms, max_ms in step_latency(spans):
+        lines.append(f"  {kind:<8} {name:<36} {count:>5} {total_ms:>10.1f} {mean_ms:>10.1f} {max_ms:>10.1f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the critical path and step latency of agent workflows.")
+    parser.add_argument('mutation_id', nargs='?', help="MutationID whose workflow traces to show")
+    parser.add_argument('--trace', help="show a single trace (correlation_id) instead")
+    parser.add_argument('--log', help=f"span log (default: {agent_protocol.SPAN_LOG})")
+    args = parser.parse_args(argv)
+    if args.mutation_id is None and args.trace is None:
+        parser.error("give a mutation_id or --trace")
+    traces = load_traces(args.mutation_id, args.trace, args.log)
+    if not traces:
+        print("no spans found", file=sys.stderr)
+        return 1
+    ordered = sorted(traces.items(), key=lambda t: min(s['timestamp'] for s in t[1]))
+    print("\n\n".join(format_trace(trace_id, spans) for trace_id, spans in ordered))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
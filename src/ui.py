@@ -1,13 +1,20 @@
 
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timezone
-from data_access import read_csv, write_csv, get_audit_trail_for_mutation
+from datetime import datetime, timedelta, timezone
+from data_access import append_rows, start_watcher
 import uuid
-import os
 import json
-import time
-from pending_actions import get_pending_actions, update_action_response
+from pending_actions import get_inbox, get_actions_since, update_action_response
+from ui_data import user_choices, audit_choices, audit_page
+from job_queue import submit as submit_job, get_job, list_jobs
+from audit_blobs import is_ref, resolve
+from agent_protocol import audit_record, log_audit, start_audit_migration, flush as flush_audit
+
+# Drop cached tables as soon as their files change; idempotent across Streamlit reruns
+start_watcher()
+# One-off (per process) upgrade of old audit rows to the current header, off the request path
+start_audit_migration()
 
 # --- Option Menu for Navigation ---
 from streamlit_option_menu import option_menu
@@ -95,26 +102,9 @@ try:
 except ImportError:
     InvestigationAgent = None
 
-# Audit logging helper for UI actions
+# Audit logging helper for UI actions: appends one row through the shared audit writer
+# (agent_protocol.log_audit); header/column fixes are left to the background migration above
 def log_ui_audit(action, mutation_id=None, old_status=None, new_status=None, agent=None, comment=None):
-    import csv
-    DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data'))
-    AUDIT_FILE = os.path.join(DATA_DIR, 'audit_trail.csv')
-    # Read existing data (preserve header and data)
-    if os.path.exists(AUDIT_FILE):
-        with open(AUDIT_FILE, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        header_idx = next((i for i, l in enumerate(lines) if l.strip().startswith('AuditID')), None)
-        if header_idx is not None:
-            header = lines[:header_idx+1]
-            data = lines[header_idx+1:]
-        else:
-            header = []
-            data = lines
-    else:
-        header = ["AuditID,MutationID,Timestamp,OldStatus,NewStatus,Agent,Comment\n"]
-        data = []
-    audit_id = str(uuid.uuid4())[:8]
     timestamp = datetime.now(timezone.utc).isoformat()
     # Prepare comment field as string
     if comment is not None:
@@ -130,32 +120,110 @@ def log_ui_audit(action, mutation_id=None, old_status=None, new_status=None, age
         reasoning = action["reasoning"]
     elif isinstance(comment, dict) and "reasoning" in comment:
         reasoning = comment["reasoning"]
-    # Serialize reasoning as JSON
-    import json as _json
-    try:
-        reasoning_json = _json.dumps(reasoning, ensure_ascii=False)
-    except Exception:
-        reasoning_json = str(reasoning)
-    row = [audit_id, mutation_id or "", timestamp, old_status or "", new_status or "", agent or "UI", comment_str, reasoning_json]
-    # Write all rows back using csv.writer for robust quoting
-    with open(AUDIT_FILE, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
-        # Write header with Reasoning column
-        writer.writerow(["AuditID", "MutationID", "Timestamp", "OldStatus", "NewStatus", "Agent", "Comment", "Reasoning"])
-        # Write existing data rows (skip any blank lines)
-        for line in data:
-            if line.strip():
-                reader = csv.reader([line])
-                for parsed_row in reader:
-                    # If old header, skip it
-                    if parsed_row and parsed_row[0] == "AuditID":
-                        continue
-                    # If old row, pad to 8 columns
-                    while len(parsed_row) < 8:
-                        parsed_row.append("")
-                    writer.writerow(parsed_row)
-        # Write the new row
-        writer.writerow(row)
+    log_audit(audit_record(mutation_id or "", new_status or "", agent or "UI", comment_str, reasoning,
+                           old_status=old_status or "", timestamp=timestamp))
+
+# Render the combined result of an InvestigationAgent run (a completed job's result)
+def render_agent_summary(agent_response):
+    # Extract thoughts from all agents
+    summary_lines = []
+    if isinstance(agent_response, dict):
+        inv = agent_response.get('investigation') or {}
+        rc = agent_response.get('rights_check') or {}
+        info_user = agent_response.get('information_user_request') or {}
+        info_manager = agent_response.get('information_manager_request') or {}
+        advisory = agent_response.get('advisory_report') or {}
+        # InvestigationAgent
+        inv_text = inv.get('response') or inv.get('error')
+        if inv_text:
+            summary_lines.append(f"<span style='color:#00b8d9;font-weight:600;'>Investigation Agent:</span> {inv_text}")
+        # RightsCheckAgent
+        rc_text = rc.get('response') or rc.get('error')
+        if rc_text:
+            summary_lines.append(f"<span style='color:#00b8d9;font-weight:600;'>Rights Check Agent:</span> {rc_text}")
+        # RequestForInformationAgent (user)
+        info_user_text = info_user.get('response') or info_user.get('error')
+        if info_user_text:
+            summary_lines.append(f"<span style='color:#00b8d9;font-weight:600;'>User Clarification Agent:</span> {info_user_text}")
+        # RequestForInformationAgent (manager)
+        info_manager_text = info_manager.get('response') or info_manager.get('error')
+        if info_manager_text:
+            summary_lines.append(f"<span style='color:#00b8d9;font-weight:600;'>Manager Validation Agent:</span> {info_manager_text}")
+        # AdvisoryAgent (final advisory)
+        advisory_text = advisory.get('response') or advisory.get('error')
+        if advisory_text:
+            summary_lines.append(f"<span style='color:#00b8d9;font-weight:600;'>Advisory Agent (Final Advisory):</span> {advisory_text}")
+        summary = "<br><br>".join(summary_lines) if summary_lines else str(agent_response)
+    else:
+        summary = agent_response.get('response', agent_response) if isinstance(agent_response, dict) else str(agent_response)
+    st.markdown(f"<div style='background:rgba(0,82,204,0.1);border-left:5px solid #00b8d9;padding:12px;border-radius:8px;color:#e3e9f7;'>Agent Workflow Summary:<br><br>{summary}</div>", unsafe_allow_html=True)
+    # Optionally show full JSON result in expandable section
+    with st.expander("Show full agent response (JSON)"):
+        st.json(agent_response)
+
+def run_investigation(context):
+    # Runs on a job_queue worker thread; handle_request drives its own event loop
+    return InvestigationAgent().handle_request(context)
+
+JOB_STATUS_ICONS = {"queued": "⏳", "running": "🔄", "ok": "✅", "completed": "✅",
+                    "error": "❌", "failed": "❌", "interrupted": "⚠️"}
+
+def render_job(job_id):
+    job = get_job(job_id)
+    if job is None:
+        st.warning(f"Job {job_id} not found.")
+        return
+    icon = JOB_STATUS_ICONS.get(job["status"], "")
+    st.markdown(f"**{icon} Job {job['job_id']}** ({job['kind']} for mutation {job['label']}): {job['status']}")
+    for step in job["steps"]:
+        took = f" in {step['duration_ms'] / 1000:.1f}s" if step["duration_ms"] is not None else ""
+        st.markdown(f"- {JOB_STATUS_ICONS.get(step['status'], '')} {step['name']}: {step['status']}{took}")
+    if job["status"] == "running" and job.get("activity"):
+        st.caption(f"Current activity: {job['activity']}")
+    if job["status"] == "failed":
+        st.error(f"Investigation failed: {job['error']}")
+    elif job["status"] == "completed":
+        render_agent_summary(job["result"])
+
+# Re-render job progress every 2 seconds without rerunning the whole page (Streamlit >= 1.37)
+live_fragment = st.fragment(run_every=2) if hasattr(st, "fragment") else (lambda func: func)
+
+@live_fragment
+def render_session_jobs():
+    for job_id in reversed(st.session_state.get("jobs", [])[-3:]):
+        render_job(job_id)
+
+# Inbox state per recipient lives in the session: the actions seen so far and the change-feed cursor.
+# The first render loads the pending actions from the status index; every later poll only
+# fetches the actions changed since the cursor, however long the history is.
+@live_fragment
+def render_inbox(recipient_id):
+    inbox = st.session_state.setdefault("inbox", {})
+    state = inbox.get(recipient_id)
+    if state is None:
+        actions, cursor = get_inbox(recipient_id)
+        state = inbox[recipient_id] = {"cursor": cursor, "actions": {a["action_id"]: a for a in actions}}
+    else:
+        changed, state["cursor"] = get_actions_since(state["cursor"], recipient_id)
+        state["actions"].update((a["action_id"], a) for a in changed)
+    pending = sorted((a for a in state["actions"].values() if a["status"] == "pending"), key=lambda a: a["created_at"])
+    answered = sorted((a for a in state["actions"].values() if a["status"] != "pending"), key=lambda a: a["seq"], reverse=True)
+    if not pending:
+        st.info("No pending requests.")
+    for action in pending:
+        with st.form(key=f"inbox_{action['action_id']}"):
+            st.markdown(f"**{action['type']}** (received {action['created_at'][:19]})")
+            st.markdown(action["context"])
+            response = st.text_area("Response", key=f"response_{action['action_id']}")
+            if st.form_submit_button("Send response") and response.strip():
+                update_action_response(action["action_id"], response)
+                log_ui_audit("pending_action_response", old_status="pending", new_status="responded", agent="UI",
+                             comment={"action_id": action["action_id"], "recipient_id": recipient_id, "response": response})
+                st.rerun()
+    if answered:
+        with st.expander(f"Answered ({len(answered)})"):
+            st.dataframe(pd.DataFrame(answered, columns=["created_at", "type", "context", "status", "response"]),
+                         use_container_width=True)
 
 st.set_page_config(page_title="Agentic HR Access Control Demo", layout="wide")
 st.markdown("<h1 style='color:#00b8d9;font-weight:700;'>Agentic HR Access Control Demo</h1>", unsafe_allow_html=True)
@@ -163,11 +231,13 @@ st.markdown("<h1 style='color:#00b8d9;font-weight:700;'>Agentic HR Access Contro
 # Sidebar navigation with icons
 PAGE_HR_MUTATION_ENTRY = "HR Mutation Entry"
 PAGE_AUDIT_TRAIL = "Audit Trail"
+PAGE_JOBS = "Investigation Jobs"
+PAGE_INBOX = "Inbox"
 with st.sidebar:
     selected = option_menu(
         menu_title=None,
-        options=[PAGE_HR_MUTATION_ENTRY, PAGE_AUDIT_TRAIL],
-        icons=["person-fill", "journal-text"],
+        options=[PAGE_HR_MUTATION_ENTRY, PAGE_AUDIT_TRAIL, PAGE_JOBS, PAGE_INBOX],
+        icons=["person-fill", "journal-text", "hourglass-split", "inbox"],
         menu_icon="cast",
         default_index=0,
         styles={
@@ -181,9 +251,8 @@ with st.sidebar:
 if selected == PAGE_HR_MUTATION_ENTRY:
     st.markdown("<h2 style='color:#00b8d9;font-weight:700;'>HR Mutation Entry</h2>", unsafe_allow_html=True)
     st.caption("All fields are required unless marked optional. Please provide accurate information for auditability.")
-    users_df = read_csv('users')
-    user_options = users_df['UserID'] + " - " + users_df['Name']
-    user_map = dict(zip(user_options, users_df['UserID']))
+    # Cached per users.csv version, so widget reruns do not re-read or re-derive anything
+    user_options, user_map, environments = user_choices()
     with st.container():
         changed_by = st.selectbox("Changed By (User)", user_options, help="Select the user making the change.")
         changed_for = st.selectbox("Changed For (User)", user_options, help="Select the user whose data is being changed.")
@@ -191,14 +260,13 @@ if selected == PAGE_HR_MUTATION_ENTRY:
         field_changed = st.text_input("Field Changed (e.g., Salary, JobTitle)", help="Specify the field that is being changed.")
         old_value = st.text_input("Old Value (optional)", help="Previous value before the change (if applicable).")
         new_value = st.text_input("New Value", help="New value after the change.")
-        environment = st.selectbox("Environment", users_df['Environment'].unique(), help="System environment (e.g., HRProd, HRTest).")
+        environment = st.selectbox("Environment", environments, help="System environment (e.g., HRProd, HRTest).")
         reason = st.text_input("Reason for Change", help="Provide a reason for the change.")
         manager_id = st.selectbox("Manager", user_options, help="Select the manager responsible for validation.")
         submit = st.button("Submit Mutation")
     if submit:
-        with st.spinner("Submitting mutation and triggering agent workflow..."):
+        with st.spinner("Submitting mutation..."):
             try:
-                hr_mut_df = read_csv('hr_mutations')
                 mutation_id = str(uuid.uuid4())[:8]
                 timestamp = datetime.now(timezone.utc).isoformat()
                 def safe_str(val):
@@ -220,8 +288,7 @@ if selected == PAGE_HR_MUTATION_ENTRY:
                     "Reason": safe_str(reason),
                     "ManagerID": safe_str(user_map[manager_id])
                 }
-                hr_mut_df = pd.concat([hr_mut_df, pd.DataFrame([new_row])], ignore_index=True)
-                write_csv('hr_mutations', hr_mut_df)
+                append_rows('hr_mutations', [new_row])
                 # Log audit for mutation creation
                 log_ui_audit(
                     action="mutation_created",
@@ -232,67 +299,90 @@ if selected == PAGE_HR_MUTATION_ENTRY:
                     comment={"field": field_changed, "new_value": new_value, "reason": reason}
                 )
 
-                # --- Trigger InvestigationAgent (with Agent2Agent chaining) ---
+                # --- Queue the InvestigationAgent workflow (with Agent2Agent chaining) ---
+                # It runs on the job_queue worker pool; progress and result are shown from the job record
                 if InvestigationAgent is not None:
-                    try:
-                        agent = InvestigationAgent()
-                        # Pass the new mutation as context
-                        agent_response = agent.handle_request(new_row)
-                        # Extract thoughts from all agents
-                        summary_lines = []
-                        if isinstance(agent_response, dict):
-                            inv = agent_response.get('investigation', {})
-                            rc = agent_response.get('rights_check', {})
-                            info_user = agent_response.get('information_user_request', {})
-                            info_manager = agent_response.get('information_manager_request', {})
-                            advisory = agent_response.get('advisory_report', {})
-                            # InvestigationAgent
-                            inv_text = inv.get('response') or inv.get('error')
-                            if inv_text:
-                                summary_lines.append(f"<span style='color:#00b8d9;font-weight:600;'>Investigation Agent:</span> {inv_text}")
-                            # RightsCheckAgent
-                            rc_text = rc.get('response') or rc.get('error')
-                            if rc_text:
-                                summary_lines.append(f"<span style='color:#00b8d9;font-weight:600;'>Rights Check Agent:</span> {rc_text}")
-                            # RequestForInformationAgent (user)
-                            info_user_text = info_user.get('response') or info_user.get('error')
-                            if info_user_text:
-                                summary_lines.append(f"<span style='color:#00b8d9;font-weight:600;'>User Clarification Agent:</span> {info_user_text}")
-                            # RequestForInformationAgent (manager)
-                            info_manager_text = info_manager.get('response') or info_manager.get('error')
-                            if info_manager_text:
-                                summary_lines.append(f"<span style='color:#00b8d9;font-weight:600;'>Manager Validation Agent:</span> {info_manager_text}")
-                            # AdvisoryAgent (final advisory)
-                            advisory_text = advisory.get('response') or advisory.get('error')
-                            if advisory_text:
-                                summary_lines.append(f"<span style='color:#00b8d9;font-weight:600;'>Advisory Agent (Final Advisory):</span> {advisory_text}")
-                            summary = "<br><br>".join(summary_lines) if summary_lines else str(agent_response)
-                        else:
-                            summary = agent_response.get('response', agent_response) if isinstance(agent_response, dict) else str(agent_response)
-                        st.markdown(f"<div style='background:rgba(0,82,204,0.1);border-left:5px solid #00b8d9;padding:12px;border-radius:8px;color:#e3e9f7;'>Agent Workflow Summary:<br><br>{summary}</div>", unsafe_allow_html=True)
-                        # Optionally show full JSON result in expandable section
-                        with st.expander("Show full agent response (JSON)"):
-                            st.json(agent_response)
-                    except Exception as agent_exc:
-                        st.warning(f"Investigation Agent trigger failed: {agent_exc}")
+                    job_id = submit_job(run_investigation, new_row, kind="investigation", label=mutation_id)
+                    st.session_state.setdefault("jobs", []).append(job_id)
+                    st.info(f"Investigation job {job_id} queued; follow its progress below or on the {PAGE_JOBS} page.")
                 else:
                     st.warning("InvestigationAgent could not be imported; agent not triggered.")
 
                 st.success(f"Mutation {mutation_id} submitted successfully!")
             except Exception as e:
                 st.error(f"Error submitting mutation: {e}")
+    render_session_jobs()
 
 
 elif selected == PAGE_AUDIT_TRAIL:
     st.markdown("<h2 style='color:#00b8d9;font-weight:700;'>Audit Trail</h2>", unsafe_allow_html=True)
+    # Filtering and paging happen in data_access (query_audit_trail); only the visible page
+    # reaches the browser, and stored Comment/Reasoning payloads are loaded on demand
     try:
-        audit_df = read_csv('audit_trail')
-        # Coerce all columns to string type to avoid schema validation errors
-        for col in audit_df.columns:
-            audit_df[col] = audit_df[col].astype(str)
-        st.dataframe(audit_df, use_container_width=True)
+        # Show the UI's own queued audit rows (read-after-write); other pages never wait on the writer
+        flush_audit(timeout=5)
+        choices = audit_choices()
+        with st.form("audit_filters"):
+            col1, col2, col3 = st.columns(3)
+            mutation_filter = col1.text_input("MutationID")
+            agent_filter = col2.multiselect("Agent", choices['Agent'])
+            status_filter = col3.multiselect("New Status", choices['NewStatus'])
+            col4, col5, col6 = st.columns(3)
+            since = col4.date_input("From", value=None)
+            until = col5.date_input("Until", value=None)
+            page_size = col6.selectbox("Rows per page", [25, 50, 100, 250], index=1)
+            text_filter = st.text_input("Search Comment/Reasoning")
+            st.form_submit_button("Apply filters")
+        audit_filter = {}
+        if mutation_filter.strip():
+            audit_filter['MutationID'] = mutation_filter.strip()
+        if agent_filter:
+            audit_filter['Agent'] = agent_filter
+        if status_filter:
+            audit_filter['NewStatus'] = status_filter
+        if since:
+            audit_filter['since'] = since.isoformat()
+        if until:
+            audit_filter['until'] = (until + timedelta(days=1)).isoformat()  # include the whole day
+        if text_filter.strip():
+            audit_filter['text'] = text_filter.strip()
+        page_number = st.number_input("Page", min_value=1, value=1, step=1)
+        page, total = audit_page(audit_filter, (page_number - 1) * page_size, page_size)
+        pages = max(1, -(-total // page_size))
+        st.caption(f"{total} matching rows, page {min(page_number, pages)} of {pages} (newest first)")
+
+        def preview(value):
+            if is_ref(value):
+                return "(stored payload, expand below)"
+            value = str(value)
+            return value if len(value) <= 120 else value[:117] + "..."
+
+        shown = page.assign(Comment=page['Comment'].map(preview), Reasoning=page['Reasoning'].map(preview))
+        st.dataframe(shown, use_container_width=True, hide_index=True)
+        expand = st.selectbox("Show full Comment/Reasoning of", [""] + page['AuditID'].astype(str).tolist())
+        if expand:
+            row = page[page['AuditID'].astype(str) == expand].iloc[0]
+            st.markdown("**Comment**")
+            st.code(resolve(row['Comment']), language=None)
+            st.markdown("**Reasoning**")
+            st.code(resolve(row['Reasoning']), language=None)
     except Exception as e:
         st.error(f"Error loading audit trail: {e}")
 
 
+elif selected == PAGE_JOBS:
+    st.markdown("<h2 style='color:#00b8d9;font-weight:700;'>Investigation Jobs</h2>", unsafe_allow_html=True)
+    jobs = list_jobs(limit=50)
+    if not jobs:
+        st.info("No investigation jobs yet.")
+    else:
+        labels = {f"{job['submitted_at'][:19]}  {job['label']}  ({job['status']})": job["job_id"] for job in jobs}
+        chosen = st.selectbox("Job", list(labels))
+        live_fragment(render_job)(labels[chosen])
 
+elif selected == PAGE_INBOX:
+    st.markdown("<h2 style='color:#00b8d9;font-weight:700;'>Inbox</h2>", unsafe_allow_html=True)
+    user_options, user_map, _ = user_choices()
+    recipient = st.selectbox("Recipient", user_options, help="User or manager whose requests to show.")
+    if recipient:
+        render_inbox(user_map[recipient])
@@ -0,0 +1,61 @@
+"""
+Streamlit data layer for ui.py.
+
+Streamlit reruns the whole script on every widget interaction. The cached
+functions here take the table's data_access.table_version() as their
+argument, so a rerun with unchanged files is a cache hit. It neither parses
+a CSV nor rebuilds derived values. A changed file gets a new version and a
+fresh entry, and max_entries drops the old ones. Entries are shared by all
+sessions.
+
+They are st.cache_resource entries, so a hit returns the cached object
+itself rather than an unpickled copy of it. The results are read-only:
+callers derive new frames (assign, filters) and never modify them in place.
+"""
+import streamlit as st
+
+try:
+    from . import data_access
+except ImportError:
+    import data_access
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _user_choices(version):
+    users = data_access.read_csv('users')
+    options = (users['UserID'].astype(str) + " - " + users['Name'].astype(str)).tolist()
+    return {
+        'options': options,
+        'map': dict(zip(options, users['UserID'].astype(str))),
+        'environments': users['Environment'].dropna().unique().tolist(),
+    }
+
+
+def user_choices():
+    """Return (user_options, user_map, environments) for the mutation form."""
+    choices = _user_choices(data_access.table_version('users'))
+    return choices['options'], choices['map'], choices['environments']
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _audit_choices(version):
+    return data_access.audit_trail_values(('Agent', 'NewStatus'))
+
+
+def audit_choices():
+    """Return {'Agent': [...], 'NewStatus': [...]}: the filter options of the Audit Trail page."""
+    return _audit_choices(data_access.table_version('audit_trail'))
+
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def _audit_page(version, filter, offset, limit):
+    return data_access.query_audit_trail(filter, offset, limit)
+
+
+def audit_page(filter, offset, limit):
+    """Return (page, total) from data_access.query_audit_trail, cached per audit trail version.
+
+    The page is shared with other reruns and sessions; do not modify it.
+    Comment/Reasoning blob references in the page are left unresolved.
+    """
+    return _audit_page(data_access.table_version('audit_trail'), filter, offset, limit)
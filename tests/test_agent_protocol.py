@@ -0,0 +1,223 @@
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from src import agent_protocol, trace_viewer
+from pydantic import ValidationError
+from src.agent_protocol import AgentMessage, create_message, log_agent_message
+
+
+class TestAuditWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.audit_file = os.path.join(self.tmpdir, 'audit_trail.csv')
+        self.patcher = patch.object(agent_protocol, 'AUDIT_FILE', self.audit_file)
+        self.patcher.start()
+
+    def tearDown(self):
+        agent_protocol.flush()
+        self.patcher.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _rows(self):
+        with open(self.audit_file, newline='', encoding='utf-8') as f:
+            return list(csv.reader(f))
+
+    def _message(self, i):
+        return create_message(sender="InvestigationAgent", receiver="ToolCall", action="lookup_data",
+                              context={"mutation_id": f"m{i}"}, status="success")
+
+    def test_flush_writes_all_rows(self):
+        for i in range(25):
+            log_agent_message(self._message(i), comment="Tool call success")
+        self.assertTrue(agent_protocol.flush(timeout=10))
+        rows = self._rows()
+        self.assertEqual(rows[0], agent_protocol.AUDIT_HEADER)
+        self.assertEqual([r[1] for r in rows[1:]], [f"m{i}" for i in range(25)])
+
+    def test_rows_are_batched_off_the_caller_thread(self):
+        writer = agent_protocol.AuditWriter(batch_size=1000, flush_interval=60)
+        writer.start()
+        try:
+            writer.submit(agent_protocol._audit_record(self._message(1)))
+            self.assertFalse(os.path.exists(self.audit_file))
+            self.assertTrue(writer.flush(timeout=10))
+            self.assertEqual(len(self._rows()), 2)
+        finally:
+            writer.stop(timeout=10)
+        self.assertFalse(writer.is_alive())
+
+    def test_stop_drains_queue(self):
+        writer = agent_protocol.AuditWriter(batch_size=1000, flush_interval=60)
+        writer.start()
+        for i in range(3):
+            writer.submit(agent_protocol._audit_record(self._message(i)))
+        writer.stop(timeout=10)
+        self.assertEqual(len(self._rows()), 4)
+
+    def test_full_queue_never_blocks(self):
+        writer = agent_protocol.AuditWriter(batch_size=1000, flush_interval=60, queue_size=2, overflow_size=3)
+        # not started yet: every submit past the queue size would otherwise block forever
+        for i in range(7):
+            writer.submit(agent_protocol._audit_record(self._message(i)))
+        writer.submit(agent_protocol.Span("lookup_data", "tool", "t1", None, "m1", {}))
+        self.assertEqual((writer.overflowed, writer.dropped_records, writer.dropped_spans), (3, 2, 1))
+        with patch.object(agent_protocol, 'SPAN_LOG', os.path.join(self.tmpdir, 'spans.jsonl')):
+            writer.start()
+            writer.stop(timeout=10)
+        self.assertEqual([r[1] for r in self._rows()[1:]], [f"m{i}" for i in range(5)])
+
+
+class TestAgentMessage(unittest.TestCase):
+    def test_create_message_generates_ids_once(self):
+        with patch.object(agent_protocol.uuid, 'uuid4', wraps=agent_protocol.uuid.uuid4) as uuid4:
+            msg = create_message(sender="a", receiver="b", action="c", context={"mutation_id": "m1"})
+        self.assertEqual(uuid4.call_count, 1)
+        self.assertEqual(AgentMessage(**msg.model_dump()), msg)
+
+    def test_validation_is_opt_in(self):
+        msg = create_message(sender="a", receiver="b", action="c", context=None)
+        self.assertIsNone(msg.context)
+        with self.assertRaises(ValidationError):
+            create_message(sender="a", receiver="b", action="c", context=None, validate=True)
+
+    def test_to_json_encodes_once(self):
+        msg = create_message(sender="a", receiver="b", action="c", context={"reasoning": json.dumps("ok")})
+        encoded = msg.to_json()
+        self.assertIs(msg.to_json(), encoded)
+        self.assertEqual(json.loads(encoded), msg.model_dump())
+        record = agent_protocol._audit_record(msg)
+        self.assertIs(record["Comment"], encoded)
+
+
+class TestAuditAppendPath(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.audit_file = os.path.join(self.tmpdir, 'audit_trail.csv')
+        self.patcher = patch.object(agent_protocol, 'AUDIT_FILE', self.audit_file)
+        self.patcher.start()
+
+    def tearDown(self):
+        agent_protocol.flush()
+        self.patcher.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _rows(self):
+        with open(self.audit_file, newline='', encoding='utf-8') as f:
+            return list(csv.reader(f))
+
+    def test_log_audit_appends_without_rewriting(self):
+        agent_protocol.log_audit(agent_protocol.audit_record("m1", "Pending", "UI", comment="line one\nline two"))
+        agent_protocol.flush(timeout=10)
+        inode = os.stat(self.audit_file).st_ino
+        agent_protocol.log_audit(agent_protocol.audit_record("m2", "Pending", "UI", reasoning={"why": "x"}))
+        agent_protocol.flush(timeout=10)
+        self.assertEqual(os.stat(self.audit_file).st_ino, inode)
+        rows = self._rows()
+        self.assertEqual([r[1] for r in rows[1:]], ["m1", "m2"])
+        self.assertEqual(rows[1][6], "line one\nline two")
+        self.assertEqual(json.loads(rows[2][7]), {"why": "x"})
+
+    def test_migration_pads_old_rows_once(self):
+        with open(self.audit_file, 'w', encoding='utf-8', newline='') as f:
+            f.write("# audit trail\n")
+            f.write("AuditID,MutationID,Timestamp,OldStatus,NewStatus,Agent,Comment\n")
+            f.write('a1,m1,2025-10-23T10:00:00,,Pending,UI,"multi\nline"\n')
+            f.write('a2,m2,2025-10-23T10:00:01,,Pending,UI,plain,"""r"""\n')
+        self.assertEqual(agent_protocol.migrate_audit_file(), 2)
+        with open(self.audit_file, encoding='utf-8') as f:
+            self.assertEqual(f.readline(), "# audit trail\n")
+        rows = self._rows()[1:]
+        self.assertEqual(rows[0], agent_protocol.AUDIT_HEADER)
+        self.assertEqual(rows[1], ["a1", "m1", "2025-10-23T10:00:00", "", "Pending", "UI", "multi\nline", ""])
+        self.assertEqual(rows[2][7], '"r"')
+        self.assertEqual(agent_protocol.migrate_audit_file(), 0)
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.patchers = [patch.object(agent_protocol, 'AUDIT_FILE', os.path.join(self.tmpdir, 'audit_trail.csv')),
+                         patch.object(agent_protocol, 'SPAN_LOG', os.path.join(self.tmpdir, 'spans.jsonl'))]
+        for p in self.patchers:
+            p.start()
+
+    def tearDown(self):
+        agent_protocol.flush()
+        for p in self.patchers:
+            p.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _spans(self):
+        self.assertTrue(agent_protocol.flush(timeout=10))
+        with open(agent_protocol.SPAN_LOG, encoding='utf-8') as f:
+            return {s['name']: s for s in map(json.loads, f)}
+
+    async def _workflow(self):
+        with agent_protocol.span("InvestigationAgent", kind="agent", mutation_id="m1", trace_id="t1"):
+            msg = create_message(sender="InvestigationAgent", receiver="RightsCheckAgent",
+                                 action="handle_request", context={"mutation_id": "m1"})
+            log_agent_message(msg)
+            with agent_protocol.span("RightsCheckAgent", kind="agent"):
+                await asyncio.sleep(0.01)
+                await asyncio.to_thread(self._tool)
+            return msg
+
+    def _tool(self):
+        with agent_protocol.span("lookup_data", kind="tool"):
+            pass
+
+    def test_spans_nest_and_propagate_correlation_id(self):
+        msg = asyncio.run(self._workflow())
+        self.assertEqual(msg.correlation_id, "t1")
+        spans = self._spans()
+        root, rights, tool = spans["InvestigationAgent"], spans["RightsCheckAgent"], spans["lookup_data"]
+        self.assertIsNone(root["parent_id"])
+        self.assertEqual(rights["parent_id"], root["span_id"])
+        self.assertEqual(tool["parent_id"], rights["span_id"])
+        self.assertEqual({s["trace_id"] for s in spans.values()}, {"t1"})
+        self.assertEqual(tool["mutation_id"], "m1")
+        self.assertGreaterEqual(rights["duration_ms"], 10)
+        self.assertEqual(spans["audit.write"]["parent_id"], root["span_id"])
+        self.assertIsNone(agent_protocol.current_span())
+
+    def test_failed_span_records_error(self):
+        with self.assertRaises(ValueError):
+            with agent_protocol.span("lookup_data", kind="tool"):
+                raise ValueError("boom")
+        span = self._spans()["lookup_data"]
+        self.assertEqual((span["status"], span["error"]), ("error", "ValueError: boom"))
+
+    def test_viewer_prints_critical_path(self):
+        asyncio.run(self._workflow())
+        agent_protocol.flush(timeout=10)
+        path = [s["name"] for _, s in trace_viewer.critical_path(trace_viewer.load_traces("m1")["t1"])]
+        self.assertEqual(path, ["InvestigationAgent", "RightsCheckAgent", "lookup_data"])
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(trace_viewer.main(["m1"]), 0)
+        self.assertIn("trace t1  mutation m1", out.getvalue())
+        self.assertIn("per-step latency:", out.getvalue())
+
+    def test_span_log_rotates(self):
+        with patch.object(agent_protocol, 'SPAN_LOG_MAX_MB', 0.0005):  # ~500 bytes
+            for i in range(3):
+                asyncio.run(self._workflow())
+                self.assertTrue(agent_protocol.flush(timeout=10))
+            paths = agent_protocol.span_log_paths()
+        self.assertEqual(paths, [agent_protocol.SPAN_LOG + ".2", agent_protocol.SPAN_LOG + ".1",
+                                 agent_protocol.SPAN_LOG])
+        self.assertFalse(os.path.exists(agent_protocol.SPAN_LOG + ".3"))
+        # the viewer still finds the trace's spans across the rotated files
+        spans = trace_viewer.load_traces("m1")["t1"]
+        self.assertIn("InvestigationAgent", {s["name"] for s in spans})
+
+
+if __name__ == "__main__":
+    unittest.main()
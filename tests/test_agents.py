@@ -1,5 +1,10 @@
+import asyncio
+import os
+import shutil
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
+from src import RequestForInformationAgent as rfi_module, pending_actions
 from src.AdvisoryAgent import AdvisoryAgent
 from src.InvestigationAgent import InvestigationAgent
 from src.RightsCheckAgent import RightsCheckAgent
@@ -153,5 +158,45 @@ class TestRequestForInformationAgent(unittest.TestCase):
         self.assertIn("Azure error", result["error"])
         self.assertEqual(result["context"], context)
 
+class TestNotifySendModes(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.patchers = [patch.object(pending_actions, 'PENDING_ACTIONS_PATH', os.path.join(self.tmpdir, 'pending_actions.csv')),
+                         patch.object(pending_actions, 'PENDING_EVENTS_PATH', os.path.join(self.tmpdir, 'pending_actions_events.jsonl')),
+                         patch.object(pending_actions, 'start_answer_watcher')]
+        for p in self.patchers:
+            p.start()
+        pending_actions.init_pending_actions_csv()
+        _, self.tools = rfi_module.get_toolset()
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _send(self):
+        return asyncio.run(self.tools["async_notify_send"]("u001", "Salary change", "Please clarify."))
+
+    def test_mock_mode_answers_at_once(self):
+        with patch.object(rfi_module, 'RESPONSE_MODE', 'mock'):
+            result = self._send()
+        self.assertEqual(result["status"], "responded")
+        self.assertEqual(result["response"], rfi_module.MOCK_RESPONSE)
+        self.assertEqual(pending_actions.get_pending_actions("u001"), [])
+
+    def test_none_mode_leaves_request_open(self):
+        with patch.object(rfi_module, 'RESPONSE_MODE', 'none'):
+            result = self._send()
+        self.assertEqual(result["status"], "sent")
+        self.assertEqual([a["action_id"] for a in pending_actions.get_pending_actions("u001")], [result["message_id"]])
+
+    def test_wait_stops_at_run_deadline(self):
+        async def scenario():
+            rfi_module._answer_deadline.set(asyncio.get_running_loop().time() + 0.1)
+            return await self.tools["async_notify_send"]("u001", "Salary change", "Please clarify.")
+        with patch.object(rfi_module, 'RESPONSE_MODE', 'wait'):
+            result = asyncio.run(scenario())
+        self.assertEqual(result["status"], "no_response")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,141 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src import audit_archive, audit_log, data_access
+
+
+class TestCsvRotation(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(data_access.DATA_DIR, 'audit_trail.csv'), self.tmpdir)
+        self.patcher = patch.object(data_access, 'DATA_DIR', self.tmpdir)
+        self.patcher.start()
+        data_access.invalidate_cache()
+        self.trail = data_access.read_csv('audit_trail')
+        self.mutation_id = self.trail['MutationID'].iloc[0]
+
+    def tearDown(self):
+        self.patcher.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def test_rotated_rows_stay_queryable(self):
+        expected = data_access.get_audit_trail_for_mutation(self.mutation_id)['AuditID'].tolist()
+        sealed = data_access.rotate_audit_log(max_size_mb=0)
+        self.assertTrue(os.path.exists(sealed))
+        self.assertEqual(len(data_access.read_csv('audit_trail')), 0)
+        [entry] = audit_archive.load_manifest()
+        self.assertEqual(entry['rows'], len(self.trail))
+        self.assertTrue(audit_archive._may_contain(entry['mutation_bloom'], self.mutation_id))
+        self.assertEqual(data_access.get_audit_trail_for_mutation(self.mutation_id)['AuditID'].tolist(), expected)
+        self.assertEqual(len(list(data_access.iter_audit_trail())), len(self.trail))
+
+    def test_queries_prune_by_manifest(self):
+        data_access.rotate_audit_log(max_size_mb=0)
+        with patch.object(audit_archive, '_csv_chunks', side_effect=AssertionError("segment scanned")):
+            self.assertTrue(data_access.get_audit_trail_for_mutation('~not-in-any-range').empty)
+            self.assertEqual(list(data_access.iter_audit_trail(filter={'since': '2999-01-01'})), [])
+
+    def test_bloom_prunes_ids_inside_the_range(self):
+        data_access.rotate_audit_log(max_size_mb=0)
+        [entry] = audit_archive.load_manifest()
+        ids = set(self.trail['MutationID'].astype(str))
+        self.assertTrue(all(audit_archive._may_contain(entry['mutation_bloom'], i) for i in ids))
+        absent = [f'{n:08x}' for n in range(0, 2**32, 2**32 // 200)]  # spread over the whole key space
+        absent = [i for i in absent if i not in ids]
+        kept = [i for i in absent if audit_archive.prune([entry], {'MutationID': i})]
+        self.assertLessEqual(len(kept), len(absent) // 20)
+
+    def test_gzip_sealed_segments(self):
+        sealed = data_access.rotate_audit_log(max_size_mb=0, compress=True)
+        self.assertTrue(sealed.endswith('.csv.gz'))
+        self.assertFalse(os.path.exists(sealed[:-3]))
+        rows = data_access.get_audit_trail_for_mutation(self.mutation_id)
+        self.assertEqual(len(rows), (self.trail['MutationID'] == self.mutation_id).sum())
+
+    def test_filter_options_from_manifest(self):
+        expected = sorted(v for v in self.trail['Agent'].astype(str).unique() if v)
+        data_access.rotate_audit_log(max_size_mb=0)
+        [entry] = audit_archive.load_manifest()
+        self.assertEqual(entry['values']['Agent'], expected)
+        with patch.object(audit_archive, '_csv_chunks', side_effect=AssertionError("segment scanned")):
+            self.assertEqual(data_access.audit_trail_values()['Agent'], expected)
+        page, total = data_access.query_audit_trail({'Agent': expected[0]}, limit=3)
+        self.assertEqual(total, int((self.trail['Agent'] == expected[0]).sum()))
+        self.assertEqual(len(page), min(3, total))
+
+    def test_no_rotation_below_limit(self):
+        self.assertIsNone(data_access.rotate_audit_log(max_size_mb=1024))
+        self.assertEqual(audit_archive.load_manifest(), [])
+
+    def test_legacy_archives_adopted(self):
+        os.replace(data_access.get_csv_path('audit_trail'),
+                   os.path.join(self.tmpdir, 'audit_trail_archive_20251027155239.csv'))
+        with open(data_access.get_csv_path('audit_trail'), 'w', encoding='utf-8') as f:
+            f.write(','.join(data_access.AUDIT_COLUMNS) + '\n')
+        data_access.invalidate_cache()
+        [entry] = audit_archive.load_manifest()
+        self.assertEqual(entry['rows'], len(self.trail))
+        self.assertFalse(data_access.get_audit_trail_for_mutation(self.mutation_id).empty)
+
+
+class TestJsonlRotation(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.patchers = [patch.object(data_access, 'DATA_DIR', self.tmpdir),
+                         patch.object(data_access, 'AUDIT_FORMAT', 'jsonl'),
+                         patch.object(audit_log, 'AUDIT_LOG_DIR', os.path.join(self.tmpdir, 'audit_log'))]
+        for p in self.patchers:
+            p.start()
+        data_access.invalidate_cache()
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def _records(self, mutation_id, count):
+        return [{'AuditID': f'{mutation_id}-{i}', 'MutationID': mutation_id,
+                 'Timestamp': '2025-10-23T10:00:00+00:00', 'NewStatus': 'Pending',
+                 'Agent': 'InvestigationAgent', 'Comment': '', 'Reasoning': '', 'correlation_id': 'c'}
+                for i in range(count)]
+
+    def test_filter_options_span_sealed_and_active_segments(self):
+        audit_log.append(self._records('m1', 2))
+        audit_archive.rotate(max_size_mb=0)
+        audit_log.append([dict(r, Agent='AdvisoryAgent', NewStatus='Closed') for r in self._records('m2', 1)])
+        values = data_access.audit_trail_values()
+        self.assertEqual(values, {'Agent': ['AdvisoryAgent', 'InvestigationAgent'], 'NewStatus': ['Closed', 'Pending']})
+
+    def test_sealed_segments_stay_queryable(self):
+        audit_log.append(self._records('m1', 3))
+        first = audit_log.active_segment()
+        sealed = audit_archive.rotate(max_size_mb=0, compress=True)
+        self.assertEqual(sealed, first + '.gz')
+        self.assertNotEqual(audit_log.active_segment(), first)
+        audit_log.append(self._records('m2', 2))
+        self.assertEqual(len(audit_log.get_records(mutation_id='m1')), 3)
+        self.assertEqual(len(data_access.get_audit_trail_for_mutation('m2')), 2)
+        self.assertEqual(len(data_access.read_csv('audit_trail')), 5)
+        with patch.object(audit_log, '_open', side_effect=AssertionError("segment opened")):
+            self.assertEqual(audit_log.get_records(mutation_id='m0'), [])
+
+    def test_segment_read_once_while_compressing(self):
+        audit_log.append(self._records('m1', 3))
+        first = audit_log.active_segment()
+        audit_archive.rotate(max_size_mb=0, compress=False)
+        # the moment between renaming the finished .gz into place and removing the source
+        with open(first, 'rb') as src, gzip.open(first + '.gz', 'wb') as dst:
+            dst.write(src.read())
+        self.assertEqual(audit_log.segment_paths()[0], first + '.gz')
+        self.assertNotIn(first, audit_log.segment_paths())
+        self.assertEqual(len(audit_log.get_records(mutation_id='m1')), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src import agent_protocol, audit_archive, audit_blobs, audit_log, data_access, query_engine
+
+
+class TestAuditBlobs(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.patchers = [patch.object(data_access, 'DATA_DIR', self.tmpdir),
+                         patch.object(agent_protocol, 'AUDIT_FILE', os.path.join(self.tmpdir, 'audit_trail.csv')),
+                         patch.object(agent_protocol, 'SPAN_LOG', os.path.join(self.tmpdir, 'spans.jsonl')),
+                         patch.object(audit_log, 'AUDIT_LOG_DIR', os.path.join(self.tmpdir, 'audit_log'))]
+        for p in self.patchers:
+            p.start()
+        data_access.invalidate_cache()
+        self.reasoning = json.dumps("The user requested access because " * 100)
+
+    def tearDown(self):
+        agent_protocol.flush()
+        for p in self.patchers:
+            p.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def _blobs(self):
+        return [f for _, _, files in os.walk(audit_blobs.blob_dir()) for f in files]
+
+    def _log_delegation(self):
+        # request, response and received-response all carry the same reasoning
+        for action in ("handle_request", "response", "received_response"):
+            msg = agent_protocol.create_message(sender="RightsCheckAgent", receiver="InvestigationAgent",
+                                                action=action, status="completed",
+                                                context={"mutation_id": "m1", "reasoning": self.reasoning})
+            agent_protocol.log_agent_message(msg, comment="short comment")
+        self.assertTrue(agent_protocol.flush(timeout=10))
+
+    def test_pack_and_resolve(self):
+        self.assertEqual(audit_blobs.pack("small"), "small")
+        ref = audit_blobs.pack(self.reasoning)
+        self.assertTrue(audit_blobs.is_ref(ref))
+        self.assertEqual(audit_blobs.pack(self.reasoning), ref)
+        self.assertEqual(audit_blobs.resolve(ref), self.reasoning)
+        self.assertEqual(len(self._blobs()), 1)
+
+    def test_csv_rows_reference_one_blob(self):
+        self._log_delegation()
+        with open(agent_protocol.AUDIT_FILE, newline='', encoding='utf-8') as f:
+            rows = list(csv.reader(f))[1:]
+        self.assertEqual(len({row[7] for row in rows}), 1)
+        self.assertTrue(audit_blobs.is_ref(rows[0][7]))
+        self.assertEqual(rows[0][6], "short comment")
+        self.assertEqual(len(self._blobs()), 1)
+        trail = data_access.get_audit_trail_for_mutation('m1')
+        self.assertEqual(trail['Reasoning'].tolist(), [json.dumps(self.reasoning, ensure_ascii=False)] * 3)
+
+    def test_jsonl_records_reference_one_blob(self):
+        with patch.object(data_access, 'AUDIT_FORMAT', 'jsonl'):
+            self._log_delegation()
+            records = audit_log.get_records(mutation_id='m1')
+            self.assertTrue(all(audit_blobs.is_ref(r['Reasoning']) for r in records))
+            trail = data_access.get_audit_trail_for_mutation('m1')
+        self.assertEqual(len(self._blobs()), 1)
+        self.assertEqual(trail['Reasoning'].tolist(), [json.dumps(self.reasoning, ensure_ascii=False)] * 3)
+
+    def test_query_results_are_resolved(self):
+        self._log_delegation()
+        result = json.loads(query_engine.query_json('audit_trail', {'MutationID': 'm1'}, columns=['Reasoning']))
+        self.assertEqual([r['Reasoning'] for r in result['results']],
+                         [json.dumps(self.reasoning, ensure_ascii=False)] * 3)
+
+    def test_expire_collects_unreferenced_blobs(self):
+        self._log_delegation()
+        self.assertTrue(audit_archive.rotate(path=agent_protocol.AUDIT_FILE, force=True))
+        self.reasoning = json.dumps("A later workflow, still in the live trail " * 100)
+        self._log_delegation()
+        self.assertEqual(len(self._blobs()), 2)
+        # within the grace period even unreferenced blobs are kept
+        self.assertEqual(audit_blobs.collect_garbage(set()), 0)
+        with patch.object(audit_blobs, 'AUDIT_BLOB_GC_GRACE', 0):
+            self.assertEqual(audit_archive.expire('2999-01-01', path=agent_protocol.AUDIT_FILE), 1)
+        self.assertEqual(audit_archive.load_manifest(agent_protocol.AUDIT_FILE), [])
+        self.assertEqual(len(self._blobs()), 1)
+        trail = data_access.get_audit_trail_for_mutation('m1')
+        self.assertEqual(trail['Reasoning'].tolist(), [json.dumps(self.reasoning, ensure_ascii=False)] * 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
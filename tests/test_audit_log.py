@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src import agent_protocol, audit_log, data_access
+
+
+class TestAuditLog(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(data_access.DATA_DIR, 'audit_trail.csv'), self.tmpdir)
+        self.patchers = [patch.object(data_access, 'DATA_DIR', self.tmpdir),
+                         patch.object(data_access, 'AUDIT_FORMAT', 'jsonl'),
+                         patch.object(audit_log, 'AUDIT_LOG_DIR', os.path.join(self.tmpdir, 'audit_log'))]
+        for p in self.patchers:
+            p.start()
+        data_access.invalidate_cache()
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def _record(self, i, mutation_id, correlation_id):
+        return {
+            'AuditID': f'a{i}', 'MutationID': mutation_id, 'Timestamp': '2025-10-23T10:00:00+00:00',
+            'OldStatus': '', 'NewStatus': 'Pending', 'Agent': 'InvestigationAgent',
+            'Comment': 'line one\nline two', 'Reasoning': {'step': i}, 'correlation_id': correlation_id,
+        }
+
+    def test_indexed_lookup(self):
+        audit_log.append([self._record(i, f'm{i % 3}', f'c{i % 2}') for i in range(9)])
+        records = audit_log.get_records(mutation_id='m1')
+        self.assertEqual([r['AuditID'] for r in records], ['a1', 'a4', 'a7'])
+        self.assertEqual(records[0]['Comment'], 'line one\nline two')
+        self.assertEqual(records[0]['Reasoning'], {'step': 1})
+        both = audit_log.get_records(mutation_id='m1', correlation_id='c0')
+        self.assertEqual([r['AuditID'] for r in both], ['a4'])
+
+    def test_get_audit_trail_for_mutation_seeks(self):
+        audit_log.append([self._record(i, f'm{i % 3}', 'c') for i in range(6)])
+        with patch.object(audit_log, 'iter_records', side_effect=AssertionError("full scan")):
+            df = data_access.get_audit_trail_for_mutation('m2')
+        self.assertEqual(df['AuditID'].tolist(), ['a2', 'a5'])
+        self.assertEqual(len(data_access.read_csv('audit_trail')), 6)
+
+    def test_csv_import_export_round_trip(self):
+        csv_path = data_access.get_csv_path('audit_trail')
+        with patch.object(data_access, 'AUDIT_FORMAT', 'csv'):
+            expected = data_access.read_csv('audit_trail')
+        imported = audit_log.import_csv(csv_path)
+        self.assertEqual(imported, len(expected))
+        os.remove(csv_path)
+        self.assertEqual(audit_log.export_csv(), imported)
+        data_access.invalidate_cache()
+        with patch.object(data_access, 'AUDIT_FORMAT', 'csv'):
+            exported = data_access.read_csv('audit_trail')
+        self.assertEqual(exported['AuditID'].tolist(), expected['AuditID'].tolist())
+        self.assertEqual(exported['Reasoning'].tolist(), expected['Reasoning'].tolist())
+
+    def test_rebuild_index(self):
+        audit_log.append([self._record(i, 'm', f'c{i}') for i in range(3)])
+        with open(audit_log.index_path(audit_log.active_segment()), 'rb') as f:
+            before = f.read()
+        audit_log.rebuild_index()
+        with open(audit_log.index_path(audit_log.active_segment()), 'rb') as f:
+            self.assertEqual(f.read(), before)
+        self.assertEqual(len(audit_log.get_records(mutation_id='m')), 3)
+
+    def test_agent_messages_go_to_log(self):
+        msg = agent_protocol.create_message(sender="RightsCheckAgent", receiver="ToolCall", action="lookup_data",
+                                            context={"mutation_id": "m9"}, status="success")
+        agent_protocol.log_agent_message(msg, comment="Tool call success")
+        agent_protocol.flush(timeout=10)
+        records = audit_log.get_records(correlation_id=msg.correlation_id)
+        self.assertEqual([r['MutationID'] for r in records], ['m9'])
+
+
+if __name__ == "__main__":
+    unittest.main()
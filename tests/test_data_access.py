@@ -1,5 +1,12 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
 import unittest
 import pandas as pd
+from unittest.mock import patch
+from src import data_access
 from src.data_access import validate_schema, CSV_SCHEMAS
 
 class TestDataAccessSchema(unittest.TestCase):
@@ -46,5 +53,498 @@ class TestDataAccessSchema(unittest.TestCase):
         with self.assertRaises(ValueError):
             validate_schema('hr_mutations', df)
 
+    def test_unparseable_date(self):
+        data = {col['name']: ['test'] for col in CSV_SCHEMAS['vacation']}
+        data['StartDate'] = ['23/10/2025']
+        data['EndDate'] = ['2025-10-24']
+        with self.assertRaises(ValueError):
+            validate_schema('vacation', pd.DataFrame(data))
+
+    def test_incremental_checks_only_new_rows(self):
+        validator = data_access.SchemaValidator('sickLeave', CSV_SCHEMAS['sickLeave'])
+        df = pd.DataFrame({'UserID': ['u001'], 'StartDate': ['2025-10-20'],
+                           'EndDate': ['2025-10-22'], 'Status': ['approved']})
+        validator.validate(df, incremental=True)
+        grown = pd.concat([df, pd.DataFrame({'UserID': ['u002'], 'StartDate': ['2025-11-01'],
+                                             'EndDate': ['not a date'], 'Status': ['approved']})],
+                          ignore_index=True)
+        hashes = pd.util.hash_pandas_object(grown, index=False).to_numpy()
+        self.assertEqual(validator._changed_rows(tuple(grown.columns), hashes).tolist(), [False, True])
+        with self.assertRaises(ValueError):
+            validator.validate(grown, incremental=True)
+
+class TestTableCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(data_access.DATA_DIR, 'users.csv'), self.tmpdir)
+        self.patcher = patch.object(data_access, 'DATA_DIR', self.tmpdir)
+        self.patcher.start()
+        data_access.invalidate_cache()
+
+    def tearDown(self):
+        self.patcher.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def test_repeated_reads_hit_cache(self):
+        before = data_access.cache_stats()
+        first = data_access.read_csv('users')
+        second = data_access.read_csv('users')
+        after = data_access.cache_stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_mutating_result_does_not_touch_cache(self):
+        df = data_access.read_csv('users')
+        df.loc[0, 'Name'] = 'Changed'
+        self.assertNotEqual(data_access.read_csv('users').loc[0, 'Name'], 'Changed')
+
+    def test_file_change_invalidates_entry(self):
+        df = data_access.read_csv('users')
+        data_access.write_csv('users', df.iloc[:3])
+        self.assertEqual(len(data_access.read_csv('users')), 3)
+
+    def test_table_version_tracks_file(self):
+        version = data_access.table_version('users')
+        self.assertEqual(data_access.table_version('users'), version)
+        data_access.write_csv('users', data_access.read_csv('users').iloc[:3])
+        self.assertNotEqual(data_access.table_version('users'), version)
+
+    def test_budget_evicts_entries(self):
+        budget = data_access.CACHE_MAX_BYTES
+        data_access.read_csv('users')
+        data_access.set_cache_budget(0)
+        try:
+            self.assertEqual(data_access.cache_stats()['entries'], 0)
+        finally:
+            data_access.set_cache_budget(budget)
+
+class TestIndexedLookup(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ('users.csv', 'pending_actions.csv'):
+            shutil.copy(os.path.join(data_access.DATA_DIR, name), self.tmpdir)
+        self.patcher = patch.object(data_access, 'DATA_DIR', self.tmpdir)
+        self.patcher.start()
+        data_access.invalidate_cache()
+
+    def tearDown(self):
+        self.patcher.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def test_lookup_matches_scan(self):
+        df = data_access.read_csv('users')
+        expected = df[(df['UserID'] == 'u003') & (df['Status'] == 'Terminated')]
+        result = data_access.lookup('users', UserID='u003', Status='Terminated')
+        pd.testing.assert_frame_equal(result, expected)
+        self.assertTrue(data_access.lookup('users', UserID='nobody').empty)
+
+    def test_lookup_by_file_name_and_aux_table(self):
+        self.assertEqual(len(data_access.lookup('users.csv', UserID='u001')), 1)
+        actions = data_access.read_table('pending_actions')
+        first = actions.iloc[0]
+        result = data_access.lookup('pending_actions', action_id=first['action_id'])
+        self.assertEqual(result.iloc[0]['recipient_id'], first['recipient_id'])
+
+    def test_index_invalidated_on_write(self):
+        data_access.lookup('users', UserID='u001')
+        df = data_access.read_csv('users')
+        df.loc[df['UserID'] == 'u001', 'UserID'] = 'u900'
+        data_access.write_csv('users', df)
+        self.assertTrue(data_access.lookup('users', UserID='u001').empty)
+        self.assertEqual(len(data_access.lookup('users', UserID='u900')), 1)
+
+class TestAppendRows(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ('users.csv', 'hr_mutations.csv', 'role_authorisations.csv'):
+            shutil.copy(os.path.join(data_access.DATA_DIR, name), self.tmpdir)
+        self.patcher = patch.object(data_access, 'DATA_DIR', self.tmpdir)
+        self.patcher.start()
+        data_access.invalidate_cache()
+
+    def tearDown(self):
+        self.patcher.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def _mutation(self, mutation_id):
+        return {
+            "MutationID": mutation_id, "Timestamp": "2025-10-23T10:00:00+00:00",
+            "ChangedBy": "u001", "ChangedFor": "u002", "ChangeType": "Update",
+            "FieldChanged": "Salary", "OldValue": "", "NewValue": "52000",
+            "Environment": "HRProd", "Metadata": "{}", "change_investigation": "Pending",
+            "Reason": "Annual raise", "ManagerID": "u003",
+        }
+
+    def test_append_preserves_existing_content(self):
+        path = data_access.get_csv_path('hr_mutations')
+        with open(path, 'rb') as f:
+            before = f.read()
+        self.assertEqual(data_access.append_rows('hr_mutations', [self._mutation('new00001')]), 1)
+        with open(path, 'rb') as f:
+            self.assertTrue(f.read().startswith(before))
+        self.assertEqual(data_access.read_csv('hr_mutations').iloc[-1]['MutationID'], 'new00001')
+
+    def test_comment_header_kept(self):
+        row = data_access.read_csv('users').iloc[0].to_dict()
+        row['UserID'] = 'u999'
+        data_access.append_rows('users', [row])
+        with open(data_access.get_csv_path('users'), encoding='utf-8') as f:
+            self.assertTrue(f.readline().startswith('# USERS DATA'))
+        self.assertEqual(len(data_access.lookup('users', UserID='u999')), 1)
+
+    def test_missing_trailing_newline(self):
+        data_access.append_rows('role_authorisations', [{'RoleID': 'R099', 'System': 'NewApp', 'AccessLevel': 'Viewer'}])
+        df = data_access.read_csv('role_authorisations')
+        self.assertEqual(df.iloc[-1].tolist(), ['R099', 'NewApp', 'Viewer'])
+
+    def test_invalid_row_rejected(self):
+        path = data_access.get_csv_path('hr_mutations')
+        size = os.path.getsize(path)
+        bad = self._mutation('')
+        with self.assertRaises(ValueError):
+            data_access.append_rows('hr_mutations', [bad])
+        self.assertEqual(os.path.getsize(path), size)
+
+class TestAuditTrailStreaming(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(data_access.DATA_DIR, 'audit_trail.csv'), self.tmpdir)
+        self.patcher = patch.object(data_access, 'DATA_DIR', self.tmpdir)
+        self.patcher.start()
+        data_access.invalidate_cache()
+        self.audit = data_access.read_csv('audit_trail')
+
+    def tearDown(self):
+        self.patcher.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def test_filters_pushed_down_per_chunk(self):
+        rows = list(data_access.iter_audit_trail(filter={'MutationID': 'd1e5276a'}, chunksize=7))
+        expected = self.audit[self.audit['MutationID'] == 'd1e5276a']
+        self.assertEqual([r.AuditID for r in rows], expected['AuditID'].tolist())
+        rows = list(data_access.iter_audit_trail(filter={'Agent': ['RightsCheckAgent']}, chunksize=7))
+        self.assertTrue(rows and all(r.Agent == 'RightsCheckAgent' for r in rows))
+
+    def test_time_range(self):
+        ts = pd.to_datetime(self.audit['Timestamp'], format='ISO8601', utc=True)
+        since, until = ts.iloc[10], ts.iloc[20]
+        rows = list(data_access.iter_audit_trail(filter={'since': since, 'until': until}, chunksize=16))
+        self.assertEqual(len(rows), int(((ts >= since) & (ts < until)).sum()))
+
+    def test_large_trail_streams_mutation_lookup(self):
+        expected = data_access.get_audit_trail_for_mutation('d1e5276a')
+        with patch.object(data_access, 'CACHE_MAX_BYTES', 0), \
+                patch.object(data_access, 'lookup', side_effect=AssertionError("loaded whole trail")):
+            streamed = data_access.get_audit_trail_for_mutation('d1e5276a')
+        self.assertEqual(streamed['AuditID'].tolist(), expected['AuditID'].tolist())
+
+    def test_query_pages_newest_first(self):
+        agents = self.audit[self.audit['Agent'] == 'InvestigationAgent']
+        first, total = data_access.query_audit_trail({'Agent': 'InvestigationAgent'}, offset=0, limit=5)
+        second, _ = data_access.query_audit_trail({'Agent': 'InvestigationAgent'}, offset=5, limit=5)
+        self.assertEqual(total, len(agents))
+        self.assertEqual(first['AuditID'].tolist() + second['AuditID'].tolist(),
+                         agents['AuditID'].iloc[::-1].iloc[:10].tolist())
+        self.assertEqual(str(first['Timestamp'].dt.tz), 'UTC')
+
+    def test_query_filters(self):
+        page, total = data_access.query_audit_trail({'MutationID': 'd1e5276a', 'NewStatus': 'Pending'})
+        expected = self.audit[(self.audit['MutationID'] == 'd1e5276a') & (self.audit['NewStatus'] == 'Pending')]
+        self.assertEqual(total, len(expected))
+        self.assertEqual(sorted(page['AuditID']), sorted(expected['AuditID']))
+        _, total = data_access.query_audit_trail({'text': 'SALARY'})
+        matches = (self.audit['Comment'].str.contains('salary', case=False)
+                   | self.audit['Reasoning'].str.contains('salary', case=False))
+        self.assertEqual(total, int(matches.sum()))
+        with patch.object(data_access, 'CACHE_MAX_BYTES', 0):
+            self.assertEqual(data_access.query_audit_trail({'text': 'SALARY'})[1], int(matches.sum()))
+
+    def test_query_streams_without_parsing_whole_trail(self):
+        expected = self.audit[self.audit['Agent'] == 'InvestigationAgent']['AuditID'].iloc[::-1].iloc[3:8].tolist()
+        with patch.object(data_access, 'read_csv', side_effect=AssertionError("parsed whole trail")):
+            page, _ = data_access.query_audit_trail({'Agent': 'InvestigationAgent'}, offset=3, limit=5)
+            values = data_access.audit_trail_values()
+        self.assertEqual(page['AuditID'].tolist(), expected)
+        self.assertEqual(values['NewStatus'], sorted(v for v in self.audit['NewStatus'].astype(str).unique() if v))
+
+@unittest.skipIf(data_access.feather is None, "pyarrow not installed")
+class TestSidecarSnapshots(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(data_access.DATA_DIR, 'role_authorisations.csv'), self.tmpdir)
+        self.patchers = [patch.object(data_access, 'DATA_DIR', self.tmpdir),
+                         patch.object(data_access, 'DATA_BACKEND', 'sidecar')]
+        for p in self.patchers:
+            p.start()
+        data_access.invalidate_cache()
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def test_sidecar_built_and_reused(self):
+        expected = data_access.read_csv('role_authorisations')
+        self.assertTrue(os.path.exists(data_access.get_sidecar_path('role_authorisations')))
+        data_access.invalidate_cache()
+        with patch.object(data_access, '_load_table', side_effect=AssertionError("CSV parsed")):
+            pd.testing.assert_frame_equal(data_access.read_csv('role_authorisations'), expected)
+
+    def test_sidecar_rebuilt_when_csv_changes(self):
+        data_access.read_csv('role_authorisations')
+        path = data_access.get_csv_path('role_authorisations')
+        with open(path, encoding='utf-8') as f:
+            content = f.read().rstrip('\n')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content + "\nR099,NewApp,Viewer\n")
+        data_access.invalidate_cache()
+        df = data_access.read_csv('role_authorisations')
+        self.assertEqual(df.iloc[-1]['RoleID'], 'R099')
+
+    def test_without_pyarrow_reads_csv(self):
+        with patch.object(data_access, 'feather', None):
+            df = data_access.read_csv('role_authorisations')
+            with self.assertRaises(RuntimeError):
+                data_access.build_sidecars()
+        self.assertFalse(df.empty)
+        self.assertFalse(os.path.exists(data_access.get_sidecar_path('role_authorisations')))
+
+class TestTypedLoading(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ('users.csv', 'hr_mutations.csv'):
+            shutil.copy(os.path.join(data_access.DATA_DIR, name), self.tmpdir)
+        self.patcher = patch.object(data_access, 'DATA_DIR', self.tmpdir)
+        self.patcher.start()
+        data_access.invalidate_cache()
+
+    def tearDown(self):
+        self.patcher.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def test_schema_dtypes(self):
+        users = data_access.read_csv('users')
+        self.assertIsInstance(users['Department'].dtype, pd.CategoricalDtype)
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(users['HireDate']))
+        mutations = data_access.read_csv('hr_mutations')
+        self.assertEqual(str(mutations['Timestamp'].dt.tz), 'UTC')
+        # str on pandas 3; object (with NaN for empty cells) on pandas 2
+        self.assertTrue(data_access.is_text(mutations['OldValue']))
+        self.assertFalse((mutations['OldValue'] == 'nan').any())
+
+    def test_write_renders_dates_as_text(self):
+        users = data_access.read_csv('users')
+        data_access.write_csv('users', users)
+        raw = pd.read_csv(data_access.get_csv_path('users'), dtype=str, comment='#')
+        self.assertEqual(raw.loc[0, 'HireDate'], users.loc[0, 'HireDate'].strftime('%Y-%m-%d'))
+        data_access.invalidate_cache()
+        pd.testing.assert_frame_equal(data_access.read_csv('users'), users)
+
+    def test_memory_footprint(self):
+        report = data_access.memory_footprint(['users'])
+        self.assertEqual(report['users']['rows'], len(data_access.read_csv('users')))
+        self.assertGreater(report['users']['bytes'], 0)
+
+class TestDataSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name in data_access.CSV_FILES.values():
+            shutil.copy(os.path.join(data_access.DATA_DIR, name), self.tmpdir)
+        self.patcher = patch.object(data_access, 'DATA_DIR', self.tmpdir)
+        self.patcher.start()
+        data_access.invalidate_cache()
+
+    def tearDown(self):
+        self.patcher.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def _add_user(self):
+        users = data_access.read_csv('users')
+        row = users.iloc[[0]].assign(UserID='u999')
+        data_access.write_csv('users', pd.concat([users, row], ignore_index=True))
+
+    def test_shared_until_files_change(self):
+        first = data_access.get_snapshot()
+        self.assertIs(data_access.get_snapshot(), first)
+        self._add_user()
+        second = data_access.get_snapshot()
+        self.assertIsNot(second, first)
+        self.assertNotEqual(second.version, first.version)
+
+    def test_reads_inside_context_use_snapshot(self):
+        with data_access.use_snapshot() as snapshot:
+            before = len(data_access.read_csv('users'))
+            self._add_user()
+            self.assertEqual(len(data_access.read_csv('users')), before)
+            self.assertTrue(data_access.lookup('users', UserID='u999').empty)
+            self.assertFalse(snapshot.is_current())
+        self.assertIsNone(data_access.active_snapshot())
+        self.assertEqual(len(data_access.lookup('users', UserID='u999')), 1)
+
+    def test_audit_trail_is_read_live(self):
+        snapshot = data_access.get_snapshot()
+        self.assertNotIn('audit_trail', snapshot.stamps)
+        with data_access.use_snapshot(snapshot):
+            data_access.append_rows('audit_trail', [{
+                'AuditID': 'snap0001', 'MutationID': 'snap-m1', 'Timestamp': '2025-10-25T10:00:00.000000',
+                'OldStatus': '', 'NewStatus': 'Pending', 'Agent': 'UI', 'Comment': 'c', 'Reasoning': ''}])
+            self.assertEqual(len(data_access.get_audit_trail_for_mutation('snap-m1')), 1)
+        # audit writes do not invalidate the shared snapshot
+        self.assertIs(data_access.get_snapshot(), snapshot)
+
+    def test_tables_load_lazily(self):
+        snapshot = data_access.get_snapshot()
+        self.assertEqual(snapshot._tables, {})
+        self._add_user()  # changed before the snapshot's first read of users
+        with data_access.use_snapshot(snapshot):
+            data_access.read_csv('roles')
+            self.assertEqual(list(snapshot._tables), ['roles'])
+            self.assertTrue(snapshot.consistent)
+            self.assertEqual(len(data_access.lookup('users', UserID='u999')), 1)
+        self.assertEqual(snapshot.inconsistent, {'users'})
+
+    def test_snapshot_inherited_by_tool_threads(self):
+        async def workflow():
+            with data_access.use_snapshot() as snapshot:
+                return snapshot, await asyncio.to_thread(data_access.active_snapshot)
+        snapshot, seen = asyncio.run(workflow())
+        self.assertIs(seen, snapshot)
+
+class TestChangeWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ('users.csv', 'hr_mutations.csv'):
+            shutil.copy(os.path.join(data_access.DATA_DIR, name), self.tmpdir)
+        self.patcher = patch.object(data_access, 'DATA_DIR', self.tmpdir)
+        self.patcher.start()
+        data_access.invalidate_cache()
+        self.events = []
+        data_access.subscribe(self.events.append)
+
+    def tearDown(self):
+        data_access.stop_watcher()
+        data_access.unsubscribe(self.events.append)
+        self.patcher.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def _mutation(self, mutation_id):
+        row = data_access.read_csv('hr_mutations').iloc[0].to_dict()
+        return {**row, 'MutationID': mutation_id}
+
+    def test_append_reports_row_range(self):
+        self.assertEqual(data_access.check_changes(['hr_mutations']), [])
+        rows = len(data_access.read_csv('hr_mutations'))
+        data_access.append_rows('hr_mutations', [self._mutation('w1'), self._mutation('w2')])
+        events = data_access.check_changes(['hr_mutations'])
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].table, 'hr_mutations')
+        self.assertEqual(events[0].rows, range(rows, rows + 2))
+        self.assertEqual(self.events, events)
+        self.assertEqual(data_access.check_changes(['hr_mutations']), [])
+
+    def test_torn_multiline_record_counted_once_complete(self):
+        data_access.check_changes(['hr_mutations'])
+        rows = len(data_access.read_csv('hr_mutations'))
+        path = data_access.get_csv_path('hr_mutations')
+        with open(path, 'rb') as f:
+            columns = f.readline().count(b',') + 1
+        first, second = 'x,' * (columns - 1) + '"two\n', 'lines ""quoted"""\n'
+        with open(path, 'ab') as f:  # a writer midway through a record with a quoted line break
+            f.write(('# note "unbalanced\n' + first).encode('utf-8'))
+        self.assertEqual(data_access.check_changes(['hr_mutations'])[0].rows, range(rows, rows))  # nothing complete yet
+        with open(path, 'ab') as f:
+            f.write(second.encode('utf-8'))
+        self.assertEqual(data_access.check_changes(['hr_mutations'])[0].rows, range(rows, rows + 1))
+
+    def test_rewrite_invalidates_cache(self):
+        data_access.check_changes(['users'])
+        users = data_access.read_csv('users')
+        data_access.write_csv('users', users.iloc[:3])
+        with patch.object(data_access, 'invalidate_cache') as invalidate:
+            events = data_access.check_changes(['users'])
+        invalidate.assert_called_once_with('users')
+        self.assertIsNone(events[0].rows)
+
+    def test_background_watcher_publishes(self):
+        watcher = data_access.start_watcher(interval=0.05)
+        data_access.append_rows('hr_mutations', [self._mutation('w3')])
+        for _ in range(100):
+            if self.events:
+                break
+            time.sleep(0.05)
+        self.assertIn(watcher.mode, ('inotify', 'polling'))
+        self.assertEqual(self.events[0].table, 'hr_mutations')
+
+class TestCommentPreservingWrites(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(data_access.DATA_DIR, 'users.csv'), self.tmpdir)
+        self.patcher = patch.object(data_access, 'DATA_DIR', self.tmpdir)
+        self.patcher.start()
+        data_access.invalidate_cache()
+        self.path = data_access.get_csv_path('users')
+        with open(self.path, 'rb') as f:
+            self.original = f.read()
+        self.preamble = self.original[:data_access.preamble_end(self.path)]
+
+    def tearDown(self):
+        self.patcher.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def _content(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def test_write_keeps_preamble(self):
+        self.assertTrue(self.preamble.startswith(b'#'))
+        data_access.write_csv('users', data_access.read_csv('users').iloc[:2])
+        content = self._content()
+        self.assertTrue(content.startswith(self.preamble))
+        self.assertEqual(len(data_access.read_csv('users')), 2)
+
+    def test_update_rows_in_place(self):
+        self.assertEqual(data_access.update_rows('users', {'JobTitle': 'Lead'}, UserID='u002'), 1)
+        users = data_access.read_csv('users')
+        self.assertEqual(users.loc[users['UserID'] == 'u002', 'JobTitle'].tolist(), ['Lead'])
+        content = self._content()
+        prefix = self.original[:self.original.index(b'u002')]
+        self.assertTrue(content.startswith(prefix))
+        self.assertEqual(len(content.splitlines()), len(self.original.splitlines()))
+        self.assertEqual([n for n in os.listdir(self.tmpdir) if n.endswith('.tmp')], [])  # no temp files left behind
+
+    def test_update_rows_overwrites_equal_length_records(self):
+        inode = os.stat(self.path).st_ino
+        self.assertEqual(data_access.update_rows('users', {'JobTitle': 'HR Generalist'}, UserID='u002'), 1)
+        self.assertEqual(os.stat(self.path).st_ino, inode)  # written in place, not replaced
+        self.assertEqual(self._content(), self.original.replace(b'HR Specialist', b'HR Generalist', 1))
+        data_access.update_rows('users', {'JobTitle': 'HR'}, UserID='u002')
+        self.assertNotEqual(os.stat(self.path).st_ino, inode)  # shorter: the file is rewritten
+        self.assertEqual(self._content(), self.original.replace(b'HR Specialist', b'HR', 1))
+
+    def test_update_rows_rejects_overlong_record(self):
+        with open(self.path, 'ab') as f:
+            f.write(b'u999,extra,fields,that,do,not,fit,the,header,at,all,here\n')
+        with open(self.path, 'rb') as f:
+            before = f.read()
+        with self.assertRaises(ValueError):
+            data_access.update_rows('users', {'JobTitle': 'Lead'}, UserID='u999')
+        self.assertEqual(self._content(), before)
+
+    def test_update_rows_validates_and_matches(self):
+        self.assertEqual(data_access.update_rows('users', {'JobTitle': 'Lead'}, UserID='nobody'), 0)
+        with self.assertRaises(ValueError):
+            data_access.update_rows('users', {'HireDate': 'not a date'}, UserID='u002')
+        self.assertEqual(self._content(), self.original)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
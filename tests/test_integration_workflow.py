@@ -3,6 +3,7 @@ import os
 import pandas as pd
 from src.agent_main import AgentOrchestrator
 from src.data_access import get_audit_trail_for_mutation, write_csv, read_csv
+from src import agent_protocol
 
 class TestIntegrationWorkflow(unittest.TestCase):
     def setUp(self):
@@ -49,7 +50,8 @@ class TestIntegrationWorkflow(unittest.TestCase):
         # Step 4: AdvisoryAgent
         result4 = orchestrator.route("AdvisoryAgent", result3.get("context", {}))
         self.assertIn("status", result4)
-        # Check audit trail exists for this mutation
+        # Check audit trail exists for this mutation (audit rows are written in the background)
+        agent_protocol.flush()
         audit_df = get_audit_trail_for_mutation(self.mutation_id)
         self.assertIsInstance(audit_df, pd.DataFrame)
 
@@ -0,0 +1,90 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src import agent_protocol, job_queue
+
+
+def _workflow(context):
+    with agent_protocol.span("InvestigationAgent", kind="agent"):
+        with agent_protocol.span("RightsCheckAgent", kind="agent"):
+            with agent_protocol.span("run.poll", kind="poll"):
+                pass
+    return {"mutation_id": context["MutationID"], "status": "completed"}
+
+
+def _failing(context):
+    with agent_protocol.span("InvestigationAgent", kind="agent"):
+        raise RuntimeError("model unavailable")
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.patchers = [patch.object(job_queue, 'JOB_DIR', os.path.join(self.tmpdir, 'jobs')),
+                         patch.object(agent_protocol, 'AUDIT_FILE', os.path.join(self.tmpdir, 'audit_trail.csv')),
+                         patch.object(agent_protocol, 'SPAN_LOG', os.path.join(self.tmpdir, 'spans.jsonl'))]
+        for p in self.patchers:
+            p.start()
+
+    def tearDown(self):
+        agent_protocol.flush()
+        for p in self.patchers:
+            p.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_completed_job_records_steps_and_result(self):
+        job_id = job_queue.submit(_workflow, {"MutationID": "m1"}, kind="investigation", label="m1")
+        job = job_queue.wait(job_id, timeout=10)
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(job['result'], {"mutation_id": "m1", "status": "completed"})
+        self.assertEqual([(s['name'], s['status']) for s in job['steps']],
+                         [("InvestigationAgent", "ok"), ("RightsCheckAgent", "ok")])
+        self.assertIsNotNone(job['finished_at'])
+        # the job's spans form one trace keyed by the job_id
+        self.assertTrue(agent_protocol.flush(timeout=10))
+        with open(agent_protocol.SPAN_LOG, encoding='utf-8') as f:
+            spans = [json.loads(line) for line in f]
+        self.assertEqual({s['trace_id'] for s in spans}, {job_id})
+        self.assertEqual({s['mutation_id'] for s in spans}, {"m1"})
+
+    def test_record_saved_on_status_changes_only(self):
+        saved = []
+        save = job_queue._save
+        with patch.object(job_queue, '_save', side_effect=lambda job: (saved.append(job['status']), save(job))):
+            job_id = job_queue.submit(_workflow, {"MutationID": "m1"}, label="m1")
+            job_queue.wait(job_id, timeout=10)
+        # queued, running, completed; the agent steps do not write the file
+        self.assertEqual(saved, ['queued', 'running', 'completed'])
+        with open(job_queue._job_path(job_id), encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)['steps']), 2)
+
+    def test_failed_job(self):
+        job_id = job_queue.submit(_failing, {}, label="m2")
+        job = job_queue.wait(job_id, timeout=10)
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn("model unavailable", job['error'])
+        self.assertEqual(job['steps'][0]['status'], 'error')
+
+    def test_stale_job_is_interrupted(self):
+        os.makedirs(job_queue.job_dir())
+        with open(os.path.join(job_queue.job_dir(), 'stale.json'), 'w', encoding='utf-8') as f:
+            json.dump({'job_id': 'stale', 'status': 'running', 'steps': []}, f)
+        self.assertEqual(job_queue.get_job('stale')['status'], 'interrupted')
+        self.assertIsNone(job_queue.get_job('missing'))
+
+    def test_list_jobs(self):
+        self.assertEqual(job_queue.list_jobs(), [])
+        ids = [job_queue.submit(_workflow, {"MutationID": f"m{i}"}, label=f"m{i}") for i in range(3)]
+        for job_id in ids:
+            job_queue.wait(job_id, timeout=10)
+        jobs = job_queue.list_jobs()
+        self.assertEqual(sorted(job['job_id'] for job in jobs), sorted(ids))
+        self.assertEqual(len(job_queue.list_jobs(limit=2)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,17 +1,35 @@
+import asyncio
+import csv
 import unittest
 import os
+import subprocess
+import sys
+import threading
+import time
+import shutil
+import tempfile
 import uuid
 from datetime import datetime, timedelta
-from src.pending_actions import add_pending_action, get_pending_actions, update_action_response, PENDING_ACTIONS_PATH
+from unittest.mock import patch
+from src import data_access, pending_actions
+from src.pending_actions import add_pending_action, get_pending_actions, update_action_response
 
 class TestPendingActions(unittest.TestCase):
     def setUp(self):
-        # Clean up the CSV before each test
-        if os.path.exists(PENDING_ACTIONS_PATH):
-            os.remove(PENDING_ACTIONS_PATH)
+        # A fresh CSV and event log for each test, outside the tracked data directory
+        self.tmpdir = tempfile.mkdtemp()
+        self.patchers = [patch.object(pending_actions, 'PENDING_ACTIONS_PATH', os.path.join(self.tmpdir, 'pending_actions.csv')),
+                         patch.object(pending_actions, 'PENDING_EVENTS_PATH', os.path.join(self.tmpdir, 'pending_actions_events.jsonl'))]
+        for p in self.patchers:
+            p.start()
         from src.pending_actions import init_pending_actions_csv
         init_pending_actions_csv()
 
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        shutil.rmtree(self.tmpdir)
+
     def test_add_and_get_pending_action(self):
         action_id = str(uuid.uuid4())
         add_pending_action({
@@ -43,5 +61,198 @@ class TestPendingActions(unittest.TestCase):
         self.assertEqual(len(actions), 1)
         self.assertEqual(actions[0]['response'], 'My response')
 
+class TestActionFeed(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.patchers = [patch.object(pending_actions, 'PENDING_ACTIONS_PATH', os.path.join(self.tmpdir, 'pending_actions.csv')),
+                         patch.object(pending_actions, 'PENDING_EVENTS_PATH', os.path.join(self.tmpdir, 'pending_actions_events.jsonl'))]
+        for p in self.patchers:
+            p.start()
+        pending_actions.init_pending_actions_csv()
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _add(self, recipient_id):
+        action_id = str(uuid.uuid4())
+        add_pending_action({'action_id': action_id, 'type': 'information_request',
+                            'recipient_id': recipient_id, 'context': 'Please clarify', 'response': ''})
+        return action_id
+
+    def test_feed_returns_changes_after_cursor(self):
+        first = self._add('user1')
+        actions, cursor = pending_actions.get_actions_since(0, 'user1')
+        self.assertEqual([a['action_id'] for a in actions], [first])
+        self.assertEqual(actions[0]['event'], 'added')
+        self.assertEqual(pending_actions.get_actions_since(cursor, 'user1'), ([], cursor))
+        second = self._add('user1')
+        self._add('user2')
+        update_action_response(first, 'Approved by manager')
+        actions, new_cursor = pending_actions.get_actions_since(cursor, 'user1')
+        self.assertEqual([(a['action_id'], a['event']) for a in actions], [(second, 'added'), (first, 'updated')])
+        self.assertEqual(actions[1]['status'], 'responded')
+        self.assertEqual(actions[1]['response'], 'Approved by manager')
+        self.assertEqual(new_cursor, 4)
+        self.assertEqual(len(pending_actions.get_actions_since(0)[0]), 3)
+
+    def test_inbox_uses_status_index(self):
+        first, second = self._add('user1'), self._add('user1')
+        update_action_response(first, 'Done')
+        pending, cursor = pending_actions.get_inbox('user1')
+        self.assertEqual([a['action_id'] for a in pending], [second])
+        self.assertEqual([a['action_id'] for a in pending_actions.get_inbox('user1', 'responded')[0]], [first])
+        self.assertEqual(cursor, 3)
+
+    def test_log_seeded_from_existing_actions_and_reset(self):
+        first = self._add('user1')
+        os.remove(pending_actions.PENDING_EVENTS_PATH)
+        pending_actions.init_pending_actions_csv()
+        actions, cursor = pending_actions.get_actions_since(0, 'user1')
+        self.assertEqual([a['action_id'] for a in actions], [first])
+        # a new CSV starts a new log; stale cursors restart from the beginning
+        os.remove(pending_actions.PENDING_ACTIONS_PATH)
+        pending_actions.init_pending_actions_csv()
+        second = self._add('user1')
+        self.assertEqual([a['action_id'] for a in pending_actions.get_actions_since(cursor + 5, 'user1')[0]], [second])
+
+class TestIndexedStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.patchers = [patch.object(pending_actions, 'PENDING_ACTIONS_PATH', os.path.join(self.tmpdir, 'pending_actions.csv')),
+                         patch.object(pending_actions, 'PENDING_EVENTS_PATH', os.path.join(self.tmpdir, 'pending_actions_events.jsonl')),
+                         patch.object(pending_actions, 'PENDING_COMPACT_ROWS', 5),
+                         patch.object(data_access, 'DATA_DIR', self.tmpdir)]
+        for p in self.patchers:
+            p.start()
+        data_access.invalidate_cache()
+        pending_actions.init_pending_actions_csv()
+        self.ids = [f'a{i}' for i in range(4)]
+        pending_actions.add_pending_actions([{'action_id': a, 'type': 'information_request', 'recipient_id': 'user1',
+                                              'context': 'Please clarify', 'response': ''} for a in self.ids])
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def _csv_rows(self):
+        with open(pending_actions.PENDING_ACTIONS_PATH, newline='', encoding='utf-8') as f:
+            return list(csv.DictReader(f))
+
+    def test_updates_append_state_rows(self):
+        self.assertEqual(pending_actions.update_action_responses({'a0': 'Yes', 'a2': 'No', 'unknown': 'x'}), 2)
+        rows = self._csv_rows()
+        self.assertEqual([r['action_id'] for r in rows], self.ids + ['a0', 'a2'])
+        self.assertEqual(rows[-1]['status'], 'responded')
+        self.assertEqual([a['action_id'] for a in get_pending_actions('user1')], ['a1', 'a3'])
+        self.assertEqual([a['response'] for a in get_pending_actions(status='responded')], ['Yes', 'No'])
+        # data_access readers see the current row of each action only
+        self.assertEqual(len(data_access.read_table('pending_actions')), 4)
+        self.assertEqual(data_access.lookup('pending_actions', action_id='a2').iloc[0]['response'], 'No')
+
+    def test_compaction(self):
+        for i in range(5):
+            update_action_response('a1', f'Answer {i}')
+        rows = self._csv_rows()
+        self.assertEqual(len(rows), 4)  # compacted once 5 rows (and more than the 4 actions) were superseded
+        self.assertEqual({r['action_id']: r['response'] for r in rows}['a1'], 'Answer 4')
+        update_action_response('a3', 'Later')
+        self.assertEqual(len(self._csv_rows()), 5)
+        pending_actions.compact_pending_actions()
+        self.assertEqual(len(self._csv_rows()), 4)
+        self.assertEqual([a['action_id'] for a in get_pending_actions('user1')], ['a0', 'a2'])
+
+    def test_rows_added_by_hand_are_kept(self):
+        # e.g. a git pull adds an action and answers another; the log has neither
+        with open(pending_actions.PENDING_ACTIONS_PATH, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=pending_actions.PENDING_ACTIONS_FIELDS)
+            writer.writerow({'action_id': 'a4', 'type': 'information_request', 'recipient_id': 'user1',
+                             'context': 'Pulled', 'status': 'pending', 'created_at': '', 'response': ''})
+            writer.writerow(dict(self._csv_rows()[1], status='responded', response='Pulled'))
+        before = self._csv_rows()
+        pending_actions.init_pending_actions_csv()
+        self.assertEqual(self._csv_rows(), before)  # the store is never rewritten at import
+        self.assertEqual([a['action_id'] for a in get_pending_actions('user1')], ['a0', 'a2', 'a3', 'a4'])
+        self.assertEqual(get_pending_actions('user1', status='responded')[0]['response'], 'Pulled')
+
+    def test_actions_missing_from_store_leave_the_index(self):
+        rows = self._csv_rows()[:3]  # the CSV is replaced by an older copy without a3
+        with open(pending_actions.PENDING_ACTIONS_PATH, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=pending_actions.PENDING_ACTIONS_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        pending_actions.init_pending_actions_csv()
+        self.assertEqual([a['action_id'] for a in get_pending_actions('user1')], ['a0', 'a1', 'a2'])
+        self.assertEqual([a['action_id'] for a in pending_actions.get_actions_since(0, 'user1')[0]], ['a0', 'a1', 'a2'])
+
+class TestWaitForResponse(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.patchers = [patch.object(pending_actions, 'PENDING_ACTIONS_PATH', os.path.join(self.tmpdir, 'pending_actions.csv')),
+                         patch.object(pending_actions, 'PENDING_EVENTS_PATH', os.path.join(self.tmpdir, 'pending_actions_events.jsonl')),
+                         patch.object(data_access, 'DATA_DIR', self.tmpdir),
+                         patch.object(data_access, 'start_watcher')]  # the tests run the watcher's check by hand
+        for p in self.patchers:
+            p.start()
+        data_access.invalidate_cache()
+        pending_actions.init_pending_actions_csv()
+        add_pending_action({'action_id': 'w1', 'type': 'information_request', 'recipient_id': 'user1',
+                            'context': 'Why was the salary changed?', 'response': ''})
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def test_wakes_on_answer_from_another_thread(self):
+        async def scenario():
+            waiting = asyncio.ensure_future(pending_actions.wait_for_response('w1', timeout=10))
+            await asyncio.sleep(0.05)
+            self.assertFalse(waiting.done())
+            threading.Timer(0.05, update_action_response, ('w1', 'Promotion')).start()
+            started = time.monotonic()
+            row = await waiting
+            return row, time.monotonic() - started
+        row, waited = asyncio.run(scenario())
+        self.assertEqual(row['response'], 'Promotion')
+        self.assertLess(waited, 5)
+        self.assertEqual(pending_actions._waiters, {})
+
+    def test_already_answered_and_timeout(self):
+        self.assertIsNone(asyncio.run(pending_actions.wait_for_response('w1', timeout=0.1)))
+        update_action_response('w1', 'Done')
+        self.assertEqual(asyncio.run(pending_actions.wait_for_response('w1', timeout=0.1))['status'], 'responded')
+
+    def test_io_runs_off_the_event_loop(self):
+        threads = []
+        answered, start = pending_actions._answered, pending_actions.start_answer_watcher
+        update_action_response('w1', 'Done')
+        with patch.object(pending_actions, '_watching', False), \
+             patch.object(pending_actions, '_answered', side_effect=lambda a: (threads.append(threading.get_ident()), answered(a))[1]), \
+             patch.object(pending_actions, 'start_answer_watcher', side_effect=lambda: (threads.append(threading.get_ident()), start())[1]):
+            self.assertEqual(asyncio.run(pending_actions.wait_for_response('w1', timeout=1))['response'], 'Done')
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.get_ident(), threads)
+
+    def test_wakes_on_answer_from_another_process(self):
+        data_access.check_changes(['pending_actions'])  # watcher baseline
+        script = (f"import sys; sys.path.insert(0, {os.getcwd()!r}); from src import pending_actions as p; "
+                  f"p.PENDING_ACTIONS_PATH = {pending_actions.PENDING_ACTIONS_PATH!r}; "
+                  f"p.PENDING_EVENTS_PATH = {pending_actions.PENDING_EVENTS_PATH!r}; "
+                  "p.update_action_response('w1', 'From the UI')")
+
+        async def scenario():
+            waiting = asyncio.ensure_future(pending_actions.wait_for_response('w1', timeout=10))
+            await asyncio.sleep(0.05)
+            await asyncio.to_thread(subprocess.run, [sys.executable, '-c', script], check=True)
+            self.assertFalse(waiting.done())  # nothing polls: only the watcher wakes it
+            await asyncio.to_thread(data_access.check_changes, ['pending_actions'])
+            return await asyncio.wait_for(waiting, 5)
+        self.assertEqual(asyncio.run(scenario())['response'], 'From the UI')
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,63 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from src import data_access, query_engine
+
+
+class TestQueryEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(data_access.DATA_DIR, 'users.csv'), self.tmpdir)
+        self.patcher = patch.object(data_access, 'DATA_DIR', self.tmpdir)
+        self.patcher.start()
+        data_access.invalidate_cache()
+        self.users = data_access.read_csv('users')
+
+    def tearDown(self):
+        self.patcher.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def test_plain_equality_matches_lookup(self):
+        page, total = query_engine.run_query('users', {'UserID': 'u002'})
+        self.assertEqual(total, 1)
+        self.assertEqual(page.iloc[0]['Name'], 'Bob Smith')
+
+    def test_operators(self):
+        page, _ = query_engine.run_query('users', {'Department': {'in': ['HR', 'Finance']},
+                                                   'Status': {'ne': 'Terminated'}})
+        expected = self.users[self.users['Department'].isin(['HR', 'Finance'])
+                              & (self.users['Status'] != 'Terminated')]
+        self.assertEqual(page['UserID'].tolist(), expected['UserID'].tolist())
+        page, _ = query_engine.run_query('users', {'HireDate': {'gte': '2020-01-01', 'lt': '2021-01-01'}})
+        self.assertTrue((page['HireDate'].dt.year == 2020).all())
+        page, _ = query_engine.run_query('users', {'TerminationDate': {'is_null': False}})
+        self.assertEqual(len(page), self.users['TerminationDate'].notna().sum())
+        page, _ = query_engine.run_query('users', {'Email': {'prefix': 'bob'}})
+        self.assertEqual(page['UserID'].tolist(), ['u002'])
+
+    def test_projection_order_and_paging(self):
+        page, total = query_engine.run_query('users', {}, columns=['UserID', 'HireDate'],
+                                             order_by='-HireDate', limit=3, offset=1)
+        self.assertEqual(total, len(self.users))
+        self.assertEqual(list(page.columns), ['UserID', 'HireDate'])
+        ordered = self.users.sort_values('HireDate', ascending=False, kind='stable')
+        self.assertEqual(page['UserID'].tolist(), ordered['UserID'].iloc[1:4].tolist())
+
+    def test_query_json(self):
+        payload = json.loads(query_engine.query_json('users.csv', {'UserID': 'u001'}, columns=['Name']))
+        self.assertEqual(payload['results'], [{'Name': 'Alice Johnson'}])
+        self.assertEqual(payload['total'], 1)
+
+    def test_lookup_data_tool(self):
+        payload = json.loads(query_engine.lookup_data('users', {'UserID': 'u001'}, columns=['Name']))
+        self.assertEqual(payload['limit'], query_engine.MAX_ROWS)
+        self.assertEqual(payload['results'], [{'Name': 'Alice Johnson'}])
+        self.assertIn('error', json.loads(query_engine.lookup_data('no_such_table', {})))
+
+
+if __name__ == '__main__':
+    unittest.main()
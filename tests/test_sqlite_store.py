@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from src import data_access, sqlite_store, pending_actions
+
+
+class TestSqliteStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        for name in ('users.csv', 'hr_mutations.csv', 'audit_trail.csv', 'pending_actions.csv'):
+            shutil.copy(os.path.join(data_access.DATA_DIR, name), self.tmpdir)
+        self.patchers = [
+            patch.object(data_access, 'DATA_DIR', self.tmpdir),
+            patch.object(data_access, 'DATA_BACKEND', 'sqlite'),
+            patch.object(sqlite_store, 'SQLITE_PATH', os.path.join(self.tmpdir, 'test.sqlite3')),
+            patch.object(pending_actions, 'PENDING_EVENTS_PATH', os.path.join(self.tmpdir, 'events.jsonl')),
+        ]
+        for p in self.patchers:
+            p.start()
+        data_access.invalidate_cache()
+        sqlite_store.import_csv(['users', 'hr_mutations', 'audit_trail', 'pending_actions'])
+
+    def tearDown(self):
+        for p in self.patchers:
+            p.stop()
+        data_access.invalidate_cache()
+        shutil.rmtree(self.tmpdir)
+
+    def test_reads_match_csv(self):
+        from_db = data_access.read_csv('users')
+        with patch.object(data_access, 'DATA_BACKEND', 'csv'):
+            data_access.invalidate_cache()
+            from_csv = data_access.read_csv('users')
+        self.assertEqual(from_db.astype(object).fillna('').values.tolist(),
+                         from_csv.astype(object).fillna('').values.tolist())
+
+    def test_lookup_and_audit_trail(self):
+        self.assertEqual(data_access.lookup('users', UserID='u002').iloc[0]['Name'], 'Bob Smith')
+        audit = data_access.get_audit_trail_for_mutation('d1e5276a')
+        self.assertFalse(audit.empty)
+        self.assertTrue((audit['MutationID'] == 'd1e5276a').all())
+
+    def test_writes_bump_version_and_invalidate_cache(self):
+        users = data_access.read_csv('users')
+        version = sqlite_store.table_version('users')
+        data_access.write_csv('users', users.iloc[:2])
+        self.assertEqual(sqlite_store.table_version('users'), version + 1)
+        self.assertEqual(len(data_access.read_csv('users')), 2)
+        row = users.iloc[5].to_dict()
+        data_access.append_rows('users', [row])
+        self.assertEqual(len(data_access.read_csv('users')), 3)
+
+    def test_export_keeps_comment_preamble(self):
+        data_access.write_csv('users', data_access.read_csv('users').iloc[:4])
+        sqlite_store.export_csv(['users'])
+        with open(os.path.join(self.tmpdir, 'users.csv'), encoding='utf-8') as f:
+            self.assertTrue(f.readline().startswith('# USERS DATA'))
+        with patch.object(data_access, 'DATA_BACKEND', 'csv'):
+            data_access.invalidate_cache()
+            self.assertEqual(len(data_access.read_csv('users')), 4)
+
+    def test_pending_actions_backend(self):
+        pending_actions.add_pending_action({'action_id': 'sql-1', 'type': 'information_request',
+                                            'recipient_id': 'u777', 'context': 'Ctx', 'response': ''})
+        self.assertEqual(len(pending_actions.get_pending_actions('u777')), 1)
+        pending_actions.update_action_response('sql-1', 'Done')
+        responded = pending_actions.get_pending_actions('u777', status='responded')
+        self.assertEqual(responded[0]['response'], 'Done')
+
+    def test_pending_actions_bulk(self):
+        pending_actions.add_pending_actions([{'action_id': f'sql-{i}', 'type': 'information_request',
+                                              'recipient_id': 'u778', 'context': 'Ctx', 'response': ''}
+                                             for i in range(3)])
+        self.assertEqual(pending_actions.update_action_responses({'sql-0': 'A', 'sql-2': 'B', 'nope': 'C'}), 2)
+        responded = pending_actions.get_pending_actions('u778', status='responded')
+        self.assertEqual(sorted(r['response'] for r in responded), ['A', 'B'])
+        changed, _ = pending_actions.get_actions_since(3, 'u778')
+        self.assertEqual([a['action_id'] for a in changed], ['sql-0', 'sql-2'])
+
+
+if __name__ == '__main__':
+    unittest.main()